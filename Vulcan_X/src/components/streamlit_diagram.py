@@ -2,6 +2,7 @@
 import streamlit as st
 import streamlit.components.v1 as components
 from diagram_renderer import DiagramRenderer
+from core.flow_summary import DEFAULT_DIAGRAM_NODE_BUDGET, flow_graph_to_mermaid
 
 class StreamlitDiagramRenderer:
     """Streamlit-specific wrapper for DiagramRenderer"""
@@ -24,6 +25,11 @@ class StreamlitDiagramRenderer:
             st.error(f"❌ Error rendering diagram: {str(e)}")
             return False
 
+    def render_flow_graph(self, flow_graph, node_budget=DEFAULT_DIAGRAM_NODE_BUDGET, focus=None, drill_depth=1, height=600):
+        """Summarize flow data (dict or CompactFlowGraph) to the node budget and render it as a Mermaid flowchart"""
+        mermaid_code = flow_graph_to_mermaid(flow_graph, node_budget=node_budget, focus=focus, drill_depth=drill_depth)
+        return self.render_diagram_auto(mermaid_code, height=height)
+
     def detect_diagram_type(self, code):
         """Detect diagram type"""
         return self.renderer.detect_diagram_type(code)
\ No newline at end of file
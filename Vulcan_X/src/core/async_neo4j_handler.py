@@ -0,0 +1,207 @@
+# src/core/async_neo4j_handler.py
+import asyncio
+import time
+import weakref
+from neo4j import AsyncGraphDatabase
+from core.neo4j_handler import (
+    NEO4J_MAX_CONNECTION_POOL_SIZE, NEO4J_RECONNECT_INTERVAL_SECONDS, neo4j_connection_settings, get_neo4j_handler,
+    is_neo4j_connection_error, build_lineage_statements, has_lineage, code_generation_params, extract_event_blobs,
+    build_blob_statements, GET_USER_QUERY, CHECK_USER_ROLE_QUERY, STORE_CODE_GENERATION_QUERY, STORE_CHART_EVENT_QUERY,
+    STORE_DOCUMENT_QUERY_EVENT_QUERY, STORE_PROJECT_FLOW_EVENT_QUERY, STORE_WIREFRAME_EVENT_QUERY
+)
+
+# Async counterpart of Neo4jHandler, built on neo4j.AsyncGraphDatabase so graph writes can be awaited
+# alongside LLM calls in the app's asyncio.run() pipelines, e.g.
+#
+#     handler = get_async_neo4j_handler()
+#     answer, stored = await asyncio.gather(llm.generate(prompt), handler.store_chart_event(...))
+#
+# Async drivers are bound to the event loop they were created on, so get_async_neo4j_handler() keeps one
+# handler per running loop; its driver is only opened by the first query. Pipelines call
+# close_async_neo4j_handler() before their loop ends. Writes use the same MERGE-on-id queries as the sync
+# handler (event, content blobs and lineage in one transaction), so a retried write is idempotent.
+# After a connection error the driver is dropped and reconnection is retried at most once every
+# NEO4J_RECONNECT_INTERVAL_SECONDS. Schema and admin bootstrap stay with the sync handler.
+ASYNC_STORE_CONCURRENCY = 8 # Max concurrent writes issued by store_many()
+
+_async_handlers = weakref.WeakKeyDictionary() # Running event loop -> AsyncNeo4jHandler
+_last_async_connection_failure = 0.0 # time.monotonic() of the last failed async connection attempt
+
+def get_async_neo4j_handler() -> "AsyncNeo4jHandler":
+    """Returns the AsyncNeo4jHandler of the running event loop, creating it on first use."""
+    loop = asyncio.get_running_loop()
+    handler = _async_handlers.get(loop)
+    if handler is None:
+        handler = _async_handlers[loop] = AsyncNeo4jHandler()
+    return handler
+
+async def close_async_neo4j_handler():
+    """Closes the running event loop's handler (and its driver), if one was created."""
+    handler = _async_handlers.pop(asyncio.get_running_loop(), None)
+    if handler is not None:
+        await handler.close()
+
+async def _store_event_tx(tx, event_label: str, query: str, params: dict, blobs: list, lineage_statements: list):
+    """Writes an event node, its content blobs and its lineage in one transaction; returns the event id."""
+    result = await tx.run(query, **params)
+    record = await result.single()
+    for statement_query, statement_params in [*build_blob_statements(event_label, blobs), *lineage_statements]:
+        statement_result = await tx.run(statement_query, **statement_params)
+        await statement_result.consume()
+    return record[0]
+
+class AsyncNeo4jHandler:
+    def __init__(self, max_connection_pool_size: int = NEO4J_MAX_CONNECTION_POOL_SIZE):
+        self.max_connection_pool_size = max_connection_pool_size
+        self.driver = None
+        self._connect_lock = asyncio.Lock()
+
+    async def _get_driver(self):
+        """The async driver, connected on first use; None while Neo4j is unreachable."""
+        global _last_async_connection_failure
+        if self.driver is not None:
+            return self.driver
+        async with self._connect_lock:
+            if self.driver is not None:
+                return self.driver
+            if _last_async_connection_failure and time.monotonic() - _last_async_connection_failure < NEO4J_RECONNECT_INTERVAL_SECONDS:
+                return None
+            uri, username, password = neo4j_connection_settings()
+            driver = None
+            try:
+                driver = AsyncGraphDatabase.driver(uri, auth=(username, password), max_connection_pool_size=self.max_connection_pool_size)
+                await driver.verify_connectivity()
+            except Exception as e:
+                print(f"Error connecting to Neo4j (async): {type(e).__name__}: {e}")
+                _last_async_connection_failure = time.monotonic()
+                if driver is not None:
+                    await driver.close()
+                return None
+            await asyncio.to_thread(get_neo4j_handler) # Schema/admin bootstrap before the first write
+            self.driver = driver
+            return driver
+
+    async def _reset_driver(self, driver):
+        """Drops the driver after a connection error so the next call reconnects (after the retry interval)."""
+        global _last_async_connection_failure
+        if self.driver is driver:
+            self.driver = None
+            _last_async_connection_failure = time.monotonic()
+        try:
+            await driver.close()
+        except Exception as e:
+            print(f"Error closing stale async Neo4j driver: {e}")
+
+    async def close(self):
+        if self.driver is not None:
+            driver, self.driver = self.driver, None
+            await driver.close()
+
+    # --- User Methods ---
+    async def get_user(self, username: str) -> dict | None:
+        """Retrieves user data (username, hashed_password, approved) from Neo4j."""
+        driver = await self._get_driver()
+        if not driver:
+            return None
+        try:
+            async with driver.session() as session:
+                result = await session.run(GET_USER_QUERY, username=username)
+                record = await result.single()
+                return record.data() if record else None
+        except Exception as e:
+            if is_neo4j_connection_error(e):
+                await self._reset_driver(driver)
+            print(f"Error retrieving user {username} from Neo4j: {e}")
+            return None
+
+    async def check_user_role(self, username: str, role_name: str) -> bool:
+        """Checks if a user has a specific role."""
+        driver = await self._get_driver()
+        if not driver:
+            return False
+        try:
+            async with driver.session() as session:
+                result = await session.run(CHECK_USER_ROLE_QUERY, username=username, role_name=role_name)
+                return bool(await result.single())
+        except Exception as e:
+            if is_neo4j_connection_error(e):
+                await self._reset_driver(driver)
+            print(f"Error checking role {role_name} for user {username} in Neo4j: {e}")
+            return False
+
+    # --- Event Storage ---
+    async def _store_event(self, event_label: str, query: str, params: dict, link_rel_type: str = None, flow_data: dict = None) -> bool:
+        """Writes an event node, its deduplicated content Blobs and (optionally) its lineage in a single transaction."""
+        driver = await self._get_driver()
+        if not driver:
+            print("Neo4j async driver not available. Cannot store data.")
+            return False
+        event_id = params.get("event_id") or params.get("generation_id")
+        try:
+            blobs = extract_event_blobs(event_label, event_id, params)
+            lineage_statements = build_lineage_statements(event_label, event_id, link_rel_type, flow_data) if link_rel_type and has_lineage(flow_data) else []
+            async with driver.session() as session:
+                await session.execute_write(_store_event_tx, event_label, query, params, blobs, lineage_statements)
+            print(f"{event_label} event {event_id} stored successfully in Neo4j.")
+            return True
+        except Exception as e:
+            if is_neo4j_connection_error(e):
+                await self._reset_driver(driver)
+            print(f"Error storing {event_label} event {event_id} in Neo4j: {e}")
+            return False
+
+    async def store_code_generation_with_lineage(self, generation_id: str, original_code_snippet: str, generated_code_snippet: str, timestamp: str, flow_data: dict = None, metrics: dict = None, username: str = None, language: str = None) -> bool:
+        """Stores a code generation event, its metrics and its data lineage."""
+        return await self._store_event("CodeGeneration", STORE_CODE_GENERATION_QUERY,
+                                       code_generation_params(generation_id, original_code_snippet, generated_code_snippet, timestamp, metrics, username, language),
+                                       "INVOLVED_IN_LINEAGE", flow_data)
+
+    async def store_chart_event(self, event_id: str, query: str, generated_code: str, data_preview: str, timestamp: str, username: str = None, language: str = None) -> bool:
+        """Stores a chart generation event."""
+        return await self._store_event("ChartGeneration", STORE_CHART_EVENT_QUERY, {
+            "event_id": event_id, "user_query": query, "generated_code": generated_code,
+            "data_preview": data_preview, "timestamp": timestamp,
+            "username": username, "language": language
+        })
+
+    async def store_document_query_event(self, event_id: str, query: str, answer: str, document_name: str, extracted_text_preview: str, timestamp: str, username: str = None, language: str = None) -> bool:
+        """Stores a document query event."""
+        return await self._store_event("DocumentQuery", STORE_DOCUMENT_QUERY_EVENT_QUERY, {
+            "event_id": event_id, "query": query, "answer": answer, "document_name": document_name,
+            "extracted_text_preview": extracted_text_preview, "timestamp": timestamp,
+            "username": username, "language": language
+        })
+
+    async def store_project_flow_event(self, event_id: str, description: str, generated_code: str, flow_data: dict, timestamp: str, diagram_type: str = "Mermaid (Flowchart)", username: str = None, language: str = None) -> bool:
+        """Stores a project flow diagram event and its conceptual flow."""
+        return await self._store_event("ProjectFlowDiagram", STORE_PROJECT_FLOW_EVENT_QUERY, {
+            "event_id": event_id, "description": description, "generated_code": generated_code,
+            "diagram_type": diagram_type, "timestamp": timestamp,
+            "username": username, "language": language
+        }, "INVOLVED_IN_FLOW", flow_data)
+
+    async def store_wireframe_event(self, event_id: str, description: str, generated_mukuro_code: str, timestamp: str, username: str = None, language: str = None) -> bool:
+        """Stores a wireframe generation event."""
+        return await self._store_event("WireframeGeneration", STORE_WIREFRAME_EVENT_QUERY, {
+            "event_id": event_id, "description": description,
+            "generated_mukuro_code": generated_mukuro_code, "timestamp": timestamp,
+            "username": username, "language": language
+        })
+
+    async def store_many(self, calls: list, concurrency: int = ASYNC_STORE_CONCURRENCY) -> list[bool]:
+        """
+        Runs many store calls concurrently, e.g. for batch jobs:
+        calls = [("store_chart_event", (event_id, query, code, preview, ts)), ...] or (method, args, kwargs).
+        Returns one success flag per call, in order.
+        """
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def _run(call):
+            method_name, args, kwargs = (tuple(call) + ({},))[:3]
+            if not method_name.startswith("store_"):
+                print(f"AsyncNeo4jHandler: '{method_name}' is not a store method.")
+                return False
+            async with semaphore:
+                return await getattr(self, method_name)(*args, **kwargs)
+
+        return list(await asyncio.gather(*(_run(call) for call in calls)))
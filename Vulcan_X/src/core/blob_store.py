@@ -0,0 +1,76 @@
+# src/core/blob_store.py
+import hashlib
+import os
+import tempfile
+import zlib
+
+# Content-addressed storage for large text payloads (code snippets, previews) attached to Neo4j events.
+# Each distinct text becomes one :Blob {sha256} node, so regenerating from the same code doesn't
+# store it again. Small payloads live on the Blob node (zlib-compressed bytes); payloads over
+# NEO4J_BLOB_INLINE_MAX_BYTES are written once to a local object directory and the node is only
+# flagged as external, keeping large strings out of Neo4j properties and the page cache. Object paths
+# are never stored: they are derived from the sha256 and the configured (absolute) NEO4J_BLOB_DIR when
+# read, so moving the directory or running from another working directory keeps blobs readable.
+NEO4J_BLOB_DIR = os.path.abspath(os.path.expanduser(os.getenv("NEO4J_BLOB_DIR", "~/.vulcanus/blobs")))
+NEO4J_BLOB_INLINE_MAX_BYTES = int(os.getenv("NEO4J_BLOB_INLINE_MAX_BYTES", str(64 * 1024)))
+NEO4J_BLOB_COMPRESSION = os.getenv("NEO4J_BLOB_COMPRESSION", "true").lower() in ("1", "true", "yes")
+BLOB_COMPRESSION_LEVEL = 6
+
+def content_sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def blob_object_path(sha256: str, blob_dir: str = None) -> str:
+    """Object path for a blob, fanned out by the first two hex digits: <dir>/ab/abcdef...."""
+    return os.path.join(blob_dir or NEO4J_BLOB_DIR, sha256[:2], sha256)
+
+def _write_blob_object(path: str, data: bytes):
+    """Writes an object file atomically; existing objects are left alone (same hash, same content)."""
+    if os.path.exists(path):
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+def prepare_blob(text: str, blob_dir: str = None) -> dict:
+    """
+    Encodes a text payload for storage and returns the Blob row:
+    {"sha256", "size", "encoding" ('zlib' or 'utf-8'), "payload" (bytes or None), "external" (bool)}.
+    Payloads over the inline limit are written to the object directory here.
+    """
+    raw = text.encode("utf-8")
+    sha256 = hashlib.sha256(raw).hexdigest()
+    data = zlib.compress(raw, BLOB_COMPRESSION_LEVEL) if NEO4J_BLOB_COMPRESSION else raw
+    blob = {"sha256": sha256, "size": len(raw), "encoding": "zlib" if NEO4J_BLOB_COMPRESSION else "utf-8", "payload": None, "external": False}
+    if len(data) > NEO4J_BLOB_INLINE_MAX_BYTES:
+        _write_blob_object(blob_object_path(sha256, blob_dir), data)
+        blob["external"] = True
+    else:
+        blob["payload"] = data
+    return blob
+
+def decode_blob(sha256: str, payload=None, encoding: str = "zlib", legacy_location: str = None, blob_dir: str = None) -> str | None:
+    """
+    Turns a stored Blob back into text: the inline payload, or else the object file for its sha256 in the
+    blob directory. legacy_location is the path older Blob nodes stored, tried only if that file is missing.
+    """
+    if payload is None:
+        path = blob_object_path(sha256, blob_dir)
+        if not os.path.exists(path) and legacy_location:
+            path = legacy_location
+        try:
+            with open(path, "rb") as f:
+                payload = f.read()
+        except OSError as e:
+            print(f"Error reading blob object {path}: {e}")
+            return None
+    if payload is None:
+        return None
+    payload = bytes(payload)
+    return (zlib.decompress(payload) if encoding == "zlib" else payload).decode("utf-8")
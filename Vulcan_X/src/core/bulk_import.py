@@ -0,0 +1,273 @@
+# src/core/bulk_import.py
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from neo4j.exceptions import TransientError
+from core.neo4j_handler import (
+    get_neo4j_handler, lineage_constraint_ready, build_bulk_lineage_statements, build_blob_statements,
+    extract_event_blobs, has_lineage, _cypher_name, _batches
+)
+
+# Bulk loader for backfilling historical events and their lineage graphs into the same schema the
+# store_* methods write (CodeGeneration, ChartGeneration, DocumentQuery, ProjectFlowDiagram,
+# WireframeGeneration, LineageNode, INVOLVED_IN_LINEAGE / INVOLVED_IN_FLOW).
+#
+# Input is NDJSON (one event per line) or Parquet (one event per row). Each record carries
+# "event_type" plus the keyword arguments of the matching store_* method, e.g.
+#   {"event_type": "CodeGeneration", "generation_id": "...", "original_code_snippet": "...",
+#    "generated_code_snippet": "...", "timestamp": "2024-01-31T12:00:00", "metrics": {...}, "flow_data": {...}}
+# flow_data/metrics may also be JSON strings (typical for Parquet exports).
+#
+# Events are written with MERGE on id, so re-running an import is idempotent. Records are grouped
+# into batches of batch_size events; each batch is one write transaction (event nodes by label via
+# UNWIND, then the batch's lineage), and batches are written by `workers` parallel sessions.
+# Parallel writers MERGE shared lineage nodes, which is only safe once the LineageNode key uniqueness
+# constraint exists: the schema is ensured before any worker starts, and without the constraint the
+# import falls back to a single writer. Batches hitting transient errors (deadlocks between writers
+# locking the same nodes) are retried with backoff after the driver's own managed-transaction retries.
+DEFAULT_BULK_BATCH_SIZE = int(os.getenv("NEO4J_BULK_BATCH_SIZE", "2000"))
+DEFAULT_BULK_WORKERS = int(os.getenv("NEO4J_BULK_WORKERS", "4"))
+BULK_IMPORT_FORMATS = {".ndjson": "ndjson", ".jsonl": "ndjson", ".parquet": "parquet"}
+BULK_TRANSIENT_RETRIES = int(os.getenv("NEO4J_BULK_TRANSIENT_RETRIES", "3"))
+BULK_RETRY_BACKOFF_SECONDS = 0.5
+
+def _metric(record: dict, key: str):
+    return (record.get("metrics") or {}).get(key)
+
+# event_type -> (id field, link rel type or None, {node property: record field or callable})
+EVENT_SPECS = {
+    "CodeGeneration": ("generation_id", "INVOLVED_IN_LINEAGE", {
+        "original_code_snippet": "original_code_snippet",
+        "generated_code_snippet": "generated_code_snippet",
+        "confidence": lambda r: _metric(r, "confidence"),
+        "effort_hours": lambda r: _metric(r, "effort"),
+        "original_time_hours": lambda r: _metric(r, "original_time"),
+        "time_saved_hours": lambda r: _metric(r, "time_saved")
+    }),
+    "ChartGeneration": ("event_id", None, {
+        "query": "query",
+        "generated_code": "generated_code",
+        "data_preview": "data_preview"
+    }),
+    "DocumentQuery": ("event_id", None, {
+        "query": "query",
+        "answer": "answer",
+        "document_name": "document_name",
+        "extracted_text_preview": "extracted_text_preview"
+    }),
+    "ProjectFlowDiagram": ("event_id", "INVOLVED_IN_FLOW", {
+        "description": "description",
+        "generated_diagram_code": "generated_code",
+        "diagram_type": lambda r: r.get("diagram_type", "Mermaid (Flowchart)")
+    }),
+    "WireframeGeneration": ("event_id", None, {
+        "description": "description",
+        "generated_mukuro_code": "generated_mukuro_code"
+    })
+}
+
+def _decode_json_field(value):
+    if isinstance(value, str):
+        try:
+            return json.loads(value) if value else None
+        except json.JSONDecodeError:
+            return None
+    return value
+
+def iter_event_records(path: str, input_format: str = None):
+    """Yields event dicts from an NDJSON or Parquet file without loading the whole file."""
+    if input_format is None:
+        input_format = BULK_IMPORT_FORMATS.get(os.path.splitext(path)[1].lower())
+        if input_format is None:
+            raise ValueError(f"Cannot infer bulk import format from '{path}'. Use one of: {', '.join(BULK_IMPORT_FORMATS)}.")
+    if input_format == "ndjson":
+        with open(path, "r", encoding="utf-8") as f:
+            for line_number, line in enumerate(f, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as e:
+                    print(f"Skipping malformed NDJSON line {line_number}: {e}")
+    elif input_format == "parquet":
+        import pyarrow.parquet as pq # pyarrow is only needed for Parquet input
+        parquet_file = pq.ParquetFile(path)
+        for record_batch in parquet_file.iter_batches():
+            yield from record_batch.to_pylist()
+    else:
+        raise ValueError(f"Unsupported bulk import format '{input_format}'.")
+
+def prepare_event(record: dict):
+    """
+    Normalizes a raw record into (event_label, event_id, timestamp, properties, link_rel_type, flow_data, blobs);
+    code/preview fields are moved into content-addressed Blob rows like the store_* methods do.
+    Returns None (after printing why) for records that can't be imported.
+    """
+    event_label = record.get("event_type") or record.get("type")
+    spec = EVENT_SPECS.get(event_label)
+    if spec is None:
+        print(f"Skipping record with unknown event_type '{event_label}'.")
+        return None
+    id_field, link_rel_type, property_fields = spec
+    event_id = record.get(id_field) or record.get("id")
+    timestamp = record.get("timestamp")
+    if not event_id or not timestamp:
+        print(f"Skipping {event_label} record without id/timestamp.")
+        return None
+    record = dict(record)
+    record["metrics"] = _decode_json_field(record.get("metrics"))
+    properties = {
+        prop: (field(record) if callable(field) else record.get(field))
+        for prop, field in property_fields.items()
+    }
+    properties["username"] = record.get("username")
+    properties["language"] = record.get("language")
+    blobs = extract_event_blobs(event_label, str(event_id), properties)
+    flow_data = _decode_json_field(record.get("flow_data")) if link_rel_type else None
+    return event_label, str(event_id), str(timestamp), properties, link_rel_type, flow_data, blobs
+
+def build_event_statements(events: list) -> list:
+    """(query, params) statements that MERGE a batch of prepared events and their content blobs, one UNWIND per event label."""
+    rows_by_label = {}
+    blobs_by_label = {}
+    for event_label, event_id, timestamp, properties, _, _, blobs in events:
+        rows_by_label.setdefault(event_label, []).append({"id": event_id, "timestamp": timestamp, "properties": properties})
+        blobs_by_label.setdefault(event_label, []).extend(blobs)
+    statements = []
+    for event_label, rows in rows_by_label.items():
+        query = f"""
+        UNWIND $rows AS row
+        MERGE (e:{_cypher_name(event_label)} {{id: row.id}})
+        SET e += row.properties, e.timestamp = datetime(row.timestamp), e.type = $event_type
+        """
+        statements.extend((query, {"rows": batch, "event_type": event_label}) for batch in _batches(rows))
+    for event_label, blob_rows in blobs_by_label.items():
+        statements.extend(build_blob_statements(event_label, blob_rows))
+    return statements
+
+def write_events_tx(tx, events: list):
+    """Writes prepared events (see prepare_event), their content blobs and their lineage in one transaction."""
+    statements = build_event_statements(events)
+    lineage_events = [
+        (event_label, event_id, link_rel_type, flow_data)
+        for event_label, event_id, _, _, link_rel_type, flow_data, _ in events
+        if link_rel_type and has_lineage(flow_data)
+    ]
+    statements.extend(build_bulk_lineage_statements(lineage_events))
+    for query, params in statements:
+        tx.run(query, **params).consume()
+
+def _write_with_retries(driver, batch: list):
+    """Writes one batch, retrying transient errors (e.g. deadlocks) with exponential backoff."""
+    for attempt in range(BULK_TRANSIENT_RETRIES + 1):
+        try:
+            with driver.session() as session:
+                session.execute_write(write_events_tx, batch)
+            return
+        except TransientError as e:
+            if attempt == BULK_TRANSIENT_RETRIES:
+                raise
+            delay = BULK_RETRY_BACKOFF_SECONDS * (2 ** attempt)
+            print(f"Transient error writing bulk import batch ({e}); retrying in {delay:.1f}s.")
+            time.sleep(delay)
+
+def _iter_event_batches(records, batch_size: int, stats: dict):
+    batch = []
+    for record in records:
+        stats["records_read"] += 1
+        event = prepare_event(record)
+        if event is None:
+            stats["records_skipped"] += 1
+            continue
+        batch.append(event)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def bulk_import_events(records, batch_size: int = DEFAULT_BULK_BATCH_SIZE, workers: int = DEFAULT_BULK_WORKERS, progress_every: int = 50000) -> dict:
+    """
+    Writes an iterable of event records to Neo4j in batched transactions using `workers` parallel
+    sessions. Returns a throughput report (also printed).
+    """
+    handler = get_neo4j_handler()
+    driver = handler.driver # Runs (or retries) the schema bootstrap before any worker starts
+    stats = {
+        "records_read": 0, "records_skipped": 0, "events_written": 0, "lineage_nodes": 0,
+        "lineage_edges": 0, "batches_failed": 0, "events_failed": 0, "elapsed_seconds": 0.0, "events_per_second": 0.0
+    }
+    if driver is None or handler is None:
+        print("Neo4j driver not initialized. Cannot run bulk import.")
+        return stats
+    batch_size = max(1, batch_size)
+    workers = max(1, workers)
+    if workers > 1 and not lineage_constraint_ready():
+        print("LineageNode key constraint is missing; importing with a single writer to avoid duplicate lineage nodes.")
+        workers = 1
+    stats_lock = threading.Lock()
+    # Bounds how many prepared batches wait in memory for a free writer
+    in_flight = threading.BoundedSemaphore(workers * 2)
+    started = time.perf_counter()
+    next_progress = [progress_every]
+
+    def _write(batch):
+        try:
+            _write_with_retries(driver, batch)
+            with stats_lock:
+                stats["events_written"] += len(batch)
+                for event in batch:
+                    flow_data = event[5] or {}
+                    stats["lineage_nodes"] += len(flow_data.get("nodes", []))
+                    stats["lineage_edges"] += len(flow_data.get("edges", []))
+                if progress_every and stats["events_written"] >= next_progress[0]:
+                    elapsed = time.perf_counter() - started
+                    print(f"Bulk import: {stats['events_written']} events written ({stats['events_written'] / elapsed:,.0f} events/s).")
+                    next_progress[0] += progress_every
+        except Exception as e:
+            print(f"Error writing bulk import batch of {len(batch)} events: {e}")
+            with stats_lock:
+                stats["batches_failed"] += 1
+                stats["events_failed"] += len(batch)
+        finally:
+            in_flight.release()
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="neo4j-bulk") as executor:
+        for batch in _iter_event_batches(records, batch_size, stats):
+            in_flight.acquire()
+            executor.submit(_write, batch)
+
+    stats["elapsed_seconds"] = round(time.perf_counter() - started, 3)
+    stats["events_per_second"] = round(stats["events_written"] / stats["elapsed_seconds"], 1) if stats["elapsed_seconds"] else 0.0
+    print_throughput_report(stats, batch_size, workers)
+    return stats
+
+def print_throughput_report(stats: dict, batch_size: int, workers: int):
+    print("\n--- Neo4j Bulk Import Report ---")
+    print(f"Batch size / writer sessions: {batch_size} / {workers}")
+    print(f"Records read: {stats['records_read']} (skipped: {stats['records_skipped']})")
+    print(f"Events written: {stats['events_written']} (failed: {stats['events_failed']} in {stats['batches_failed']} batches)")
+    print(f"Lineage nodes / edges submitted: {stats['lineage_nodes']} / {stats['lineage_edges']}")
+    print(f"Elapsed: {stats['elapsed_seconds']}s, throughput: {stats['events_per_second']:,} events/s")
+    print("--- End Report ---\n")
+
+def bulk_import_file(path: str, input_format: str = None, batch_size: int = DEFAULT_BULK_BATCH_SIZE, workers: int = DEFAULT_BULK_WORKERS) -> dict:
+    """Bulk imports an NDJSON/Parquet file of events (see module comment for the record format)."""
+    return bulk_import_events(iter_event_records(path, input_format), batch_size=batch_size, workers=workers)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import historical Vulcanus events and lineage graphs into Neo4j.")
+    parser.add_argument("path", help="NDJSON (.ndjson/.jsonl) or Parquet (.parquet) file of events")
+    parser.add_argument("--format", choices=sorted(set(BULK_IMPORT_FORMATS.values())), default=None, help="Input format (default: from file extension)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BULK_BATCH_SIZE, help="Events per write transaction")
+    parser.add_argument("--workers", type=int, default=DEFAULT_BULK_WORKERS, help="Parallel writer sessions")
+    args = parser.parse_args(argv)
+    stats = bulk_import_file(args.path, input_format=args.format, batch_size=args.batch_size, workers=args.workers)
+    return 1 if stats["events_failed"] else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,240 @@
+# src/core/chart_reduction.py
+import math
+import os
+import re
+import numpy as np
+
+# Data reduction for generated ECharts options. Chart code typically embeds whole columns
+# (df['x'].tolist()), so a 1M-row line chart would ship megabytes of JSON to the browser through
+# st_echarts. reduce_chart_options() caps every series at CHART_POINT_BUDGET points before the options
+# leave the sandbox worker (and before they are cached):
+# - line series: Largest-Triangle-Three-Buckets (LTTB) keeps the visually significant points;
+#   series sharing a category axis keep the union of their selected points, so they stay aligned.
+# - scatter series: 2D grid binning keeps the first point of each occupied cell (outliers survive).
+# - bar series on an ordered axis (numeric/sorted labels, e.g. histograms): consecutive buckets are
+#   merged; on an unordered category axis the top CHART_TOP_CATEGORIES categories are kept and the rest
+#   merged into "Other". Merged bars are summed only for count-like series (non-negative integer values,
+#   or a name such as "count"/"histogram"/"total"); anything else (prices, rates, averages) is averaged.
+#   Pie/funnel slices are parts of a whole, so the slices folded into "Other" are always summed.
+# Anything else (other series types, dataset.source tables) is passed through unchanged.
+CHART_POINT_BUDGET = int(os.getenv("CHART_POINT_BUDGET", "2000"))
+CHART_TOP_CATEGORIES = int(os.getenv("CHART_TOP_CATEGORIES", "50"))
+OTHER_CATEGORY_NAME = "Other"
+LTTB_SERIES_TYPES = {"line"}
+BINNED_SERIES_TYPES = {"scatter", "effectScatter"}
+MERGED_SERIES_TYPES = {"bar", "pictorialBar"}
+TOP_N_SERIES_TYPES = {"pie", "funnel"}
+COUNT_SERIES_NAME_PATTERN = re.compile(r"count|freq|histogram|total|sum|number|qty|quantity", re.IGNORECASE)
+
+def _as_list(value) -> list:
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+def _item_value(item):
+    return item.get("value") if isinstance(item, dict) else item
+
+def _to_float(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+def _is_pair(item) -> bool:
+    value = _item_value(item)
+    return isinstance(value, (list, tuple)) and len(value) >= 2
+
+def _pairs_to_arrays(data: list) -> tuple:
+    values = [_item_value(item) for item in data]
+    xs = np.array([_to_float(value[0]) for value in values])
+    ys = np.array([_to_float(value[1]) for value in values])
+    return xs, ys
+
+def lttb_indices(xs, ys, threshold: int) -> list[int]:
+    """Indices of the points Largest-Triangle-Three-Buckets keeps out of (xs, ys), first and last included."""
+    n = len(ys)
+    if threshold >= n or threshold < 3:
+        return list(range(n))
+    xs = np.nan_to_num(np.asarray(xs, dtype=float))
+    ys = np.nan_to_num(np.asarray(ys, dtype=float))
+    every = (n - 2) / (threshold - 2)
+    selected = [0]
+    anchor = 0
+    for bucket in range(threshold - 2):
+        range_start = int(math.floor(bucket * every)) + 1
+        range_end = int(math.floor((bucket + 1) * every)) + 1
+        next_start = range_end
+        next_end = min(int(math.floor((bucket + 2) * every)) + 1, n)
+        avg_x = xs[next_start:next_end].mean()
+        avg_y = ys[next_start:next_end].mean()
+        areas = np.abs((xs[anchor] - avg_x) * (ys[range_start:range_end] - ys[anchor])
+                       - (xs[anchor] - xs[range_start:range_end]) * (avg_y - ys[anchor]))
+        anchor = range_start + int(np.argmax(areas))
+        selected.append(anchor)
+    selected.append(n - 1)
+    return selected
+
+def grid_bin_indices(xs, ys, budget: int) -> list[int]:
+    """Indices of the first point in each occupied cell of a sqrt(budget) x sqrt(budget) grid; non-numeric points are dropped."""
+    cells = max(1, int(math.sqrt(budget)))
+    valid = np.flatnonzero(np.isfinite(xs) & np.isfinite(ys))
+    if len(valid) == 0:
+        return []
+    def cell_of(values):
+        low, high = values.min(), values.max()
+        span = (high - low) or 1.0
+        return np.minimum(((values - low) / span * cells).astype(np.int64), cells - 1)
+    keys = cell_of(xs[valid]) * cells + cell_of(ys[valid])
+    _, first = np.unique(keys, return_index=True)
+    return sorted(valid[first].tolist())
+
+def _bucket_bounds(n: int, budget: int) -> list[tuple]:
+    size = math.ceil(n / budget)
+    return [(start, min(start + size, n)) for start in range(0, n, size)]
+
+def _sum_values(items: list) -> float:
+    return float(np.nansum([_to_float(_item_value(item)) for item in items]))
+
+def _is_count_like(series: dict, values) -> bool:
+    """True if merged bars of this series should be summed (counts/totals) rather than averaged."""
+    if COUNT_SERIES_NAME_PATTERN.search(str(series.get("name") or "")):
+        return True
+    values = np.asarray(values, dtype=float)
+    values = values[np.isfinite(values)]
+    return len(values) > 0 and bool(np.all(values >= 0)) and bool(np.all(values == np.round(values)))
+
+def _merge_values(values, count_like: bool) -> float:
+    values = np.asarray(values, dtype=float)
+    if count_like:
+        return float(np.nansum(values))
+    return float(np.nanmean(values)) if np.isfinite(values).any() else math.nan
+
+def _bucket_label(labels: list, start: int, end: int):
+    return labels[start] if end - start == 1 else f"{labels[start]} - {labels[end - 1]}"
+
+def _is_ordered(labels: list) -> bool:
+    if all(not math.isnan(_to_float(label)) for label in labels):
+        return True
+    try:
+        return all(labels[i] <= labels[i + 1] for i in range(len(labels) - 1))
+    except TypeError:
+        return False
+
+def _category_axis(options: dict, series: dict):
+    """(axis key, axis index) of the category axis a series' plain values line up with, or None."""
+    for key, default_type in (("xAxis", "category"), ("yAxis", "value")):
+        axes = _as_list(options.get(key))
+        index = series.get(f"{key}Index", 0)
+        if isinstance(index, int) and 0 <= index < len(axes) and isinstance(axes[index], dict):
+            axis = axes[index]
+            if axis.get("type", default_type) == "category" and isinstance(axis.get("data"), list):
+                return key, index
+    return None
+
+def _reduce_pair_series(series: dict, budget: int) -> dict:
+    data = series["data"]
+    xs, ys = _pairs_to_arrays(data)
+    series_type = series.get("type")
+    if series_type in BINNED_SERIES_TYPES:
+        return dict(series, data=[data[i] for i in grid_bin_indices(xs, ys, budget)])
+    if series_type in MERGED_SERIES_TYPES:
+        count_like = _is_count_like(series, ys)
+        order = np.argsort(xs, kind="stable")
+        reduced = []
+        for start, end in _bucket_bounds(len(order), budget):
+            bucket = order[start:end]
+            reduced.append([float(np.nanmean(xs[bucket])), _merge_values(ys[bucket], count_like)])
+        return dict(series, data=reduced)
+    if np.isnan(xs).any(): # Time strings etc.: treat points as evenly spaced
+        xs = np.arange(len(data), dtype=float)
+    return dict(series, data=[data[i] for i in lttb_indices(xs, ys, budget)])
+
+def _reduce_category_group(labels: list, group: list, budget: int, top_categories: int) -> tuple:
+    """Reduces one category axis and the series aligned with it. Returns (labels, {series position: data}) or None if nothing to do."""
+    n = len(labels)
+    types = {series.get("type") for _, series in group}
+    if types & (LTTB_SERIES_TYPES | BINNED_SERIES_TYPES) or not types <= MERGED_SERIES_TYPES:
+        if n <= budget:
+            return None
+        per_series = max(3, budget // len(group))
+        keep = set()
+        for _, series in group:
+            ys = np.array([_to_float(_item_value(item)) for item in series["data"]])
+            keep.update(lttb_indices(np.arange(n, dtype=float), ys, per_series))
+        keep = sorted(keep)
+        return [labels[i] for i in keep], {position: [series["data"][i] for i in keep] for position, series in group}
+    values = {position: np.array([_to_float(_item_value(item)) for item in series["data"]]) for position, series in group}
+    count_like = {position: _is_count_like(series, values[position]) for position, series in group}
+    if _is_ordered(labels):
+        if n <= budget:
+            return None
+        bounds = _bucket_bounds(n, budget)
+        return ([_bucket_label(labels, start, end) for start, end in bounds],
+                {position: [_merge_values(values[position][start:end], count_like[position]) for start, end in bounds] for position, _ in group})
+    if n <= top_categories:
+        return None
+    totals = np.zeros(n)
+    for position, _ in group:
+        totals += np.nan_to_num(values[position])
+    keep = sorted(np.argsort(-totals, kind="stable")[:top_categories - 1].tolist()) # Original order, "Other" last
+    dropped = sorted(set(range(n)) - set(keep))
+    return ([labels[i] for i in keep] + [OTHER_CATEGORY_NAME],
+            {position: [series["data"][i] for i in keep] + [_merge_values(values[position][dropped], count_like[position])] for position, series in group})
+
+def _reduce_slices(series: dict, top_categories: int) -> dict:
+    data = series["data"]
+    if len(data) <= top_categories:
+        return series
+    order = sorted(range(len(data)), key=lambda i: -np.nan_to_num(_to_float(_item_value(data[i]))))
+    kept = [data[i] for i in order[:top_categories - 1]]
+    other = _sum_values([data[i] for i in order[top_categories - 1:]])
+    return dict(series, data=kept + [{"name": OTHER_CATEGORY_NAME, "value": other}])
+
+def reduce_chart_options(options, budget: int = CHART_POINT_BUDGET, top_categories: int = CHART_TOP_CATEGORIES):
+    """
+    Returns ECharts options whose series hold at most about `budget` points (see the module notes).
+    The input is not modified; options without oversized series are returned as is.
+    """
+    if not isinstance(options, dict) or not isinstance(options.get("series"), (list, dict)):
+        return options
+    budget = max(3, budget)
+    top_categories = max(2, top_categories)
+    series_list = list(_as_list(options["series"]))
+    axes = {key: list(_as_list(options.get(key))) for key in ("xAxis", "yAxis")}
+    groups = {}
+    changed = False
+    for position, series in enumerate(series_list):
+        if not isinstance(series, dict) or not isinstance(series.get("data"), list) or not series["data"]:
+            continue
+        data = series["data"]
+        if series.get("type") in TOP_N_SERIES_TYPES:
+            reduced = _reduce_slices(series, top_categories)
+        elif _is_pair(data[0]):
+            reduced = _reduce_pair_series(series, budget) if len(data) > budget else series
+        else:
+            axis = _category_axis(options, series)
+            if axis is not None:
+                groups.setdefault(axis, []).append((position, series))
+            continue
+        if reduced is not series:
+            series_list[position] = reduced
+            changed = True
+    for (key, index), group in groups.items():
+        labels = axes[key][index]["data"]
+        if any(len(series["data"]) != len(labels) for _, series in group):
+            continue # Not aligned with the axis labels; reducing could mislabel points
+        result = _reduce_category_group(labels, group, budget, top_categories)
+        if result is None:
+            continue
+        new_labels, new_data = result
+        axes[key][index] = dict(axes[key][index], data=new_labels)
+        for position, data in new_data.items():
+            series_list[position] = dict(series_list[position], data=data)
+        changed = True
+    if not changed:
+        return options
+    reduced_options = dict(options, series=series_list if isinstance(options["series"], list) else series_list[0])
+    for key, axis_list in axes.items():
+        if key in options:
+            reduced_options[key] = axis_list if isinstance(options[key], list) else axis_list[0]
+    return reduced_options
@@ -1,6 +1,11 @@
 # src/core/code_processor.py
 import ast
 import json
+import os
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from core.flow_export import CompactFlowGraph
 # Note: The LLM-based generate_mermaid_flow_from_description is now in agents.py
 # and the LLM-based data lineage analysis (if needed) will be handled by RagbitsDataLineageAgent.
 # This file remains for AST-based code analysis primarily.
@@ -49,6 +54,22 @@ def extract_call_chain(node):
     elif isinstance(node, ast.Call): # Handles func() or obj.func() when called directly
         return extract_call_chain(node.func)
     return None
+def _classify_call(full_call_chain, is_simple_name=False):
+    """
+    Classifies a call chain as a data source, data sink or regular call.
+    Returns a (callee_id, callee_label, callee_type) tuple; callee_id is None for an empty chain.
+    """
+    call_chain = full_call_chain or ""
+    for pattern_name, pattern_str in DATA_SOURCE_PATTERNS.items():
+        if pattern_str in call_chain:
+            return f"DataSource_{pattern_name}", pattern_str, "data_source"
+    for pattern_name, pattern_str in DATA_SINK_PATTERNS.items():
+        if pattern_str in call_chain:
+            return f"DataSink_{pattern_name}", pattern_str, "data_sink"
+    if not full_call_chain:
+        return None, None, "method"
+    # If it's a simple name (not attr), assume it's a function, otherwise it's an attribute call
+    return full_call_chain, full_call_chain.split('.')[-1], "function" if is_simple_name else "method"
 def analyze_python_code_for_flow(code: str) -> dict:
     """
     Analyzes Python code to extract a simplified flow structure (functions and their calls)
@@ -103,40 +124,11 @@ def analyze_python_code_for_flow(code: str) -> dict:
                     else:
                          add_node_if_new(caller_name, caller_name, "scope") # Default if not found explicitly
                 full_call_chain = extract_call_chain(node.func)
-                callee_id = None
-                callee_label = None
-                callee_type = "method" # Default for function/method calls
-                # Check for data source/sink patterns
-                is_data_source = False
-                for pattern_name, pattern_str in DATA_SOURCE_PATTERNS.items():
-                    if pattern_str in (full_call_chain or ""):
-                        callee_id = f"DataSource_{pattern_name}"
-                        callee_label = pattern_str
-                        callee_type = "data_source"
-                        flow_data["data_sources_identified"].append(pattern_str)
-                        is_data_source = True
-                        break
-                
-                is_data_sink = False
-                if not is_data_source: # Only check for sink if not already identified as source
-                    for pattern_name, pattern_str in DATA_SINK_PATTERNS.items():
-                        if pattern_str in (full_call_chain or ""):
-                            callee_id = f"DataSink_{pattern_name}"
-                            callee_label = pattern_str
-                            callee_type = "data_sink"
-                            flow_data["data_sinks_identified"].append(pattern_str)
-                            is_data_sink = True
-                            break
-                # If not a recognized data source/sink, treat as a regular function/method call
-                if not is_data_source and not is_data_sink:
-                    if full_call_chain:
-                        callee_id = full_call_chain
-                        callee_label = full_call_chain.split('.')[-1] # Use last part as label
-                        # If it's a simple name (not attr), assume it's a function
-                        if isinstance(node.func, ast.Name):
-                            callee_type = "function" 
-                        else:
-                            callee_type = "method" # It's an attribute call
+                callee_id, callee_label, callee_type = _classify_call(full_call_chain, isinstance(node.func, ast.Name))
+                if callee_type == "data_source":
+                    flow_data["data_sources_identified"].append(callee_label)
+                elif callee_type == "data_sink":
+                    flow_data["data_sinks_identified"].append(callee_label)
                 if callee_id:
                     add_node_if_new(callee_id, callee_label or callee_id, callee_type)
                     # Add edge
@@ -156,4 +148,661 @@ def analyze_python_code_for_flow(code: str) -> dict:
             unique_edges.append(edge)
             seen_edges.add(edge_tuple)
     flow_data["edges"] = unique_edges
-    return flow_data
\ No newline at end of file
+    return flow_data
+
+# --- Data lineage (def-use) analysis ---
+# Tracks which variables hold data read from DATA_SOURCE_PATTERNS calls and follows them through
+# assignments and calls until they reach DATA_SINK_PATTERNS calls, emitting
+# source -> transformation -> sink edges. Each function is analyzed on its own (intra-procedural);
+# calls to module-level functions are linked through small per-function summaries that record
+# where each parameter flows and which data the function returns.
+_PARAM_MARKER_PREFIX = "@param:"
+_WRITE_FILE_MODES = ("w", "a", "x", "+")
+
+def looks_like_python_code(text: str) -> bool:
+    """
+    Heuristic used to decide whether free-form input is Python code (rather than prose that
+    happens to parse, such as a single word). Requires a definition, import, assignment or call.
+    """
+    try:
+        tree = ast.parse(text)
+    except (SyntaxError, ValueError):
+        return False
+    return any(isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.Import, ast.ImportFrom, ast.Assign, ast.Call)) for node in ast.walk(tree))
+
+def _match_data_pattern(call_signature: str, patterns: dict):
+    """
+    Matches a call signature against DATA_SOURCE_PATTERNS/DATA_SINK_PATTERNS.
+    Besides plain substring matching, specific method names such as 'to_csv' or 'get_object'
+    match on their own, since the receiver is usually a local variable (e.g. `df.to_csv`).
+    Returns (pattern_name, pattern_str) or None.
+    """
+    method_name = call_signature.split("(")[0].rsplit(".", 1)[-1]
+    for pattern_name, pattern_str in patterns.items():
+        if pattern_str in call_signature:
+            return pattern_name, pattern_str
+        pattern_method = pattern_str.split("(")[0].rsplit(".", 1)[-1] if "(" not in pattern_str.rsplit(".", 1)[-1] else ""
+        if "_" in pattern_method and pattern_method == method_name:
+            return pattern_name, pattern_str
+    return None
+
+def _constant_str(node):
+    """Returns the value of a string literal node, or None."""
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return node.value
+    return None
+
+class _DataLineageAnalyzer:
+    """Def-use lineage analysis over a single module's AST (see analyze_python_code_for_lineage)."""
+    def __init__(self, tree):
+        self.tree = tree
+        self.imports = {} # Local alias -> imported qualified name, e.g. {'pd': 'pandas'}
+        self.nodes = {} # Node id -> node dict (insertion ordered)
+        self.edges = {} # (source, target, label) -> edge dict (insertion ordered)
+        self.summaries = {} # Module-level function name -> {"params", "param_targets", "returns"}
+        self.current_summary = None
+        self.emit = False
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                for alias in node.names:
+                    self.imports[alias.asname or alias.name.split(".")[0]] = alias.name if alias.asname else alias.name.split(".")[0]
+            elif isinstance(node, ast.ImportFrom) and node.module:
+                for alias in node.names:
+                    self.imports[alias.asname or alias.name] = f"{node.module}.{alias.name}"
+
+    def run(self) -> dict:
+        module_functions = [node for node in self.tree.body if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef))]
+        scoped_functions = []
+        for node in ast.walk(self.tree):
+            if isinstance(node, ast.ClassDef):
+                scoped_functions += [(f"{node.name}.{item.name}", item) for item in node.body if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef))]
+        for function_node in module_functions:
+            self.summaries[function_node.name] = {
+                "params": [arg.arg for arg in function_node.args.posonlyargs + function_node.args.args + function_node.args.kwonlyargs],
+                "param_targets": {},
+                "returns": set()
+            }
+        # Two silent rounds settle the summaries (callees may be defined after their callers),
+        # the final round emits nodes and edges using the settled summaries.
+        for emit in (False, False, True):
+            self.emit = emit
+            for function_node in module_functions:
+                self._analyze_function(function_node.name, function_node, self.summaries[function_node.name])
+            if emit:
+                for scope_name, function_node in scoped_functions:
+                    self._analyze_function(scope_name, function_node, None)
+                self.current_summary = None
+                self._visit_statements(self.tree.body, "global", {"vars": {}, "sink_handles": {}})
+        nodes = list(self.nodes.values())
+        return {
+            "nodes": nodes,
+            "edges": list(self.edges.values()),
+            "data_sources_identified": sorted({node["label"] for node in nodes if node["type"] == "data_source"}),
+            "data_sinks_identified": sorted({node["label"] for node in nodes if node["type"] == "data_sink"})
+        }
+
+    def _analyze_function(self, scope_name, function_node, summary):
+        state = {"vars": {}, "sink_handles": {}}
+        if summary is not None:
+            summary["param_targets"] = {param: set() for param in summary["params"]}
+            summary["returns"] = set()
+            for param in summary["params"]:
+                state["vars"][param] = {f"{_PARAM_MARKER_PREFIX}{param}"}
+        self.current_summary = summary
+        self._visit_statements(function_node.body, scope_name, state)
+        self.current_summary = None
+
+    # --- Graph helpers ---
+    def _add_node(self, node_id, label, node_type):
+        if self.emit and node_id not in self.nodes:
+            self.nodes[node_id] = {"id": node_id, "label": label, "type": node_type}
+
+    def _flow(self, origins, target_id, label):
+        """Adds edges from every origin to target_id; parameter markers are recorded in the current summary."""
+        for origin in origins:
+            if origin.startswith(_PARAM_MARKER_PREFIX):
+                if self.current_summary is not None:
+                    param = origin[len(_PARAM_MARKER_PREFIX):]
+                    self.current_summary["param_targets"].setdefault(param, set()).add((target_id, label))
+            elif self.emit and origin != target_id:
+                self.edges.setdefault((origin, target_id, label), {"source": origin, "target": target_id, "label": label})
+
+    # --- Statements ---
+    def _visit_statements(self, statements, scope_name, state):
+        for statement in statements:
+            self._visit_statement(statement, scope_name, state)
+
+    def _visit_statement(self, statement, scope_name, state):
+        if isinstance(statement, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.Import, ast.ImportFrom)):
+            return # Nested scopes are analyzed separately
+        if isinstance(statement, ast.Assign):
+            origins = self._expr_origins(statement.value, scope_name, state)
+            for target in statement.targets:
+                self._bind(target, origins, statement.value, scope_name, state)
+        elif isinstance(statement, ast.AnnAssign) and statement.value is not None:
+            self._bind(statement.target, self._expr_origins(statement.value, scope_name, state), statement.value, scope_name, state)
+        elif isinstance(statement, ast.AugAssign):
+            origins = self._expr_origins(statement.value, scope_name, state) | self._expr_origins(statement.target, scope_name, state)
+            self._bind(statement.target, origins, None, scope_name, state)
+        elif isinstance(statement, (ast.For, ast.AsyncFor)):
+            self._bind(statement.target, self._expr_origins(statement.iter, scope_name, state), None, scope_name, state)
+            self._visit_statements(statement.body, scope_name, state)
+            self._visit_statements(statement.orelse, scope_name, state)
+        elif isinstance(statement, (ast.With, ast.AsyncWith)):
+            for item in statement.items:
+                origins = self._expr_origins(item.context_expr, scope_name, state)
+                if item.optional_vars is not None:
+                    self._bind(item.optional_vars, origins, item.context_expr, scope_name, state)
+            self._visit_statements(statement.body, scope_name, state)
+        elif isinstance(statement, ast.Return):
+            origins = self._expr_origins(statement.value, scope_name, state)
+            if self.current_summary is not None:
+                self.current_summary["returns"] |= origins
+        else:
+            # If/While/Try/Expr/...: evaluate expressions (to catch sinks) and visit nested blocks in order
+            for child in ast.iter_child_nodes(statement):
+                if isinstance(child, ast.stmt):
+                    self._visit_statement(child, scope_name, state)
+                elif isinstance(child, ast.expr):
+                    self._expr_origins(child, scope_name, state)
+                elif isinstance(child, ast.ExceptHandler):
+                    self._visit_statements(child.body, scope_name, state)
+
+    def _bind(self, target, origins, value, scope_name, state):
+        """Assigns origins to an assignment target (strong update for names, weak update for items/attributes)."""
+        if isinstance(target, ast.Name):
+            state["vars"][target.id] = set(origins)
+            sink_id = self._file_sink_handle(value, scope_name) if isinstance(value, ast.Call) else None
+            if sink_id:
+                state["sink_handles"][target.id] = sink_id
+            else:
+                state["sink_handles"].pop(target.id, None)
+        elif isinstance(target, (ast.Tuple, ast.List)):
+            for element in target.elts:
+                self._bind(element, origins, None, scope_name, state)
+        elif isinstance(target, ast.Starred):
+            self._bind(target.value, origins, None, scope_name, state)
+        elif isinstance(target, (ast.Subscript, ast.Attribute)):
+            root = target.value
+            while isinstance(root, (ast.Subscript, ast.Attribute)):
+                root = root.value
+            if isinstance(root, ast.Name):
+                state["vars"].setdefault(root.id, set()).update(origins)
+
+    # --- Expressions ---
+    def _expr_origins(self, expr, scope_name, state) -> set:
+        """Returns the lineage node ids (and parameter markers) the value of expr derives from."""
+        if expr is None or isinstance(expr, ast.Lambda):
+            return set()
+        if isinstance(expr, ast.Name):
+            return set(state["vars"].get(expr.id, ()))
+        if isinstance(expr, ast.Call):
+            return self._call_origins(expr, scope_name, state)
+        if isinstance(expr, (ast.ListComp, ast.SetComp, ast.GeneratorExp, ast.DictComp)):
+            comprehension_state = {"vars": dict(state["vars"]), "sink_handles": state["sink_handles"]}
+            origins = set()
+            for generator in expr.generators:
+                iter_origins = self._expr_origins(generator.iter, scope_name, comprehension_state)
+                self._bind(generator.target, iter_origins, None, scope_name, comprehension_state)
+                origins |= iter_origins
+            elements = [expr.key, expr.value] if isinstance(expr, ast.DictComp) else [expr.elt]
+            for element in elements:
+                origins |= self._expr_origins(element, scope_name, comprehension_state)
+            return origins
+        origins = set()
+        for child in ast.iter_child_nodes(expr):
+            if isinstance(child, ast.expr):
+                origins |= self._expr_origins(child, scope_name, state)
+        return origins
+
+    def _resolve_chain(self, call_chain):
+        head, _, rest = call_chain.partition(".")
+        if head in self.imports:
+            return self.imports[head] + (f".{rest}" if rest else "")
+        return call_chain
+
+    def _call_signature(self, call_chain, call):
+        """Call chain enriched with argument hints, e.g. '.execute("INSERT")' for SQL statements."""
+        first_arg = _constant_str(call.args[0]) if call.args else None
+        if call_chain.endswith(".execute") and first_arg and first_arg.split():
+            return f'{call_chain}("{first_arg.split()[0].upper()}")'
+        return call_chain
+
+    def _open_mode(self, call):
+        mode = _constant_str(call.args[1]) if len(call.args) > 1 else None
+        for keyword in call.keywords:
+            if keyword.arg == "mode":
+                mode = _constant_str(keyword.value)
+        return mode or "r"
+
+    def _endpoint_node(self, kind, pattern_name, pattern_str, call, scope_name):
+        """Creates (or reuses) a data source/sink node; calls on the same literal path share a node."""
+        # The first literal argument names the file/table/URL, except for SQL execute() calls
+        location = _constant_str(call.args[0]) if call.args and not pattern_str.startswith(".execute") else None
+        prefix = "DataSource" if kind == "data_source" else "DataSink"
+        if location:
+            node_id, label = f"{prefix}_{pattern_name}:{location}", f"{pattern_str} ({location})"
+        else:
+            node_id, label = f"{prefix}_{pattern_name}@{scope_name}:{call.lineno}", pattern_str
+        self._add_node(node_id, label, kind)
+        return node_id
+
+    def _file_sink_handle(self, call, scope_name):
+        """Returns a sink node id if call opens a file for writing (e.g. `open(path, "w")`)."""
+        call_chain = extract_call_chain(call.func)
+        if call_chain == "open" and any(flag in self._open_mode(call) for flag in _WRITE_FILE_MODES):
+            return self._endpoint_node("data_sink", 'open(..., "w")', DATA_SINK_PATTERNS['open(..., "w")'], call, scope_name)
+        return None
+
+    def _call_origins(self, call, scope_name, state) -> set:
+        raw_chain = extract_call_chain(call.func) or ""
+        call_chain = self._resolve_chain(raw_chain)
+        receiver_origins = self._expr_origins(call.func.value, scope_name, state) if isinstance(call.func, ast.Attribute) else set()
+        arg_origins = [self._expr_origins(arg, scope_name, state) for arg in call.args]
+        keyword_origins = {keyword.arg: self._expr_origins(keyword.value, scope_name, state) for keyword in call.keywords}
+        inputs = receiver_origins.union(*arg_origins, *keyword_origins.values())
+
+        # Writes through a file handle opened for writing, e.g. `f.write(data)` or `json.dump(data, f)`
+        handle_names = [arg.id for arg in call.args if isinstance(arg, ast.Name)]
+        if isinstance(call.func, ast.Attribute) and isinstance(call.func.value, ast.Name):
+            handle_names.append(call.func.value.id)
+        for handle_name in handle_names:
+            if handle_name in state["sink_handles"]:
+                self._flow(inputs, state["sink_handles"][handle_name], "writes_to")
+                return set()
+
+        if raw_chain == "open":
+            if any(flag in self._open_mode(call) for flag in _WRITE_FILE_MODES):
+                self._file_sink_handle(call, scope_name)
+                return set()
+            return {self._endpoint_node("data_source", 'open(..., "r")', DATA_SOURCE_PATTERNS['open(..., "r")'], call, scope_name)}
+
+        call_signature = self._call_signature(call_chain, call)
+        sink_match = _match_data_pattern(call_signature, DATA_SINK_PATTERNS)
+        source_match = _match_data_pattern(call_signature, DATA_SOURCE_PATTERNS)
+        # Patterns listed as both (e.g. requests.post) are sinks when they are handed tracked data
+        if sink_match and (inputs or not source_match):
+            sink_id = self._endpoint_node("data_sink", sink_match[0], sink_match[1], call, scope_name)
+            self._flow(inputs, sink_id, "writes_to")
+            return set()
+        if source_match:
+            source_id = self._endpoint_node("data_source", source_match[0], source_match[1], call, scope_name)
+            self._flow(inputs, source_id, "flows_to")
+            return {source_id}
+
+        summary = self.summaries.get(raw_chain)
+        if summary is not None:
+            return self._apply_summary(summary, call, arg_origins, keyword_origins)
+        if not inputs:
+            return set()
+        transform_id = f"Transform_{scope_name}.{raw_chain}@{call.lineno}:{call.col_offset}"
+        self._add_node(transform_id, raw_chain.rsplit(".", 1)[-1], "transformation")
+        self._flow(inputs, transform_id, "flows_to")
+        return {transform_id}
+
+    def _apply_summary(self, summary, call, arg_origins, keyword_origins) -> set:
+        """Links a call to a module-level function through that function's summary."""
+        origins_by_param = dict(zip(summary["params"], arg_origins))
+        for keyword_name, origins in keyword_origins.items():
+            if keyword_name in summary["params"]:
+                origins_by_param[keyword_name] = origins
+        for param, origins in origins_by_param.items():
+            for target_id, label in summary["param_targets"].get(param, ()):
+                self._flow(origins, target_id, label)
+        result = set()
+        for origin in summary["returns"]:
+            if origin.startswith(_PARAM_MARKER_PREFIX):
+                result |= origins_by_param.get(origin[len(_PARAM_MARKER_PREFIX):], set())
+            else:
+                result.add(origin)
+        return result
+
+def analyze_python_code_for_lineage(code: str) -> dict:
+    """
+    Computes variable-level data lineage for Python code: tracks which variables hold data read
+    from DATA_SOURCE_PATTERNS calls and follows them through assignments, transformations and
+    function calls to DATA_SINK_PATTERNS calls.
+    Returns a dictionary with 'nodes' (types 'data_source', 'transformation', 'data_sink') and
+    'edges' (source -> transformation -> sink), in the same shape as RagbitsDataLineageAgent output.
+    """
+    try:
+        return _DataLineageAnalyzer(ast.parse(code)).run()
+    except SyntaxError as e:
+        print(f"Syntax error in code: {e}")
+    except Exception as e:
+        print(f"Error during data lineage analysis: {e}")
+    return {"nodes": [], "edges": [], "data_sources_identified": [], "data_sinks_identified": []}
+
+# --- Project-level (multi-file) flow analysis ---
+# Per-file extraction results are cached in a JSON index keyed by the file's relative path.
+# A file is only reparsed when both its mtime and its content hash changed since the last run.
+# Indexes live in PROJECT_FLOW_INDEX_DIR (one file per analyzed root), never inside the analyzed project.
+# From the UI, only directories below PROJECT_FLOW_ALLOWED_ROOT can be analyzed (see resolve_project_dir).
+PROJECT_FLOW_INDEX_VERSION = 1
+PROJECT_FLOW_INDEX_DIR = os.path.abspath(os.path.expanduser(os.getenv("PROJECT_FLOW_INDEX_DIR", "~/.vulcanus/flow_index")))
+PROJECT_FLOW_ALLOWED_ROOT = os.path.realpath(os.path.expanduser(os.getenv("PROJECT_FLOW_ALLOWED_ROOT", "~/.vulcanus/projects")))
+PROJECT_FLOW_PARSE_CHUNKSIZE = int(os.getenv("PROJECT_FLOW_PARSE_CHUNKSIZE", "16")) # Files per process-pool task
+PROJECT_FLOW_PARALLEL_MIN_FILES = 32 # Below this, process start-up costs more than it saves
+DEFAULT_EXCLUDED_DIRS = {".git", "__pycache__", ".venv", "venv", "env", "node_modules", ".tox", ".nox", ".mypy_cache", ".pytest_cache", "build", "dist"}
+
+def module_name_from_path(root_dir: str, file_path: str) -> tuple[str, bool]:
+    """
+    Converts a file path into a dotted module name relative to root_dir.
+    Returns (module_name, is_package); is_package is True for __init__.py files.
+    """
+    rel_path = os.path.relpath(file_path, root_dir)
+    parts = rel_path[:-3].split(os.sep) if rel_path.endswith(".py") else rel_path.split(os.sep)
+    is_package = parts[-1] == "__init__"
+    if is_package:
+        parts = parts[:-1]
+    return ".".join(parts) or os.path.basename(os.path.abspath(root_dir)), is_package
+
+def _resolve_relative_import(module_name: str, is_package: bool, level: int, imported_module: str | None) -> str:
+    """Resolves `from ..x import y` style imports to an absolute dotted module name."""
+    package_parts = module_name.split(".") if is_package else module_name.split(".")[:-1]
+    if level > 1:
+        package_parts = package_parts[:len(package_parts) - (level - 1)]
+    if imported_module:
+        package_parts = package_parts + imported_module.split(".")
+    return ".".join(package_parts)
+
+def extract_python_file_flow(code: str, module_name: str, is_package: bool = False) -> dict:
+    """
+    Extracts the unresolved flow facts of a single Python module.
+    Returns a JSON-serializable record with:
+      - "definitions": [[qualified_name, type], ...] for every function/class defined in the module
+      - "imports": {local_alias: qualified_target}
+      - "calls": [[caller_qualified_name, call_chain, enclosing_class_qualified_name], ...]
+    Call chains are resolved to qualified names later, once every module of the project is known.
+    Raises SyntaxError if the code cannot be parsed.
+    """
+    tree = ast.parse(code)
+    definitions = []
+    imports = {}
+    calls = []
+
+    def visit(nodes, scope_name, class_name):
+        for node in nodes:
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                qualified_name = f"{scope_name}.{node.name}"
+                definitions.append([qualified_name, "method" if class_name == scope_name else "function"])
+                # Decorators and default values are evaluated in the enclosing scope
+                visit(node.decorator_list + node.args.defaults + [d for d in node.args.kw_defaults if d], scope_name, class_name)
+                visit(node.body, qualified_name, class_name)
+            elif isinstance(node, ast.ClassDef):
+                qualified_name = f"{scope_name}.{node.name}"
+                definitions.append([qualified_name, "class"])
+                visit(node.decorator_list + node.bases + [k.value for k in node.keywords], scope_name, class_name)
+                visit(node.body, qualified_name, qualified_name)
+            elif isinstance(node, ast.Import):
+                for alias in node.names:
+                    if alias.asname:
+                        imports[alias.asname] = alias.name
+                    else:
+                        # `import a.b` binds `a` locally
+                        top_level = alias.name.split(".")[0]
+                        imports[top_level] = top_level
+            elif isinstance(node, ast.ImportFrom):
+                if node.level:
+                    source_module = _resolve_relative_import(module_name, is_package, node.level, node.module)
+                else:
+                    source_module = node.module or ""
+                for alias in node.names:
+                    if alias.name != "*":
+                        imports[alias.asname or alias.name] = f"{source_module}.{alias.name}" if source_module else alias.name
+            else:
+                if isinstance(node, ast.Call):
+                    call_chain = extract_call_chain(node.func)
+                    if call_chain:
+                        calls.append([scope_name, call_chain, class_name or ""])
+                visit(ast.iter_child_nodes(node), scope_name, class_name)
+
+    visit(tree.body, module_name, None)
+    return {"definitions": definitions, "imports": imports, "calls": calls}
+
+def _resolve_call_target(call_chain: str, module_name: str, class_name: str, imports: dict, known_definitions: dict) -> tuple[str, bool]:
+    """
+    Resolves a raw call chain (e.g. 'helpers.clean' or 'self.save') to a qualified name.
+    Returns (qualified_name, is_project_definition).
+    """
+    head, _, rest = call_chain.partition(".")
+    if head in ("self", "cls") and class_name and rest:
+        candidate = f"{class_name}.{rest}"
+    elif head in imports:
+        candidate = imports[head] + (f".{rest}" if rest else "")
+    else:
+        candidate = f"{module_name}.{call_chain}"
+    if candidate in known_definitions:
+        return candidate, True
+    if head in imports:
+        # Imported from outside the project (e.g. 'pd.read_csv' -> 'pandas.read_csv')
+        return candidate, False
+    return call_chain, False
+
+def resolve_project_dir(project_dir: str, allowed_root: str = PROJECT_FLOW_ALLOWED_ROOT) -> str:
+    """
+    Resolves a user-supplied project directory (relative to allowed_root, or absolute) to a real path.
+    Raises ValueError if it points outside allowed_root (symlinks and '..' included) or is not a directory.
+    """
+    resolved = os.path.realpath(os.path.join(allowed_root, os.path.expanduser(project_dir.strip())))
+    if os.path.commonpath([resolved, allowed_root]) != allowed_root:
+        raise ValueError(f"Only directories below {allowed_root} can be analyzed.")
+    if not os.path.isdir(resolved):
+        raise ValueError(f"Directory not found: {project_dir}")
+    return resolved
+
+def default_project_flow_index_path(root_dir: str) -> str:
+    """Index file for a project root inside PROJECT_FLOW_INDEX_DIR, named after a hash of the root path."""
+    root_hash = hashlib.sha256(os.path.abspath(root_dir).encode("utf-8")).hexdigest()[:24]
+    return os.path.join(PROJECT_FLOW_INDEX_DIR, f"{root_hash}.json")
+
+def _load_project_flow_index(index_path: str) -> dict:
+    """Loads the on-disk per-file flow index, returning an empty index if missing or outdated."""
+    try:
+        with open(index_path, "r", encoding="utf-8") as f:
+            index = json.load(f)
+        if index.get("version") == PROJECT_FLOW_INDEX_VERSION:
+            return index
+        print(f"Project flow index at {index_path} has an old format; rebuilding.")
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"Error reading project flow index {index_path}: {e}. Rebuilding.")
+    return {"version": PROJECT_FLOW_INDEX_VERSION, "files": {}}
+
+def _save_project_flow_index(index_path: str, index: dict):
+    """Atomically writes the per-file flow index to disk."""
+    temp_path = f"{index_path}.tmp"
+    try:
+        os.makedirs(os.path.dirname(index_path), exist_ok=True)
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(index, f, separators=(",", ":"))
+        os.replace(temp_path, index_path)
+    except Exception as e:
+        print(f"Error writing project flow index {index_path}: {e}")
+
+def iter_python_files(root_dir: str, excluded_dirs: set = None):
+    """Yields the paths of all .py files below root_dir in a deterministic (sorted) order."""
+    excluded_dirs = DEFAULT_EXCLUDED_DIRS if excluded_dirs is None else excluded_dirs
+    for current_dir, dir_names, file_names in os.walk(root_dir):
+        dir_names[:] = sorted(d for d in dir_names if d not in excluded_dirs and not d.startswith("."))
+        for file_name in sorted(file_names):
+            file_path = os.path.join(current_dir, file_name)
+            if file_name.endswith(".py") and not os.path.islink(file_path): # Symlinks could point outside root_dir
+                yield file_path
+
+def _parse_project_file_compact(task: tuple) -> tuple:
+    """
+    Process-pool worker: parses one file and returns its flow facts as a compact tuple
+    (rel_path, definitions, imports, calls, error). Tuples pickle much smaller and faster than
+    nested dicts, which matters when thousands of results cross the process boundary.
+    """
+    rel_path, module_name, is_package, code_bytes = task
+    try:
+        record = extract_python_file_flow(code_bytes.decode("utf-8", errors="replace"), module_name, is_package)
+    except (SyntaxError, ValueError, RecursionError, MemoryError) as e: # e.g. null bytes, deeply nested expressions
+        return (rel_path, (), (), (), f"{type(e).__name__}: {e}")
+    return (
+        rel_path,
+        tuple(tuple(definition) for definition in record["definitions"]),
+        tuple(record["imports"].items()),
+        tuple(tuple(call) for call in record["calls"]),
+        None
+    )
+
+def _record_from_compact(module_name: str, compact_result: tuple) -> dict:
+    """Expands a compact worker result back into a JSON-serializable index record."""
+    _, definitions, imports, calls, error = compact_result
+    record = {
+        "definitions": [list(definition) for definition in definitions],
+        "imports": dict(imports),
+        "calls": [list(call) for call in calls],
+        "module": module_name
+    }
+    if error:
+        record["error"] = error
+    return record
+
+def _parse_project_files(tasks: list, max_workers: int = None, chunksize: int = PROJECT_FLOW_PARSE_CHUNKSIZE) -> list:
+    """
+    Parses the given (rel_path, module_name, is_package, code_bytes) tasks, fanning out across a
+    ProcessPoolExecutor when there is enough work to amortize the pool start-up cost.
+    Returns compact results in task order, so the merged graph is deterministic.
+    """
+    if max_workers == 1 or len(tasks) < PROJECT_FLOW_PARALLEL_MIN_FILES:
+        return [_parse_project_file_compact(task) for task in tasks]
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            # executor.map preserves input order regardless of completion order
+            results = list(executor.map(_parse_project_file_compact, tasks, chunksize=max(1, chunksize)))
+    except (OSError, BrokenProcessPool) as e:
+        print(f"Process pool unavailable for project flow parsing ({e}); parsing sequentially.")
+        results = [_parse_project_file_compact(task) for task in tasks]
+    return results
+
+def analyze_python_project_for_flow(root_dir: str, index_path: str = None, excluded_dirs: set = None,
+                                    max_workers: int = None, chunksize: int = PROJECT_FLOW_PARSE_CHUNKSIZE,
+                                    compact: bool = False):
+    """
+    Analyzes every Python file below root_dir and builds a cross-module call graph.
+    Node ids are fully qualified names (e.g. 'pkg.module.Class.method'), so same-named functions
+    in different modules no longer collide. Imports (including relative ones) are resolved to
+    qualified names. Per-file results are cached in an on-disk index (mtime + sha256; by default in
+    PROJECT_FLOW_INDEX_DIR), so only changed files are reparsed on subsequent runs.
+    Changed files are parsed in parallel across a process pool; max_workers (default: CPU count)
+    and chunksize (files per worker task) tune the fan-out, max_workers=1 forces sequential parsing.
+    Returns a dictionary with the same shape as analyze_python_code_for_flow, plus "analysis_stats".
+    With compact=True a CompactFlowGraph (see core.flow_export) is returned instead, which keeps
+    large graphs small in memory and can be streamed to Mermaid/DOT/GraphML/NDJSON.
+    """
+    root_dir = os.path.abspath(root_dir)
+    index_path = index_path or default_project_flow_index_path(root_dir)
+    index = _load_project_flow_index(index_path)
+    cached_files = index["files"]
+    current_files = {}
+    parse_tasks = [] # (rel_path, module_name, is_package, code_bytes) for new or changed files
+    file_metadata = {} # rel_path -> (module_name, mtime_ns, sha256) for files in parse_tasks
+    index_changed = False
+    stats = {"files_total": 0, "files_reparsed": 0, "files_failed": 0}
+
+    for file_path in iter_python_files(root_dir, excluded_dirs):
+        rel_path = os.path.relpath(file_path, root_dir)
+        try:
+            mtime_ns = os.stat(file_path).st_mtime_ns
+        except OSError as e:
+            print(f"Skipping unreadable file {file_path}: {e}")
+            continue
+        stats["files_total"] += 1
+        entry = cached_files.get(rel_path)
+        if entry and entry.get("mtime_ns") == mtime_ns:
+            current_files[rel_path] = entry
+            continue
+        try:
+            with open(file_path, "rb") as f:
+                code_bytes = f.read()
+        except OSError as e:
+            print(f"Skipping unreadable file {file_path}: {e}")
+            stats["files_total"] -= 1
+            continue
+        content_hash = hashlib.sha256(code_bytes).hexdigest()
+        index_changed = True
+        if entry and entry.get("sha256") == content_hash:
+            # Touched but unchanged: keep the cached extraction, just refresh the mtime
+            entry["mtime_ns"] = mtime_ns
+            current_files[rel_path] = entry
+            continue
+        module_name, is_package = module_name_from_path(root_dir, file_path)
+        parse_tasks.append((rel_path, module_name, is_package, code_bytes))
+        file_metadata[rel_path] = (module_name, mtime_ns, content_hash)
+
+    # Parse new/changed files (in parallel) and merge the results back in the parent process
+    for compact_result in _parse_project_files(parse_tasks, max_workers, chunksize):
+        rel_path = compact_result[0]
+        module_name, mtime_ns, content_hash = file_metadata[rel_path]
+        if compact_result[4]:
+            print(f"Could not parse {os.path.join(root_dir, rel_path)}: {compact_result[4]}")
+        record = _record_from_compact(module_name, compact_result)
+        record["mtime_ns"] = mtime_ns
+        record["sha256"] = content_hash
+        current_files[rel_path] = record
+        stats["files_reparsed"] += 1
+
+    if index_changed or set(current_files) != set(cached_files):
+        index["files"] = current_files
+        _save_project_flow_index(index_path, index)
+
+    stats["files_failed"] = sum(1 for record in current_files.values() if record.get("error"))
+    if compact:
+        graph = build_project_flow_graph(current_files, compact=True)
+        graph.metadata["analysis_stats"] = stats
+        return graph
+    flow_data = build_project_flow_graph(current_files)
+    flow_data["analysis_stats"] = stats
+    return flow_data
+
+def build_project_flow_graph(file_records: dict, compact: bool = False):
+    """
+    Merges per-file index records (as produced by extract_python_file_flow) into one global,
+    cross-module call graph with qualified node ids.
+    The graph is assembled as a CompactFlowGraph; with compact=True it is returned as such
+    (for streaming exports of very large graphs), otherwise it is expanded into a flow_data dict.
+    """
+    graph = CompactFlowGraph()
+    data_sources_identified = set()
+    data_sinks_identified = set()
+
+    known_definitions = {}
+    for rel_path in sorted(file_records):
+        record = file_records[rel_path]
+        known_definitions[record["module"]] = "module"
+        for qualified_name, definition_type in record["definitions"]:
+            known_definitions[qualified_name] = definition_type
+
+    seen_edges = set() # (source_position, target_position) pairs; every edge here is a "calls" edge
+    for rel_path in sorted(file_records):
+        record = file_records[rel_path]
+        module_name = record["module"]
+        graph.add_node(module_name, module_name, "module")
+        for qualified_name, definition_type in record["definitions"]:
+            graph.add_node(qualified_name, qualified_name.rsplit(".", 1)[-1], definition_type)
+        for caller_name, call_chain, class_name in record["calls"]:
+            target_name, is_project_definition = _resolve_call_target(call_chain, module_name, class_name, record["imports"], known_definitions)
+            if is_project_definition:
+                callee_id, callee_label, callee_type = target_name, target_name.rsplit(".", 1)[-1], known_definitions[target_name]
+            else:
+                callee_id, callee_label, callee_type = _classify_call(target_name, "." not in target_name)
+                if callee_type == "data_source":
+                    data_sources_identified.add(callee_label)
+                elif callee_type == "data_sink":
+                    data_sinks_identified.add(callee_label)
+                else:
+                    callee_type = "external"
+            if not callee_id:
+                continue
+            edge_key = (graph.add_node(caller_name), graph.add_node(callee_id, callee_label or callee_id, callee_type))
+            if edge_key not in seen_edges:
+                seen_edges.add(edge_key)
+                graph.add_edge(caller_name, callee_id, "calls")
+    graph.metadata["data_sources_identified"] = sorted(data_sources_identified)
+    graph.metadata["data_sinks_identified"] = sorted(data_sinks_identified)
+    return graph if compact else graph.to_flow_data()
@@ -0,0 +1,323 @@
+# src/core/code_sandbox.py
+import atexit
+import builtins
+import multiprocessing
+import os
+import queue
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+# Runs AI-generated chart/transformation code in a pool of worker processes instead of exec() in the
+# Streamlit server, so a slow or runaway snippet only ties up one worker and generated code from
+# several users runs in parallel across cores.
+# This is resource isolation, not a security boundary: the worker runs as the server's user, and code
+# that reaches the file system or network through pandas/numpy/polars is not stopped. The builtins
+# and import restrictions below only keep generated code away from the obvious escape hatches.
+# Each worker is its own single-process pool, so killing one (a run past its timeout, or a worker that
+# died at a limit) never fails the runs other users have in the remaining workers.
+# Limits per run: SANDBOX_TIMEOUT_SECONDS wall clock (SIGALRM inside the worker, then the parent
+# kills that worker if it doesn't come back), SANDBOX_CPU_SECONDS of CPU time (RLIMIT_CPU)
+# and SANDBOX_MEMORY_MB of private memory (RLIMIT_DATA). The rlimits/alarm are POSIX-only and are
+# skipped where unavailable. Imports inside generated code are limited to SANDBOX_ALLOWED_IMPORTS, and
+# the builtins in SANDBOX_BLOCKED_BUILTINS (file access, nested exec/eval) are not available to it.
+# Frames travel as Arrow IPC files, not pickles: inputs are the dataset cache files themselves
+# (memory-mapped by the worker), and a transformed frame stays in a temporary IPC file that the caller
+# gets as a SandboxFrameResult (path, row count, columns). The server only ever reads preview rows of it,
+# and the file is deleted when the result is released. Object columns Arrow can't type (e.g. mixed
+# str/int values) are sent as strings; results are never pickled.
+# Lazy runs expose the inputs as pl.scan_ipc LazyFrames instead of pandas DataFrames and collect the
+# resulting plan with the streaming engine, so Polars-native transformations get projection/predicate
+# pushdown; a LazyFrame result is sunk straight into the result file, so not even the worker holds all of it.
+# Chart options are reduced to a point budget (core/chart_reduction.py) inside the worker, so oversized
+# series never travel back to the server, into the chart cache or over the websocket.
+SANDBOX_WORKERS = int(os.getenv("SANDBOX_WORKERS", str(min(4, os.cpu_count() or 1))))
+SANDBOX_TIMEOUT_SECONDS = float(os.getenv("SANDBOX_TIMEOUT_SECONDS", "60"))
+SANDBOX_CPU_SECONDS = int(os.getenv("SANDBOX_CPU_SECONDS", "120"))
+SANDBOX_MEMORY_MB = int(os.getenv("SANDBOX_MEMORY_MB", "4096"))
+SANDBOX_KILL_GRACE_SECONDS = 15.0 # Extra wait (worker start-up, in-worker timeout handling) before the parent kills the worker
+SANDBOX_ALLOWED_IMPORTS = {
+    "pandas", "numpy", "polars", "pyarrow", "re", "math", "json", "datetime", "warnings", "collections",
+    "itertools", "functools", "statistics", "decimal", "calendar", "string", "random", "operator"
+}
+SANDBOX_BLOCKED_BUILTINS = {"open", "exec", "eval", "compile", "input", "breakpoint"}
+
+# Idle workers (None = not started yet, or killed and not restarted). A run takes a worker off this queue
+# before submitting, so the parent's timeout measures the run itself and never expires while a request
+# is still queued behind other users' code.
+_idle_workers = queue.Queue()
+for _ in range(max(1, SANDBOX_WORKERS)):
+    _idle_workers.put(None)
+_workers = set() # Every started worker pool, for shutdown
+_workers_lock = threading.Lock()
+
+# --- Worker side ---
+
+def _init_worker(memory_mb: int):
+    """Process-wide limits and pandas options for a sandbox worker (set once, inherited by everything it runs)."""
+    import pandas as pd
+    if int(pd.__version__.split(".")[0]) < 3: # Copy-on-write is always on from pandas 3
+        pd.options.mode.copy_on_write = True # In-place edits in generated code must not reach cached views
+    try:
+        import resource
+        limit_name = "RLIMIT_DATA" if hasattr(resource, "RLIMIT_DATA") else "RLIMIT_AS"
+        memory_bytes = memory_mb * 1024 * 1024
+        resource.setrlimit(getattr(resource, limit_name), (memory_bytes, memory_bytes))
+    except (ImportError, ValueError, OSError) as e:
+        print(f"Sandbox worker: memory limit not applied ({e}).")
+
+def _set_run_limits(cpu_seconds: int, timeout_seconds: float):
+    """CPU/wall-clock budget for one run. RLIMIT_CPU is cumulative, so the soft limit is moved past what this worker already used."""
+    try:
+        import resource
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+        soft = int(usage.ru_utime + usage.ru_stime) + cpu_seconds
+        if hard == resource.RLIM_INFINITY or soft <= hard:
+            resource.setrlimit(resource.RLIMIT_CPU, (soft, hard)) # SIGXCPU terminates the worker past this
+    except (ImportError, ValueError, OSError):
+        pass
+    try:
+        import signal
+        def _on_alarm(signum, frame):
+            raise TimeoutError(f"Generated code exceeded {timeout_seconds:.0f}s.")
+        signal.signal(signal.SIGALRM, _on_alarm)
+        signal.setitimer(signal.ITIMER_REAL, timeout_seconds)
+    except (ImportError, AttributeError, ValueError):
+        pass
+
+def _clear_run_limits():
+    try:
+        import signal
+        signal.setitimer(signal.ITIMER_REAL, 0)
+    except (ImportError, AttributeError, ValueError):
+        pass
+
+def _restricted_import(name, globals=None, locals=None, fromlist=(), level=0):
+    if level != 0 or name.split(".")[0] not in SANDBOX_ALLOWED_IMPORTS:
+        raise ImportError(f"Import of '{name}' is not allowed in generated code.")
+    return builtins.__import__(name, globals, locals, fromlist, level)
+
+def _load_input_frame(path: str, columns: list[str] = None):
+    """Pandas view of a cached IPC file; workers keep their own per-file LRU of converted views."""
+    import polars as pl
+    from core.frame_cache import get_pandas_view
+    return get_pandas_view(path, pl.scan_ipc(path), columns)
+
+def _collect_streaming(lazy_frame):
+    try:
+        return lazy_frame.collect(engine="streaming")
+    except (TypeError, ValueError): # Polars versions without the "streaming" engine name
+        return lazy_frame.collect(streaming=True)
+
+def _result_path() -> str:
+    fd, path = tempfile.mkstemp(prefix="vulcanus_sandbox_", suffix=".arrow")
+    os.close(fd)
+    return path
+
+def _result_frame_info(path: str) -> tuple:
+    """(path, row count, column names) of a result file; both counts come from the IPC metadata."""
+    import polars as pl
+    scan = pl.scan_ipc(path)
+    return (path, scan.select(pl.len()).collect().item(), scan.collect_schema().names())
+
+def _stringify_object_columns(frame):
+    """Object columns as strings (missing values stay missing), for results Arrow can't type as they are."""
+    import pandas as pd
+    import polars as pl
+    if isinstance(frame, pd.DataFrame):
+        frame = frame.copy()
+        for position, dtype in enumerate(frame.dtypes):
+            if dtype == object:
+                column = frame.iloc[:, position]
+                frame.isetitem(position, column.astype(str).where(column.notna(), None))
+        return frame
+    return frame.with_columns(
+        pl.col(name).map_elements(lambda value: None if value is None else str(value), return_dtype=pl.String)
+        for name, dtype in frame.schema.items() if dtype == pl.Object
+    )
+
+def _write_result_frame(result) -> tuple:
+    """Writes a DataFrame result to an Arrow IPC temp file; returns ("ipc", (path, row count, columns))."""
+    import pandas as pd
+    import polars as pl
+    path = _result_path()
+    try:
+        try:
+            frame = pl.from_pandas(result) if isinstance(result, pd.DataFrame) else result
+            frame.write_ipc(path, compression="uncompressed")
+        except Exception: # e.g. mixed-type object columns
+            frame = _stringify_object_columns(result)
+            frame = pl.from_pandas(frame) if isinstance(frame, pd.DataFrame) else frame
+            frame.write_ipc(path, compression="uncompressed")
+        return ("ipc", (path, frame.height, frame.columns))
+    except Exception as e:
+        os.remove(path)
+        raise ValueError(f"The result DataFrame can't be converted to Arrow ({type(e).__name__}: {e}). Give every column a single type, e.g. with .astype(str).") from None
+
+def _sink_result_frame(lazy_frame) -> tuple:
+    """Streams a LazyFrame result into an Arrow IPC temp file; plans the streaming sink can't run are collected instead."""
+    path = _result_path()
+    try:
+        lazy_frame.sink_ipc(path, compression="uncompressed")
+    except Exception:
+        os.remove(path)
+        return _write_result_frame(_collect_streaming(lazy_frame))
+    return ("ipc", _result_frame_info(path))
+
+def _execute(code: str, frames: dict, result_name: str, frame_result: bool, cpu_seconds: int, timeout_seconds: float, lazy: bool = False, reduce_chart: bool = False):
+    import numpy as np
+    import pandas as pd
+    import polars as pl
+    import re
+    import warnings
+    safe_builtins = {name: value for name, value in vars(builtins).items() if name not in SANDBOX_BLOCKED_BUILTINS}
+    safe_builtins["__import__"] = _restricted_import # Import statements need __import__; only allowed modules resolve
+    namespace = {'__builtins__': safe_builtins, 'pd': pd, 'np': np, 'pl': pl, 're': re, 'warnings': warnings}
+    _set_run_limits(cpu_seconds, timeout_seconds) # Loading the input frames counts towards the budget too
+    try:
+        for var_name, (path, columns) in frames.items():
+            namespace[var_name] = pl.scan_ipc(path) if lazy else _load_input_frame(path, columns)
+        exec(code, namespace)
+        result = namespace.get(result_name)
+        if lazy and isinstance(result, pl.LazyFrame):
+            if frame_result:
+                return _sink_result_frame(result)
+            result = _collect_streaming(result)
+        if reduce_chart:
+            from core.chart_reduction import reduce_chart_options
+            result = reduce_chart_options(result)
+    finally:
+        _clear_run_limits()
+    if frame_result and isinstance(result, (pd.DataFrame, pl.DataFrame)):
+        return _write_result_frame(result)
+    if frame_result:
+        return ("other", type(result).__name__ if result is not None else None)
+    return ("value", result)
+
+# --- Parent side ---
+
+class SandboxFrameResult:
+    """
+    A DataFrame produced by generated code, left in the worker's Arrow IPC temp file. Only head() rows are
+    read into the server; release() (or garbage collection of the result) deletes the file.
+    """
+    def __init__(self, path: str, row_count: int, columns: list[str]):
+        self.path = path
+        self.row_count = row_count
+        self.columns = columns
+        self._heads = {}
+
+    def scan(self):
+        import polars as pl
+        return pl.scan_ipc(self.path)
+
+    def head(self, n: int = 5):
+        """Pandas DataFrame of the first n rows, read once per n."""
+        if n not in self._heads:
+            self._heads[n] = self.scan().head(n).collect().to_pandas()
+        return self._heads[n]
+
+    def release(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def __del__(self):
+        self.release()
+
+def _start_worker() -> ProcessPoolExecutor:
+    # spawn: the Streamlit server is multi-threaded, forking it is not safe
+    worker = ProcessPoolExecutor(
+        max_workers=1,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(SANDBOX_MEMORY_MB,)
+    )
+    with _workers_lock:
+        _workers.add(worker)
+    return worker
+
+def _kill_worker(worker: ProcessPoolExecutor):
+    """Kills a worker that is stuck or died; its slot starts a fresh one on the next run."""
+    with _workers_lock:
+        _workers.discard(worker)
+    for process in list((getattr(worker, "_processes", None) or {}).values()):
+        if process.is_alive():
+            process.terminate()
+    worker.shutdown(wait=False, cancel_futures=True)
+
+def _acquire_worker(timeout_seconds: float) -> ProcessPoolExecutor:
+    try:
+        worker = _idle_workers.get(timeout=timeout_seconds)
+    except queue.Empty:
+        raise TimeoutError("All sandbox workers are busy. Please try again shortly.") from None
+    if worker is None:
+        try:
+            worker = _start_worker()
+        except Exception:
+            _idle_workers.put(None)
+            raise
+    return worker
+
+def run_generated_code(code: str, frames: dict, result_name: str, frame_result: bool = False, timeout_seconds: float = None, lazy: bool = False, reduce_chart: bool = False):
+    """
+    Executes generated code in a sandbox worker and returns its `result_name` variable.
+    frames maps variable names to (Arrow IPC path, columns or None); they are exposed to the code as pandas DataFrames
+    (or as Polars LazyFrames with lazy=True, in which case a LazyFrame result is run with the streaming engine).
+    With frame_result=True a DataFrame result comes back as a SandboxFrameResult.
+    reduce_chart=True caps the series of an ECharts options result at the chart point budget.
+    Exceptions raised by the code are re-raised here with their original type.
+    """
+    timeout_seconds = timeout_seconds or SANDBOX_TIMEOUT_SECONDS
+    worker = _acquire_worker(timeout_seconds)
+    worker_alive = True
+    try:
+        future = worker.submit(_execute, code, frames, result_name, frame_result, SANDBOX_CPU_SECONDS, timeout_seconds, lazy, reduce_chart)
+        kind, payload = future.result(timeout=timeout_seconds + SANDBOX_KILL_GRACE_SECONDS)
+    except FutureTimeoutError:
+        if future.done(): # The worker's own timeout (same exception type since Python 3.11); the worker is fine
+            raise
+        worker_alive = False
+        raise TimeoutError(f"Generated code did not finish within {timeout_seconds:.0f}s and was stopped.")
+    except BrokenProcessPool:
+        worker_alive = False
+        raise RuntimeError("Generated code exceeded the sandbox CPU/memory limits and was stopped.")
+    finally:
+        if not worker_alive:
+            _kill_worker(worker)
+        _idle_workers.put(worker if worker_alive else None)
+    if kind == "ipc":
+        return SandboxFrameResult(*payload)
+    return payload # A plain value, or (kind "other") the type name of a non-DataFrame result
+
+def execute_chart_code(code: str, frame_path: str, columns: list[str] = None):
+    """Runs chart code against `df` (a cached dataset) in the sandbox and returns its options_dict, reduced to the chart point budget."""
+    return run_generated_code(code, {"df": (frame_path, columns)}, "options_dict", reduce_chart=True)
+
+def execute_transformation_code(code: str, frame_paths: dict):
+    """
+    Runs transformation code in the sandbox with one pandas DataFrame per entry of frame_paths
+    ({variable name: IPC path}). Returns the resulting `transformed_df` as a SandboxFrameResult,
+    or the type name of whatever else the code assigned to it (None if it assigned nothing).
+    """
+    return run_generated_code(code, {name: (path, None) for name, path in frame_paths.items()}, "transformed_df", frame_result=True)
+
+def execute_lazy_transformation_code(code: str, frame_paths: dict):
+    """
+    Runs Polars LazyFrame transformation code in the sandbox: each entry of frame_paths is scanned as a
+    LazyFrame and the code's `transformed_lf` is run with the streaming engine. Returns a
+    SandboxFrameResult, or the type name of whatever else was assigned (None if nothing).
+    """
+    return run_generated_code(code, {name: (path, None) for name, path in frame_paths.items()}, "transformed_lf", frame_result=True, lazy=True)
+
+def shutdown_code_sandbox():
+    with _workers_lock:
+        workers = list(_workers)
+        _workers.clear()
+    for worker in workers:
+        worker.shutdown(wait=False, cancel_futures=True)
+
+atexit.register(shutdown_code_sandbox)
@@ -1,34 +1,144 @@
 # src/core/data_handler.py
-import pandas as pd
 import streamlit as st
 import io
 from pypdf import PdfReader
 import os
+import re
+import shutil
 import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import polars as pl # NEW: Import polars
+from core.dataset_cache import DatasetHandle, upload_sha256, get_cached_dataset, store_dataset
 
-def load_data_from_upload(uploaded_file):
+# Uploads are spilled to disk once and scanned lazily (pl.scan_csv / pl.scan_parquet), so large files
+# are never held as bytes + a fully parsed frame in memory. Only what the page asks for is collected:
+# the schema, a head() preview, or the columns a piece of generated code actually references.
+# Excel has no lazy reader, so XLSX is parsed eagerly from the spilled file and wrapped as a LazyFrame.
+# Several uploads are ingested concurrently on a thread pool (hashing, parsing and writing the cache
+# copy all release the GIL), so a batch takes about as long as its largest file. Worker threads have
+# no Streamlit script context: they raise, and errors/progress are reported on the calling thread.
+LAZY_SCAN_FORMATS = ("csv", "parquet")
+EAGER_FORMATS = ("xlsx", "xls")
+UPLOAD_SPILL_PREFIX = "vulcanus_upload_"
+UPLOAD_INGEST_WORKERS = int(os.getenv("UPLOAD_INGEST_WORKERS", str(min(8, max(4, os.cpu_count() or 1))))) # Spilling/hashing is partly I/O bound
+# Generated code using any of these needs the whole frame, not just the columns it names
+WHOLE_FRAME_CODE_MARKERS = (".columns", ".iloc", ".values", ".dtypes", "select_dtypes", "describe(", "iterrows", "itertuples", "to_dict", "to_numpy", "melt(", "pivot", "corr(")
+
+def new_upload_spill_dir() -> str:
+    """Creates a private temp directory for one set of spilled uploads."""
+    return tempfile.mkdtemp(prefix=UPLOAD_SPILL_PREFIX)
+
+def release_upload_spill_dir(spill_dir: str):
+    """Deletes a spill directory once the LazyFrames scanning it are no longer used."""
+    if spill_dir:
+        shutil.rmtree(spill_dir, ignore_errors=True)
+
+def spill_upload_to_temp(uploaded_file, spill_dir: str = None) -> str:
     """
-    Loads data from an uploaded CSV or XLSX file into a polars DataFrame.
+    Writes an upload to a temp file exactly once (straight from Streamlit's buffer, no bytes copy)
+    and returns its path. The file extension is kept so the scanners can tell formats apart.
     """
-    if uploaded_file is not None:
-        try:
-            file_extension = uploaded_file.name.split('.')[-1].lower()
-            if file_extension == 'csv':
-                # Use pl.read_csv for CSV
-                df = pl.read_csv(io.BytesIO(uploaded_file.getvalue()))
-            elif file_extension in ['xlsx', 'xls']:
-                # Use pl.read_excel for XLSX
-                # Ensure 'polars[excel]' is installed for this to work
-                df = pl.read_excel(io.BytesIO(uploaded_file.getvalue()))
-            else:
-                st.error("Unsupported file type for DataFrame. Please upload a CSV or XLSX file.")
-                return None
-            return df
-        except Exception as e:
-            st.error(f"Error loading file: {e}")
-            return None
-    return None
+    file_extension = uploaded_file.name.split('.')[-1].lower()
+    fd, file_path = tempfile.mkstemp(suffix=f".{file_extension}", dir=spill_dir)
+    with os.fdopen(fd, "wb") as f:
+        f.write(uploaded_file.getbuffer())
+    return file_path
+
+def scan_spilled_upload(uploaded_file, spill_dir: str = None) -> pl.LazyFrame:
+    """
+    Spills an upload and scans it as a LazyFrame. Raises ValueError for unsupported file types and
+    whatever the reader raises for unreadable files; makes no Streamlit calls (safe in worker threads).
+    """
+    file_extension = uploaded_file.name.split('.')[-1].lower()
+    if file_extension not in LAZY_SCAN_FORMATS + EAGER_FORMATS:
+        raise ValueError("Unsupported file type for DataFrame. Please upload a CSV, XLSX or Parquet file.")
+    file_path = spill_upload_to_temp(uploaded_file, spill_dir)
+    try:
+        if file_extension == 'csv':
+            lazy_df = pl.scan_csv(file_path)
+        elif file_extension == 'parquet':
+            lazy_df = pl.scan_parquet(file_path)
+        else:
+            # Ensure 'polars[excel]' is installed for this to work
+            lazy_df = pl.read_excel(file_path).lazy()
+        lazy_df.collect_schema() # Surfaces unreadable files now rather than on first collect
+        return lazy_df
+    except Exception:
+        os.remove(file_path)
+        raise
+
+def cache_upload(uploaded_file) -> DatasetHandle:
+    """
+    Returns a handle to the upload in the shared Arrow IPC dataset cache (see core.dataset_cache).
+    Content that is already cached is reused without parsing; otherwise the upload is spilled,
+    scanned lazily and streamed into the cache once. Raises on failure; makes no Streamlit calls.
+    """
+    sha256 = upload_sha256(uploaded_file)
+    handle = get_cached_dataset(sha256, uploaded_file.name)
+    if handle is not None:
+        return handle
+    spill_dir = new_upload_spill_dir() # Only needed while the cache copy is written
+    try:
+        return store_dataset(sha256, uploaded_file.name, scan_spilled_upload(uploaded_file, spill_dir))
+    finally:
+        release_upload_spill_dir(spill_dir)
+
+def load_cached_data_from_upload(uploaded_file) -> DatasetHandle | None:
+    """cache_upload() for a single file, reporting errors with st.error."""
+    if uploaded_file is None:
+        return None
+    try:
+        return cache_upload(uploaded_file)
+    except Exception as e:
+        st.error(f"Error loading '{uploaded_file.name}': {e}")
+        return None
+
+def load_cached_data_from_uploads(uploaded_files: list, on_progress=None) -> tuple[dict, dict]:
+    """
+    Ingests several uploads concurrently (see cache_upload). Returns ({file name: DatasetHandle},
+    {file name: error message}); one file failing doesn't affect the others. on_progress(name, done, total, error)
+    is called on the calling thread as each file finishes, so it may use Streamlit elements.
+    """
+    handles, errors = {}, {}
+    if not uploaded_files:
+        return handles, errors
+    total = len(uploaded_files)
+    with ThreadPoolExecutor(max_workers=max(1, min(UPLOAD_INGEST_WORKERS, total)), thread_name_prefix="upload_ingest") as executor:
+        futures = {executor.submit(cache_upload, uploaded_file): uploaded_file.name for uploaded_file in uploaded_files}
+        for done, future in enumerate(as_completed(futures), start=1):
+            name = futures[future]
+            error = None
+            try:
+                handles[name] = future.result()
+            except Exception as e:
+                error = errors[name] = str(e) or type(e).__name__
+            if on_progress is not None:
+                on_progress(name, done, total, error)
+    return handles, errors
+
+def columns_referenced_in_code(code: str, columns: list[str]) -> list[str] | None:
+    """
+    Columns that generated code refers to by name ('col' / "col" / df.col), in frame order.
+    Returns None when the code may touch the whole frame (or names no column) so callers collect everything.
+    """
+    if not code or any(marker in code for marker in WHOLE_FRAME_CODE_MARKERS):
+        return None
+    referenced = [
+        column for column in columns
+        if re.search(r"""["']""" + re.escape(column) + r"""["']""", code)
+        or (column.isidentifier() and re.search(r"\.\s*" + re.escape(column) + r"\b", code))
+    ]
+    return referenced or None
+
+def dataset_variable_name(file_name: str) -> str:
+    """Variable name an uploaded dataset gets in generated code: the file name without extension, in snake_case (orders.csv -> orders)."""
+    stem = os.path.splitext(os.path.basename(file_name))[0]
+    var_name = re.sub(r"\W+", "_", stem).strip("_").lower()
+    return var_name if var_name.isidentifier() else f"df_{var_name}"
+
+def code_references_name(code: str, name: str) -> bool:
+    """True if generated code mentions `name` as a whole identifier (e.g. a DataFrame variable)."""
+    return bool(code) and re.search(r"(?<![\w.])" + re.escape(name) + r"\b", code) is not None
 
 def extract_text_from_document(file_input_object):
     """
@@ -0,0 +1,81 @@
+# src/core/data_profiler.py
+import os
+import polars as pl
+from core.frame_cache import LRUCache
+
+# Column statistics for prompt context. A head(5) preview says nothing about value ranges,
+# cardinality or nulls, so generated chart/transformation code often breaks on the real data.
+# profile_frame() computes, for every column, dtype, null count, min/max, an approximate distinct
+# count (HyperLogLog, approx_n_unique) and the top-k values, as a single lazy select: Polars scans
+# the data once for all columns. Profiles are cached per dataset version like the pandas views.
+PROFILE_TOP_K = int(os.getenv("PROFILE_TOP_K", "5"))
+PROFILE_CACHE_ENTRIES = 32
+PROFILE_PROMPT_MAX_COLUMNS = 60
+PROFILE_VALUE_MAX_CHARS = 40
+
+_profiles = LRUCache(PROFILE_CACHE_ENTRIES)
+
+def _is_categorical_like(dtype) -> bool:
+    return dtype == pl.String or dtype == pl.Categorical or dtype == pl.Enum or dtype == pl.Boolean
+
+def _short(value) -> str:
+    text = str(value)
+    return text if len(text) <= PROFILE_VALUE_MAX_CHARS else text[:PROFILE_VALUE_MAX_CHARS - 3] + "..."
+
+def profile_frame(frame, top_k: int = PROFILE_TOP_K) -> dict:
+    """
+    Profiles a DataFrame/LazyFrame in one pass. Returns
+    {"rows": n, "columns": [{"name", "dtype", "nulls", "distinct", "min", "max", "top": [(value, count), ...]}]}.
+    min/max are given for numeric and temporal columns, top values for string/categorical/boolean ones.
+    """
+    lazy_df = frame.lazy()
+    schema = lazy_df.collect_schema()
+    exprs = [pl.len().alias("__rows")]
+    for index, (name, dtype) in enumerate(schema.items()):
+        column = pl.col(name)
+        exprs.append(column.null_count().alias(f"{index}:nulls"))
+        if dtype.is_nested():
+            continue
+        exprs.append(column.approx_n_unique().alias(f"{index}:distinct"))
+        if dtype.is_numeric() or dtype.is_temporal():
+            exprs.append(column.min().alias(f"{index}:min"))
+            exprs.append(column.max().alias(f"{index}:max"))
+        elif _is_categorical_like(dtype):
+            exprs.append(column.drop_nulls().value_counts(sort=True).head(top_k).implode().alias(f"{index}:top"))
+    stats = lazy_df.select(exprs).collect().row(0, named=True)
+    columns = []
+    for index, (name, dtype) in enumerate(schema.items()):
+        top = [tuple(entry.values())[:2] for entry in (stats.get(f"{index}:top") or [])] # struct fields: value, count
+        columns.append({
+            "name": name,
+            "dtype": str(dtype),
+            "nulls": stats[f"{index}:nulls"],
+            "distinct": stats.get(f"{index}:distinct"),
+            "min": stats.get(f"{index}:min"),
+            "max": stats.get(f"{index}:max"),
+            "top": top
+        })
+    return {"rows": stats["__rows"], "columns": columns}
+
+def get_dataset_profile(version: str, frame) -> dict:
+    """Profile of a dataset version (see profile_frame), computed once per version."""
+    return _profiles.get_or_create(version, lambda: profile_frame(frame))
+
+def format_profile_for_prompt(profile: dict, max_columns: int = PROFILE_PROMPT_MAX_COLUMNS) -> str:
+    """Compact one-line-per-column summary of a profile for LLM prompts."""
+    rows = profile["rows"]
+    lines = [f"Rows: {rows}"]
+    for column in profile["columns"][:max_columns]:
+        parts = [column["dtype"]]
+        null_share = f" ({100 * column['nulls'] / rows:.1f}%)" if rows else ""
+        parts.append(f"nulls={column['nulls']}{null_share}")
+        if column["distinct"] is not None:
+            parts.append(f"~distinct={column['distinct']}")
+        if column["min"] is not None or column["max"] is not None:
+            parts.append(f"min={_short(column['min'])}, max={_short(column['max'])}")
+        if column["top"]:
+            parts.append("top=[" + ", ".join(f"{_short(value)} ({count})" for value, count in column["top"]) + "]")
+        lines.append(f"- {column['name']}: " + ", ".join(parts))
+    if len(profile["columns"]) > max_columns:
+        lines.append(f"- ... {len(profile['columns']) - max_columns} more columns")
+    return "\n".join(lines)
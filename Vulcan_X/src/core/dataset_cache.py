@@ -0,0 +1,145 @@
+# src/core/dataset_cache.py
+import hashlib
+import os
+import tempfile
+import threading
+import polars as pl
+
+# Shared, content-addressed cache of uploaded datasets in Arrow IPC form.
+# An upload is hashed, converted once to an uncompressed Arrow IPC file named after its sha256, and
+# from then on opened with pl.scan_ipc, which memory-maps uncompressed IPC files by default. Sessions
+# only keep a DatasetHandle (hash, name, path, columns); the data itself lives in the OS page cache, so
+# two users uploading the same file share one mapped copy and re-uploads skip parsing entirely.
+# The cache directory is resolved to an absolute path at import, so it doesn't follow the working directory.
+# The directory is bounded by DATASET_CACHE_MAX_BYTES with least-recently-used eviction (file mtime
+# is bumped on every access).
+DATASET_CACHE_DIR = os.path.abspath(os.path.expanduser(os.getenv("DATASET_CACHE_DIR", "~/.vulcanus/datasets")))
+DATASET_CACHE_MAX_BYTES = int(os.getenv("DATASET_CACHE_MAX_BYTES", str(5 * 1024 ** 3)))
+DATASET_CACHE_EXTENSION = ".arrow"
+HASH_CHUNK_BYTES = 8 * 1024 * 1024
+
+_conversion_locks = {} # sha256 -> lock, so concurrent uploads of one file are converted once
+_conversion_locks_guard = threading.Lock()
+
+class DatasetHandle:
+    """Session-side reference to a cached dataset. Holds no data; scan() maps the cached file."""
+    __slots__ = ("sha256", "name", "path", "size_bytes", "columns")
+
+    def __init__(self, sha256: str, name: str, path: str, size_bytes: int, columns: list[str]):
+        self.sha256 = sha256
+        self.name = name
+        self.path = path
+        self.size_bytes = size_bytes
+        self.columns = columns
+
+    @property
+    def version(self) -> str:
+        """Identifies the dataset contents; equal hashes mean equal data."""
+        return self.sha256
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def scan(self) -> pl.LazyFrame | None:
+        """Memory-maps the cached file as a LazyFrame, or returns None if it has been evicted."""
+        if not self.exists():
+            return None
+        _touch(self.path)
+        return pl.scan_ipc(self.path)
+
+    def __repr__(self):
+        return f"DatasetHandle(name={self.name!r}, sha256={self.sha256[:12]}..., size_bytes={self.size_bytes})"
+
+def upload_sha256(uploaded_file) -> str:
+    """Hashes an upload straight from Streamlit's buffer, in chunks, without copying it."""
+    buffer = uploaded_file.getbuffer()
+    digest = hashlib.sha256()
+    for offset in range(0, len(buffer), HASH_CHUNK_BYTES):
+        digest.update(buffer[offset:offset + HASH_CHUNK_BYTES])
+    return digest.hexdigest()
+
+def dataset_cache_path(sha256: str, cache_dir: str = None) -> str:
+    """Cache path for a dataset, fanned out by the first two hex digits: <dir>/ab/abcdef....arrow"""
+    return os.path.join(cache_dir or DATASET_CACHE_DIR, sha256[:2], sha256 + DATASET_CACHE_EXTENSION)
+
+def _touch(path: str):
+    try:
+        os.utime(path, None)
+    except OSError:
+        pass
+
+def _conversion_lock(sha256: str) -> threading.Lock:
+    with _conversion_locks_guard:
+        return _conversion_locks.setdefault(sha256, threading.Lock())
+
+def _handle_for(sha256: str, name: str, path: str) -> DatasetHandle:
+    return DatasetHandle(sha256, name, path, os.path.getsize(path), list(pl.read_ipc_schema(path).keys()))
+
+def get_cached_dataset(sha256: str, name: str, cache_dir: str = None) -> DatasetHandle | None:
+    """Returns a handle if this content is already cached (and marks it recently used)."""
+    path = dataset_cache_path(sha256, cache_dir)
+    if not os.path.exists(path):
+        return None
+    _touch(path)
+    return _handle_for(sha256, name, path)
+
+def store_dataset(sha256: str, name: str, frame, cache_dir: str = None) -> DatasetHandle:
+    """
+    Writes a DataFrame/LazyFrame into the cache as uncompressed Arrow IPC (so it can be memory-mapped)
+    and returns its handle. LazyFrames are streamed to disk with sink_ipc rather than collected.
+    The file appears atomically; if another session cached the same content first, that copy is reused.
+    """
+    path = dataset_cache_path(sha256, cache_dir)
+    with _conversion_lock(sha256):
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-", suffix=DATASET_CACHE_EXTENSION)
+            os.close(fd)
+            try:
+                if isinstance(frame, pl.LazyFrame):
+                    frame.sink_ipc(temp_path, compression=None)
+                else:
+                    frame.write_ipc(temp_path, compression="uncompressed")
+                os.replace(temp_path, path)
+            except Exception:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                raise
+    handle = _handle_for(sha256, name, path)
+    evict_datasets(cache_dir=cache_dir, keep=(path,))
+    return handle
+
+def evict_datasets(max_bytes: int = None, cache_dir: str = None, keep: tuple = ()) -> int:
+    """
+    Deletes least-recently-used cached datasets until the cache fits in max_bytes.
+    Paths in `keep` are never evicted. Returns the number of bytes freed.
+    """
+    max_bytes = DATASET_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    cache_dir = cache_dir or DATASET_CACHE_DIR
+    entries = []
+    for root, _, files in os.walk(cache_dir):
+        for file_name in files:
+            if file_name.startswith(".tmp-") or not file_name.endswith(DATASET_CACHE_EXTENSION):
+                continue
+            path = os.path.join(root, file_name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+    total_bytes = sum(size for _, size, _ in entries)
+    freed = 0
+    keep = {os.path.abspath(path) for path in keep}
+    for _, size, path in sorted(entries):
+        if total_bytes - freed <= max_bytes:
+            break
+        if os.path.abspath(path) in keep:
+            continue
+        try:
+            os.remove(path) # Sessions still holding a handle re-cache from their upload on next use
+            freed += size
+        except OSError as e: # e.g. still mapped on Windows
+            print(f"Could not evict cached dataset {path}: {e}")
+    if freed:
+        print(f"Dataset cache: evicted {freed / 1024 ** 2:,.1f} MB of least recently used datasets.")
+    return freed
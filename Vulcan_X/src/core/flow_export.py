@@ -0,0 +1,201 @@
+# src/core/flow_export.py
+from array import array
+import json
+import os
+from xml.sax.saxutils import escape
+
+# Streaming exporters for flow data (nodes/edges produced by core.code_processor).
+# Graphs are held in a compact columnar form (interned strings + integer arrays) and written out
+# line by line through generators, so very large call graphs export in bounded memory.
+FLOW_EXPORT_FORMATS = {
+    "mermaid": ".mmd",
+    "dot": ".dot",
+    "graphml": ".graphml",
+    "ndjson": ".ndjson"
+}
+DATA_NODE_TYPES = {"data_source", "data_sink"}
+
+class CompactFlowGraph:
+    """
+    Columnar in-memory flow graph. Every id/label/type string is interned once in a string table;
+    nodes and edges are stored as parallel integer arrays indexing into that table (for strings)
+    or into the node arrays (for edge endpoints).
+    """
+    def __init__(self):
+        self.strings = [] # Interned string table
+        self._string_index = {} # String -> position in self.strings
+        self._node_positions = {} # Interned node id -> node position
+        self.node_ids = array("l")
+        self.node_labels = array("l")
+        self.node_types = array("l")
+        self.edge_sources = array("l") # Node positions
+        self.edge_targets = array("l")
+        self.edge_labels = array("l") # Interned label strings
+        self.metadata = {} # Small extras, e.g. data_sources_identified or analysis_stats
+
+    def intern(self, value) -> int:
+        value = "" if value is None else str(value)
+        index = self._string_index.get(value)
+        if index is None:
+            index = len(self.strings)
+            self.strings.append(value)
+            self._string_index[value] = index
+        return index
+
+    @property
+    def node_count(self) -> int:
+        return len(self.node_ids)
+
+    @property
+    def edge_count(self) -> int:
+        return len(self.edge_sources)
+
+    def add_node(self, node_id, label=None, node_type="GenericNode") -> int:
+        """Adds a node if it is new and returns its position."""
+        id_index = self.intern(node_id)
+        position = self._node_positions.get(id_index)
+        if position is None:
+            position = len(self.node_ids)
+            self._node_positions[id_index] = position
+            self.node_ids.append(id_index)
+            self.node_labels.append(self.intern(label if label is not None else node_id))
+            self.node_types.append(self.intern(node_type))
+        return position
+
+    def add_edge(self, source_id, target_id, label=""):
+        """Adds an edge; endpoints that were never declared are added as 'GenericNode' nodes."""
+        self.edge_sources.append(self.add_node(source_id))
+        self.edge_targets.append(self.add_node(target_id))
+        self.edge_labels.append(self.intern(label))
+
+    def node_position(self, node_id):
+        """Returns the position of node_id, or None if it is not in the graph."""
+        id_index = self._string_index.get(node_id)
+        return self._node_positions.get(id_index) if id_index is not None else None
+
+    def iter_nodes(self):
+        """Yields (position, id, label, type) for every node."""
+        strings = self.strings
+        for position in range(len(self.node_ids)):
+            yield position, strings[self.node_ids[position]], strings[self.node_labels[position]], strings[self.node_types[position]]
+
+    def iter_edges(self):
+        """Yields (source_position, target_position, label) for every edge."""
+        strings = self.strings
+        for index in range(len(self.edge_sources)):
+            yield self.edge_sources[index], self.edge_targets[index], strings[self.edge_labels[index]]
+
+    @classmethod
+    def from_flow_data(cls, flow_data: dict):
+        """Builds a compact graph from the list-of-dicts flow_data format."""
+        graph = cls()
+        for node in flow_data.get("nodes", []):
+            if node.get("id"):
+                graph.add_node(node["id"], node.get("label", node["id"]), node.get("type", "GenericNode"))
+        for edge in flow_data.get("edges", []):
+            if edge.get("source") and edge.get("target"):
+                graph.add_edge(edge["source"], edge["target"], edge.get("label", ""))
+        for key, value in flow_data.items():
+            if key not in ("nodes", "edges"):
+                graph.metadata[key] = value
+        return graph
+
+    def to_flow_data(self) -> dict:
+        """Expands the graph back into the list-of-dicts flow_data format (materializes everything)."""
+        flow_data = {
+            "nodes": [{"id": node_id, "label": label, "type": node_type} for _, node_id, label, node_type in self.iter_nodes()],
+            "edges": [{"source": self.strings[self.node_ids[source]], "target": self.strings[self.node_ids[target]], "label": label} for source, target, label in self.iter_edges()]
+        }
+        flow_data.update(self.metadata)
+        return flow_data
+
+def _as_compact_graph(graph) -> CompactFlowGraph:
+    return graph if isinstance(graph, CompactFlowGraph) else CompactFlowGraph.from_flow_data(graph)
+
+def _mermaid_text(value: str) -> str:
+    """Escapes text for use inside a quoted Mermaid label."""
+    return value.replace('"', "#quot;").replace("\n", " ")
+
+def _dot_text(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def iter_mermaid_lines(graph, direction: str = "TD"):
+    """Yields a Mermaid flowchart definition line by line."""
+    graph = _as_compact_graph(graph)
+    yield f"graph {direction}\n"
+    for position, _, label, node_type in graph.iter_nodes():
+        if node_type in DATA_NODE_TYPES:
+            yield f'    n{position}[("{_mermaid_text(label)}")]\n'
+        else:
+            yield f'    n{position}["{_mermaid_text(label)}"]\n'
+    for source, target, label in graph.iter_edges():
+        if label:
+            yield f'    n{source} -->|"{_mermaid_text(label)}"| n{target}\n'
+        else:
+            yield f"    n{source} --> n{target}\n"
+
+def iter_dot_lines(graph, graph_name: str = "flow"):
+    """Yields a Graphviz DOT digraph line by line."""
+    graph = _as_compact_graph(graph)
+    yield f'digraph "{_dot_text(graph_name)}" {{\n'
+    yield "    rankdir=LR;\n"
+    for position, node_id, label, node_type in graph.iter_nodes():
+        shape = "cylinder" if node_type in DATA_NODE_TYPES else "box"
+        yield f'    n{position} [label="{_dot_text(label)}", tooltip="{_dot_text(node_id)}", shape={shape}];\n'
+    for source, target, label in graph.iter_edges():
+        yield f'    n{source} -> n{target} [label="{_dot_text(label)}"];\n'
+    yield "}\n"
+
+def iter_graphml_lines(graph):
+    """Yields a GraphML document line by line."""
+    graph = _as_compact_graph(graph)
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+    yield '<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n'
+    yield '  <key id="label" for="node" attr.name="label" attr.type="string"/>\n'
+    yield '  <key id="type" for="node" attr.name="type" attr.type="string"/>\n'
+    yield '  <key id="edge_label" for="edge" attr.name="label" attr.type="string"/>\n'
+    yield '  <graph id="flow" edgedefault="directed">\n'
+    for position, node_id, label, node_type in graph.iter_nodes():
+        yield (f'    <node id="n{position}"><data key="label">{escape(label)}</data>'
+               f'<data key="type">{escape(node_type)}</data></node>\n')
+    for index, (source, target, label) in enumerate(graph.iter_edges()):
+        yield f'    <edge id="e{index}" source="n{source}" target="n{target}"><data key="edge_label">{escape(label)}</data></edge>\n'
+    yield "  </graph>\n"
+    yield "</graphml>\n"
+
+def iter_ndjson_lines(graph):
+    """Yields one JSON object per line: all nodes ('kind': 'node') followed by all edges ('kind': 'edge')."""
+    graph = _as_compact_graph(graph)
+    strings = graph.strings
+    for _, node_id, label, node_type in graph.iter_nodes():
+        yield json.dumps({"kind": "node", "id": node_id, "label": label, "type": node_type}) + "\n"
+    for source, target, label in graph.iter_edges():
+        yield json.dumps({"kind": "edge", "source": strings[graph.node_ids[source]], "target": strings[graph.node_ids[target]], "label": label}) + "\n"
+
+_EXPORTERS = {
+    "mermaid": iter_mermaid_lines,
+    "dot": iter_dot_lines,
+    "graphml": iter_graphml_lines,
+    "ndjson": iter_ndjson_lines
+}
+
+def iter_flow_export(graph, export_format: str):
+    """Yields the lines of flow data (dict or CompactFlowGraph) in the given export format."""
+    exporter = _EXPORTERS.get(export_format)
+    if exporter is None:
+        raise ValueError(f"Unsupported flow export format '{export_format}'. Choose one of: {', '.join(FLOW_EXPORT_FORMATS)}.")
+    return exporter(graph)
+
+def export_flow_graph(graph, output_path: str, export_format: str = None) -> str:
+    """
+    Streams flow data (dict or CompactFlowGraph) to output_path. The format defaults to the one
+    matching the file extension. Returns the output path.
+    """
+    if export_format is None:
+        extension = os.path.splitext(output_path)[1].lower()
+        export_format = next((name for name, ext in FLOW_EXPORT_FORMATS.items() if ext == extension), None)
+        if export_format is None:
+            raise ValueError(f"Cannot infer flow export format from '{output_path}'.")
+    with open(output_path, "w", encoding="utf-8") as f:
+        f.writelines(iter_flow_export(graph, export_format))
+    return output_path
@@ -0,0 +1,197 @@
+# src/core/flow_summary.py
+import copy
+import os
+from collections import Counter, defaultdict
+from core.flow_export import CompactFlowGraph, DATA_NODE_TYPES, iter_mermaid_lines
+
+# Summarization of oversized flow graphs before rendering. Diagrams with thousands of nodes are
+# unreadable and slow to lay out in the browser, so graphs are reduced to a node budget by:
+#   1. pruning leaf library calls (external callees that call nothing),
+#   2. collapsing modules/packages into super-nodes along the dotted module hierarchy
+#      (with optional depth-limited drill-down into one module), and
+#   3. label-propagation community detection for graphs whose ids carry no hierarchy.
+# Data sources/sinks stay individual nodes as long as they fit; past the budget the least connected
+# ones are merged into an 'Other data' group, so the result never exceeds the budget.
+DEFAULT_DIAGRAM_NODE_BUDGET = int(os.getenv("FLOW_DIAGRAM_NODE_BUDGET", "150"))
+LABEL_PROPAGATION_MAX_ITERATIONS = 20
+LEAF_PRUNABLE_NODE_TYPES = {"external", "method"} # Unresolved/library callees
+OTHER_GROUP_ID = "__other__"
+OTHER_DATA_GROUP_ID = "__other_data__"
+GROUP_LABELS = {OTHER_GROUP_ID: "Other", OTHER_DATA_GROUP_ID: "Other data"}
+
+def _as_compact_graph(graph) -> CompactFlowGraph:
+    return graph if isinstance(graph, CompactFlowGraph) else CompactFlowGraph.from_flow_data(graph)
+
+def _hierarchy_key(node_id: str, level: int) -> str:
+    """Collapses a dotted id to its first `level` components, e.g. ('a.b.c', 2) -> 'a.b'."""
+    parts = node_id.split(".")
+    return ".".join(parts[:level]) if len(parts) > level else node_id
+
+def _is_in_focus(node_id: str, focus: str) -> bool:
+    return node_id == focus or node_id.startswith(f"{focus}.")
+
+def _prunable_leaves(graph: CompactFlowGraph) -> set:
+    """Positions of external/library callees that have no outgoing edges."""
+    has_outgoing = set(graph.edge_sources)
+    return {
+        position for position, _, _, node_type in graph.iter_nodes()
+        if node_type in LEAF_PRUNABLE_NODE_TYPES and position not in has_outgoing
+    }
+
+def _hierarchy_groups(node_ids: dict, node_budget: int, focus: str = None, drill_depth: int = 1):
+    """
+    Assigns every node (position -> id) a group key along the module hierarchy, choosing the
+    deepest level whose number of groups fits node_budget. Nodes inside `focus` are expanded to
+    `drill_depth` levels below the focus. Returns ({position: group_key}, fits_budget).
+    """
+    focus_groups = {}
+    if focus:
+        focus_level = len(focus.split(".")) + max(1, drill_depth)
+        focus_groups = {position: _hierarchy_key(node_id, focus_level) for position, node_id in node_ids.items() if _is_in_focus(node_id, focus)}
+    node_budget = max(1, node_budget)
+    remaining_budget = max(1, node_budget - len(set(focus_groups.values())))
+    outside_ids = {position: node_id for position, node_id in node_ids.items() if position not in focus_groups}
+    max_level = max((len(node_id.split(".")) for node_id in outside_ids.values()), default=1)
+    groups = None
+    for level in range(max_level, 0, -1):
+        groups = {position: _hierarchy_key(node_id, level) for position, node_id in outside_ids.items()}
+        if len(set(groups.values())) <= remaining_budget:
+            break
+    groups = groups or {}
+    groups.update(focus_groups)
+    return groups, len(set(groups.values())) <= node_budget
+
+def _label_propagation_groups(positions: list, adjacency: dict) -> dict:
+    """
+    Deterministic label-propagation community detection: every node repeatedly adopts the most
+    frequent community among its neighbours (ties go to the smallest community id).
+    Returns {position: community_position}.
+    """
+    communities = {position: position for position in positions}
+    for _ in range(LABEL_PROPAGATION_MAX_ITERATIONS):
+        changed = False
+        for position in positions:
+            neighbours = adjacency.get(position)
+            if not neighbours:
+                continue
+            counts = Counter(communities[neighbour] for neighbour in neighbours)
+            best_count = max(counts.values())
+            best = min(community for community, count in counts.items() if count == best_count)
+            if best != communities[position]:
+                communities[position] = best
+                changed = True
+        if not changed:
+            break
+    return communities
+
+def _cap_groups(groups: dict, node_budget: int) -> dict:
+    """Keeps the (node_budget - 1) largest groups and merges all others into a single 'Other' group."""
+    sizes = Counter(groups.values())
+    if len(sizes) <= node_budget:
+        return groups
+    keep = {group for group, _ in sorted(sizes.items(), key=lambda item: (-item[1], str(item[0])))[:node_budget - 1]}
+    return {position: group if group in keep else OTHER_GROUP_ID for position, group in groups.items()}
+
+def _data_groups(graph: CompactFlowGraph, data_positions: set, data_budget: int) -> dict:
+    """Keeps data nodes individual up to data_budget groups, merging the least connected ones into 'Other data'."""
+    if len(data_positions) <= data_budget:
+        return {position: graph.strings[graph.node_ids[position]] for position in data_positions}
+    degree = Counter()
+    for source, target, _ in graph.iter_edges():
+        degree[source] += 1
+        degree[target] += 1
+    ranked = sorted(data_positions, key=lambda position: (-degree[position], position))
+    keep = set(ranked[:max(0, data_budget - 1)])
+    return {position: graph.strings[graph.node_ids[position]] if position in keep else OTHER_DATA_GROUP_ID for position in data_positions}
+
+def summarize_flow_graph(graph, node_budget: int = DEFAULT_DIAGRAM_NODE_BUDGET, focus: str = None,
+                         drill_depth: int = 1, prune_external_leaves: bool = True) -> CompactFlowGraph:
+    """
+    Reduces a flow graph (flow_data dict or CompactFlowGraph) to at most node_budget nodes.
+    - prune_external_leaves drops library callees that call nothing (only when over budget).
+    - Qualified ids ('pkg.module.func') are collapsed into module/package super-nodes at the
+      deepest hierarchy level that fits the budget; `focus` (a module prefix) is drilled into
+      `drill_depth` levels below it while everything else stays collapsed.
+    - When the hierarchy cannot get under the budget, label-propagation communities are used if
+      they give a coarser partition; whatever remains over budget is merged into 'Other'.
+    - Data sources/sinks stay individual nodes; when they alone would exceed the budget, the least
+      connected ones are merged into 'Other data' (one slot is always left for the code nodes).
+    Edges between super-nodes are aggregated (the label carries the number of merged edges).
+    Summary details are recorded in the result's metadata["summary"].
+    """
+    graph = _as_compact_graph(graph)
+    node_budget = max(1, int(node_budget))
+    summary = {"original_nodes": graph.node_count, "original_edges": graph.edge_count, "pruned_nodes": 0, "grouping": "none"}
+    if graph.node_count <= node_budget and not focus:
+        unchanged = copy.copy(graph) # Shares the node/edge arrays; only the metadata is the result's own
+        unchanged.metadata = {key: value for key, value in graph.metadata.items() if key != "summary"}
+        unchanged.metadata["summary"] = summary
+        return unchanged
+
+    excluded = _prunable_leaves(graph) if prune_external_leaves else set()
+    summary["pruned_nodes"] = len(excluded)
+    node_ids = {position: node_id for position, node_id, _, _ in graph.iter_nodes() if position not in excluded}
+
+    if len(node_ids) <= node_budget and not focus:
+        groups = {position: node_id for position, node_id in node_ids.items()}
+        summary["grouping"] = "pruned"
+    else:
+        # Data sources/sinks are what lineage diagrams are about: keep them as individual nodes
+        data_positions = {position for position in node_ids if graph.strings[graph.node_types[position]] in DATA_NODE_TYPES}
+        data_budget = node_budget - (1 if len(data_positions) < len(node_ids) else 0)
+        if data_budget < 1: # A budget of one node: everything is grouped together
+            data_positions = set()
+        data_groups = _data_groups(graph, data_positions, data_budget)
+        summary["grouped_data_nodes"] = sum(1 for group in data_groups.values() if group == OTHER_DATA_GROUP_ID)
+        code_node_ids = {position: node_id for position, node_id in node_ids.items() if position not in data_positions}
+        code_budget = max(1, node_budget - len(set(data_groups.values())))
+        groups, fits_budget = _hierarchy_groups(code_node_ids, code_budget, focus, drill_depth)
+        summary["grouping"] = "module_hierarchy"
+        if not fits_budget:
+            adjacency = defaultdict(set)
+            for source, target, _ in graph.iter_edges():
+                if source in code_node_ids and target in code_node_ids and source != target:
+                    adjacency[source].add(target)
+                    adjacency[target].add(source)
+            communities = _label_propagation_groups(list(code_node_ids), adjacency)
+            community_groups = {position: code_node_ids[community] for position, community in communities.items()}
+            # Use whichever partition is coarser; the remainder is capped into an 'Other' group below
+            if len(set(community_groups.values())) < len(set(groups.values())):
+                groups = community_groups
+                summary["grouping"] = "communities"
+        groups = _cap_groups(groups, code_budget)
+        groups.update(data_groups)
+
+    # Build the summarized graph: one node per group, aggregated edges between groups
+    members = defaultdict(list)
+    for position, group in groups.items():
+        members[group].append(position)
+    summarized = CompactFlowGraph()
+    for group, group_members in members.items():
+        if len(group_members) == 1 and group not in GROUP_LABELS:
+            position = group_members[0]
+            summarized.add_node(group, graph.strings[graph.node_labels[position]], graph.strings[graph.node_types[position]])
+        else:
+            group_label = GROUP_LABELS.get(group, group)
+            summarized.add_node(group, f"{group_label} ({len(group_members)} nodes)", "group")
+    edge_counts = Counter()
+    edge_labels = {}
+    for source, target, label in graph.iter_edges():
+        source_group, target_group = groups.get(source), groups.get(target)
+        if source_group is None or target_group is None or source_group == target_group:
+            continue
+        edge_counts[(source_group, target_group)] += 1
+        edge_labels.setdefault((source_group, target_group), label)
+    for (source_group, target_group), count in edge_counts.items():
+        label = edge_labels[(source_group, target_group)]
+        summarized.add_edge(source_group, target_group, f"{label} x{count}" if count > 1 else label)
+    summarized.metadata = {key: value for key, value in graph.metadata.items() if key != "summary"}
+    summary["summarized_nodes"] = summarized.node_count
+    summary["summarized_edges"] = summarized.edge_count
+    summarized.metadata["summary"] = summary
+    return summarized
+
+def flow_graph_to_mermaid(graph, node_budget: int = DEFAULT_DIAGRAM_NODE_BUDGET, focus: str = None, drill_depth: int = 1) -> str:
+    """Summarizes a flow graph to the node budget and returns it as a Mermaid flowchart definition."""
+    summarized = summarize_flow_graph(graph, node_budget=node_budget, focus=focus, drill_depth=drill_depth)
+    return "".join(iter_mermaid_lines(summarized, direction="LR"))
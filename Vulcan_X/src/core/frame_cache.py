@@ -0,0 +1,119 @@
+# src/core/frame_cache.py
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+import polars as pl
+
+# Process-wide caches for things derived from a dataset version (DatasetHandle.version, i.e. the
+# content hash), such as pandas views of cached Polars frames. A version never changes its data, so
+# entries only go stale by falling out of the LRU; sessions viewing the same upload share them.
+# Pandas views use Arrow-backed dtypes (use_pyarrow_extension_array=True), which reuse the Polars
+# buffers instead of copying every column into NumPy. A shallow copy still shares those buffers, so
+# in-place edits (df.loc[...] = x, fillna(inplace=True)) would write through to the cached view. Callers
+# therefore get a shallow copy only under pandas copy-on-write (the default from pandas 3, and switched
+# on in the sandbox workers that run generated code); otherwise they get a deep copy.
+# Sandbox workers import this module for their own view cache, so it (and the materialize_* helpers
+# it owns) stays free of Streamlit and the upload/document dependencies of core.data_handler.
+# Chart options are memoized by (sha256 of the generated chart code, dataset version): the same
+# code on the same data always yields the same options_dict, so reruns don't re-execute it.
+PANDAS_VIEW_CACHE_ENTRIES = int(os.getenv("PANDAS_VIEW_CACHE_ENTRIES", "8"))
+PANDAS_HEAD_CACHE_ENTRIES = 64
+CHART_OPTIONS_CACHE_ENTRIES = int(os.getenv("CHART_OPTIONS_CACHE_ENTRIES", "32"))
+
+class LRUCache:
+    """Small thread-safe LRU map. get_or_create() builds missing values outside the lock."""
+    def __init__(self, max_entries: int):
+        self.max_entries = max(1, max_entries)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            return self._entries.pop(key, None)
+
+    def get_or_create(self, key, factory):
+        value = self.get(key)
+        if value is None:
+            value = factory()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+_pandas_views = LRUCache(PANDAS_VIEW_CACHE_ENTRIES)
+_pandas_heads = LRUCache(PANDAS_HEAD_CACHE_ENTRIES)
+_chart_options = LRUCache(CHART_OPTIONS_CACHE_ENTRIES)
+
+def materialize_head(frame, n: int = 5) -> pl.DataFrame:
+    """Collects only the first n rows; the scan stops reading once they are found."""
+    return frame.lazy().head(n).collect()
+
+def materialize_columns(frame, columns: list[str] = None) -> pl.DataFrame:
+    """Collects the given columns (all columns if None); projection pushdown skips the rest of the file."""
+    lazy_df = frame.lazy()
+    if columns:
+        lazy_df = lazy_df.select(columns)
+    return lazy_df.collect()
+
+def _to_pandas(polars_df):
+    return polars_df.to_pandas(use_pyarrow_extension_array=True)
+
+def _copy_on_write_enabled() -> bool:
+    import pandas as pd
+    return int(pd.__version__.split(".")[0]) >= 3 or pd.options.mode.copy_on_write is True
+
+def _detached_copy(view):
+    """A copy of a cached view that callers may modify freely without touching the cache."""
+    return view.copy(deep=not _copy_on_write_enabled())
+
+def get_pandas_view(version: str, frame, columns: list[str] = None):
+    """
+    Pandas view of a dataset version (optionally only some columns), converted once per version.
+    A column subset is sliced from an already cached full view when there is one.
+    """
+    column_key = tuple(columns) if columns else None
+    view = _pandas_views.get((version, column_key))
+    if view is None and column_key is not None:
+        full_view = _pandas_views.get((version, None))
+        if full_view is not None:
+            view = full_view[list(column_key)]
+    if view is None:
+        view = _to_pandas(materialize_columns(frame, columns))
+        _pandas_views.put((version, column_key), view)
+    return _detached_copy(view)
+
+def get_pandas_head(version: str, frame, n: int = 5):
+    """Pandas preview of the first n rows of a dataset version; the scan runs once per version."""
+    head = _pandas_heads.get_or_create((version, n), lambda: _to_pandas(materialize_head(frame, n)))
+    return _detached_copy(head)
+
+def get_cached_chart_options(code: str, version: str, build):
+    """
+    ECharts options for chart code run against a dataset version. build() executes the code and is
+    only called on a cache miss; empty results and exceptions are not cached. Treat the returned
+    dict as read-only, it is shared with later reruns.
+    """
+    key = (hashlib.sha256(code.encode("utf-8")).hexdigest(), version)
+    options = _chart_options.get(key)
+    if options is None:
+        options = build()
+        if options:
+            _chart_options.put(key, options)
+    return options
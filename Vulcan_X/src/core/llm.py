@@ -32,6 +32,7 @@ def get_ragbits_llm_client() -> LiteLLM:
 class ChartPromptInput(BaseModel):
     data_preview: str
     user_query: str
+    column_profile: str = "" # Compact per-column statistics (core.data_profiler)
 
 # Define ChartPrompt subclass for proper prompt templating (UPDATED FOR ECHARTS)
 class ChartPrompt(Prompt[ChartPromptInput, str]):
@@ -151,6 +152,12 @@ class ChartPrompt(Prompt[ChartPromptInput, str]):
     ```
     {{ data_preview }}
     ```
+    {% if column_profile %}
+    Column statistics over the full dataset (use these for real value ranges, cardinality and nulls):
+    ```
+    {{ column_profile }}
+    ```
+    {% endif %}
     Generate Python code that defines an ECharts `options_dict` based on the user's request:
     "{{ user_query }}"
     """
@@ -284,6 +291,7 @@ class FlowDiagramPrompt(Prompt[FlowDiagramPromptInput, str]):
 class SuggestedTransformationPromptInput(BaseModel):
     data_preview: str
     goals: str = ""
+    column_profile: str = "" # Compact per-column statistics (core.data_profiler)
 
 class SuggestedTransformationPrompt(Prompt[SuggestedTransformationPromptInput, str]):
     system_prompt = """
@@ -296,6 +304,12 @@ class SuggestedTransformationPrompt(Prompt[SuggestedTransformationPromptInput, s
     ```
     {{ data_preview }}
     ```
+    {% if column_profile %}
+    Column statistics over the full dataset (use these for real value ranges, cardinality and nulls):
+    ```
+    {{ column_profile }}
+    ```
+    {% endif %}
     Suggest some useful data transformations that could be applied.
     {% if goals %}
     User's goals: {{ goals }}
@@ -310,6 +324,7 @@ class TransformationCodePromptInput(BaseModel):
     data_preview: str # Preview of the DataFrame to be transformed
     transformation_description: str # User's description of desired transformation
     all_df_schemas_json: str # JSON string of all DataFrame schemas for potential merges/joins
+    column_profile: str = "" # Compact per-column statistics of the DataFrame to transform (core.data_profiler)
 
 class TransformationCodePrompt(Prompt[TransformationCodePromptInput, str]): # REVERTED TO STR
     system_prompt = """
@@ -381,7 +396,13 @@ class TransformationCodePrompt(Prompt[TransformationCodePromptInput, str]): # RE
     ```
     {{ data_preview }}
     ```
-    And other available DataFrame schemas (Polars column names):
+    {% if column_profile %}
+    Column statistics over the full dataset (use these for real value ranges, cardinality and nulls):
+    ```
+    {{ column_profile }}
+    ```
+    {% endif %}
+    And other available DataFrame schemas (Polars column names, keyed by the variable name each DataFrame is available under):
     {{ all_df_schemas_json }}
     
     Generate Python code (using Polars for transformations) to perform the following:
@@ -394,6 +415,65 @@ class TransformationCodePrompt(Prompt[TransformationCodePromptInput, str]): # RE
         temperature: float = 0.5
     llm_settings: LLMSettings = LLMSettings()
 
+# Prompt for transformation code written against Polars LazyFrames (run with the query optimizer/streaming engine)
+class LazyTransformationCodePrompt(Prompt[TransformationCodePromptInput, str]):
+    system_prompt = """
+    You are an expert Python data engineer. Your task is to generate Python code for data transformations using the **Polars lazy API**.
+    The DataFrame to transform is available as `df`, a **Polars LazyFrame** (not pandas). Other available DataFrames are
+    also LazyFrames, available under the names used as keys of the schema JSON (the file name in snake_case without its
+    extension, e.g. `orders.csv` -> `orders`).
+    `pl` (polars) is already imported. Your code MUST:
+    1.  Build the transformation lazily on `df` with expressions only (`with_columns`, `filter`, `select`, `group_by(...).agg(...)`,
+        `join`, `sort`, `unique`, `pl.col(...)`, `pl.when(...).then(...).otherwise(...)`, `.str`/`.dt` namespaces).
+    2.  Assign the final **LazyFrame** to a variable named `transformed_lf`.
+    3.  NOT call `.collect()`, `.to_pandas()`, `pl.DataFrame(...)`, `.map_elements(...)`, `.apply(...)` or any pandas API. The caller
+        collects the plan with the streaming engine.
+    Use the schema and preview below for exact column names and types; cast explicitly where types may be mixed.
+
+    Your output MUST be a JSON object with the following keys:
+    - `code`: An **array of strings**, where each string is a single line of the Python code.
+    - `annotation`: A conceptual annotation of the transformation's "shape change" in `(Input Shape) -> (Output Shape)` format, e.g. `(R, C) -> (R', C')`.
+    - `description`: A brief natural language summary of the transformation applied.
+
+    Example output JSON for "Total sales per region, largest first":
+    ```json
+    {
+        "code": [
+            "transformed_lf = (",
+            "    df.group_by('Region')",
+            "    .agg(pl.col('Sales').cast(pl.Float64).sum().alias('Total_Sales'))",
+            "    .sort('Total_Sales', descending=True)",
+            ")"
+        ],
+        "annotation": "(R, C) -> (R', 2)",
+        "description": "Grouped by Region and summed Sales, sorted descending."
+    }
+    ```
+    If the transformation cannot be expressed with lazy Polars expressions, return an empty `code` array and explain why in `description`.
+    """
+    user_prompt = """
+    Given the current DataFrame preview:
+    ```
+    {{ data_preview }}
+    ```
+    {% if column_profile %}
+    Column statistics over the full dataset (use these for real value ranges, cardinality and nulls):
+    ```
+    {{ column_profile }}
+    ```
+    {% endif %}
+    And other available DataFrame schemas (column names, keyed by the variable name each LazyFrame is available under):
+    {{ all_df_schemas_json }}
+
+    Generate Polars LazyFrame code that performs the following:
+    "{{ transformation_description }}"
+
+    Assign the resulting LazyFrame to `transformed_lf`. Provide the output as a JSON object as described in the system prompt.
+    """
+    class LLMSettings(BaseModel):
+        temperature: float = 0.3
+    llm_settings: LLMSettings = LLMSettings()
+
 # NEW: Input and Prompt for Wireframe Generation (MOVED HERE from agents.py)
 class WireframePromptInput(BaseModel):
     user_description: str
@@ -434,8 +514,8 @@ async def generate_content_with_ragbits_llm(prompt_instance: Prompt) -> str:
     except Exception as e:
         return f"Error: An error occurred during content generation: {e}"
 
-def generate_chart_code_with_ragbits(data_preview: str, user_query: str) -> str:
-    chart_prompt_input_data = ChartPromptInput(data_preview=data_preview, user_query=user_query)
+def generate_chart_code_with_ragbits(data_preview: str, user_query: str, column_profile: str = "") -> str:
+    chart_prompt_input_data = ChartPromptInput(data_preview=data_preview, user_query=user_query, column_profile=column_profile)
     chart_prompt_instance = ChartPrompt(chart_prompt_input_data)
     return asyncio.run(generate_content_with_ragbits_llm(chart_prompt_instance))
 
@@ -454,20 +534,31 @@ async def generate_er_diagram_for_multiple_dfs(description: str, df_schemas_json
     er_multi_df_prompt_instance = ERDiagramMultiDFPrompt(er_multi_df_prompt_input)
     return await generate_content_with_ragbits_llm(er_multi_df_prompt_instance)
 
-async def suggest_data_transformations_prompt(data_preview: str) -> str:
-    suggest_prompt_input = SuggestedTransformationPromptInput(data_preview=data_preview)
+async def suggest_data_transformations_prompt(data_preview: str, column_profile: str = "") -> str:
+    suggest_prompt_input = SuggestedTransformationPromptInput(data_preview=data_preview, column_profile=column_profile)
     suggest_prompt_instance = SuggestedTransformationPrompt(suggest_prompt_input)
     return await generate_content_with_ragbits_llm(suggest_prompt_instance)
 
-async def generate_transformation_code_prompt(data_preview: str, transformation_description: str, all_df_schemas_json: str) -> str:
+async def generate_transformation_code_prompt(data_preview: str, transformation_description: str, all_df_schemas_json: str, column_profile: str = "") -> str:
     transform_prompt_input = TransformationCodePromptInput(
         data_preview=data_preview,
         transformation_description=transformation_description,
-        all_df_schemas_json=all_df_schemas_json
+        all_df_schemas_json=all_df_schemas_json,
+        column_profile=column_profile
     )
     transform_prompt_instance = TransformationCodePrompt(transform_prompt_input)
     return await generate_content_with_ragbits_llm(transform_prompt_instance)
 
+async def generate_lazy_transformation_code_prompt(data_preview: str, transformation_description: str, all_df_schemas_json: str, column_profile: str = "") -> str:
+    transform_prompt_input = TransformationCodePromptInput(
+        data_preview=data_preview,
+        transformation_description=transformation_description,
+        all_df_schemas_json=all_df_schemas_json,
+        column_profile=column_profile
+    )
+    transform_prompt_instance = LazyTransformationCodePrompt(transform_prompt_input)
+    return await generate_content_with_ragbits_llm(transform_prompt_instance)
+
 # NEW: Function to generate MukuroL wireframe code using the agent
 async def generate_mukuro_wireframe_code(user_description: str, mukuro_reference: str, temperature: float = 0.8) -> str:
     llm_client = get_ragbits_llm_client() # Get the initialized LiteLLM client
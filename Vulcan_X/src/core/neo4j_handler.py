@@ -1,48 +1,528 @@
 # src/core/neo4j_handler.py
 from neo4j import GraphDatabase
+from neo4j.exceptions import ServiceUnavailable, SessionExpired
+import atexit
+import threading
+import time
 import uuid
 from datetime import datetime
 import json
 import os
-from passlib.hash import pbkdf2_sha256 # For hashing initial admin password
+from utils.password_hashing import hash_password # Initial admin password uses the configured hashing policy
 from dotenv import load_dotenv
+from core.blob_store import prepare_blob, decode_blob
 
 load_dotenv()
 
-class Neo4jHandler:
-    def __init__(self):
-        # Load Neo4j connection details from environment variables or .env file
-        self.uri = os.getenv("NEO4J_URI", "bolt://localhost:7687")
-        self.username = os.getenv("NEO4J_USERNAME", "neo4j")
-        self.password = os.getenv("NEO4J_PASSWORD", "password") # Replace with your Neo4j password
+# --- Process-wide driver ---
+# One driver (and therefore one connection pool) is shared by every page, session and handler in
+# the process. Creating a driver per Streamlit session multiplied connections and repeated the
+# connectivity check and admin bootstrap on every page load.
+# A connection error seen by any caller resets the shared driver (reset_neo4j_driver), so
+# get_neo4j_driver() returns None during an outage and reconnects once the database is back.
+NEO4J_MAX_CONNECTION_POOL_SIZE = int(os.getenv("NEO4J_MAX_CONNECTION_POOL_SIZE", "50"))
+NEO4J_RECONNECT_INTERVAL_SECONDS = float(os.getenv("NEO4J_RECONNECT_INTERVAL_SECONDS", "30"))
+
+_shared_driver = None
+_shared_driver_lock = threading.Lock()
+_last_connection_failure = 0.0 # time.monotonic() of the last failed connection attempt
+_admin_bootstrap_done = False
+_schema_bootstrap_done = False
+_lineage_constraint_ready = False # LineageNode.key uniqueness constraint is in place (see _initialize_schema)
+_bootstrap_lock = threading.Lock()
+_neo4j_handler = None
+_handler_lock = threading.Lock()
+NEO4J_CONNECTION_ERRORS = (ServiceUnavailable, SessionExpired)
+
+def neo4j_connection_settings() -> tuple[str, str, str]:
+    """(uri, username, password) from the environment; shared by the sync and async handlers."""
+    uri = os.getenv("NEO4J_URI", "bolt://localhost:7687")
+    username = os.getenv("NEO4J_USERNAME", "neo4j")
+    password = os.getenv("NEO4J_PASSWORD", "password") # Replace with your Neo4j password
+    return uri, username, password
+
+def get_neo4j_driver():
+    """
+    Returns the process-wide Neo4j driver, creating it on first use.
+    Returns None if Neo4j is unreachable; reconnection is retried at most once every
+    NEO4J_RECONNECT_INTERVAL_SECONDS so a down database doesn't stall every page load.
+    """
+    global _shared_driver, _last_connection_failure
+    if _shared_driver is not None:
+        return _shared_driver
+    with _shared_driver_lock:
+        if _shared_driver is not None:
+            return _shared_driver
+        if _last_connection_failure and time.monotonic() - _last_connection_failure < NEO4J_RECONNECT_INTERVAL_SECONDS:
+            return None
+        uri, username, password = neo4j_connection_settings()
 
         # --- DEBUGGING PRINTS ---
-        print(f"\n--- Neo4jHandler Initialization Debug ---")
-        print(f"NEO4J_URI loaded: {self.uri}")
-        print(f"NEO4J_USERNAME loaded: {self.username}")
+        print(f"\n--- Neo4j Driver Initialization Debug ---")
+        print(f"NEO4J_URI loaded: {uri}")
+        print(f"NEO4J_USERNAME loaded: {username}")
         # Only print a partial password to avoid exposing it in logs
-        print(f"NEO4J_PASSWORD loaded (first 3 chars): {self.password[:3]}...")
+        print(f"NEO4J_PASSWORD loaded (first 3 chars): {password[:3]}...")
+        print(f"NEO4J_MAX_CONNECTION_POOL_SIZE: {NEO4J_MAX_CONNECTION_POOL_SIZE}")
         print(f"--- End Debug ---\n")
         # --- END DEBUGGING PRINTS ---
 
-        self.driver = None
+        driver = None
         try:
-            self.driver = GraphDatabase.driver(self.uri, auth=(self.username, self.password))
-            self.driver.verify_connectivity()
+            driver = GraphDatabase.driver(uri, auth=(username, password), max_connection_pool_size=NEO4J_MAX_CONNECTION_POOL_SIZE)
+            driver.verify_connectivity()
             print("Neo4j connection successful!")
-            self._initialize_admin_user() # Initialize admin user on successful connection
+            _shared_driver = driver
+            _last_connection_failure = 0.0
         except Exception as e:
             print(f"Error connecting to Neo4j: {type(e).__name__}: {e}") # Print exception type and message
-            self.driver = None # Ensure driver is None if connection fails
+            _last_connection_failure = time.monotonic()
+            if driver is not None:
+                driver.close()
+        return _shared_driver
+
+def close_neo4j_driver():
+    """Closes the process-wide driver and its connection pool (called automatically at exit)."""
+    global _shared_driver
+    with _shared_driver_lock:
+        if _shared_driver is not None:
+            _shared_driver.close()
+            _shared_driver = None
+            print("Neo4j connection closed.")
+
+atexit.register(close_neo4j_driver)
+
+def is_neo4j_connection_error(error: Exception) -> bool:
+    """True for errors meaning the database is unreachable (as opposed to a failing query)."""
+    return isinstance(error, NEO4J_CONNECTION_ERRORS)
+
+def reset_neo4j_driver(driver=None):
+    """
+    Drops the shared driver after a connection error (only if it is still `driver`, when given), so
+    get_neo4j_driver() reports the outage and reconnects after NEO4J_RECONNECT_INTERVAL_SECONDS.
+    """
+    global _shared_driver, _last_connection_failure
+    with _shared_driver_lock:
+        if _shared_driver is None or (driver is not None and _shared_driver is not driver):
+            return
+        stale_driver, _shared_driver = _shared_driver, None
+        _last_connection_failure = time.monotonic()
+    print("Neo4j connection lost; the shared driver was reset.")
+    try:
+        stale_driver.close()
+    except Exception as e:
+        print(f"Error closing stale Neo4j driver: {e}")
+
+def check_neo4j_connectivity() -> bool:
+    """Health check: True if the shared driver can reach Neo4j right now; resets the driver otherwise."""
+    driver = get_neo4j_driver()
+    if driver is None:
+        return False
+    try:
+        driver.verify_connectivity()
+        return True
+    except Exception as e:
+        print(f"Neo4j health check failed: {type(e).__name__}: {e}")
+        reset_neo4j_driver(driver)
+        return False
+
+def lineage_constraint_ready() -> bool:
+    """True once the LineageNode.key uniqueness constraint exists (required for concurrent lineage writers)."""
+    return _lineage_constraint_ready
+
+def get_neo4j_handler() -> "Neo4jHandler":
+    """Returns the process-wide Neo4jHandler. Pages should use this instead of constructing handlers."""
+    global _neo4j_handler
+    if _neo4j_handler is None:
+        with _handler_lock:
+            if _neo4j_handler is None:
+                _neo4j_handler = Neo4jHandler()
+    return _neo4j_handler
+
+# --- Schema ---
+# Every lineage node (whatever its type label) also carries the shared LineageNode label, so lineage
+# MERGEs and MATCHes are always index-backed instead of scanning all nodes for an id. A lineage node is
+# identified by its type and id together (a DataFrame and a Dataset may share an id), stored as
+# key = "<type>:<id>". The key is backed by a uniqueness constraint, not a plain index: only a constraint
+# makes concurrent MERGEs (parallel sessions, bulk-import workers) take the locks that prevent duplicate
+# nodes. The id keeps a plain index for the read API, which looks nodes up by id.
+LINEAGE_NODE_LABEL = "LineageNode"
+EVENT_NODE_LABELS = ("CodeGeneration", "ChartGeneration", "DocumentQuery", "ProjectFlowDiagram", "WireframeGeneration")
+LINEAGE_LINK_REL_TYPES = ("INVOLVED_IN_LINEAGE", "INVOLVED_IN_FLOW")
+SCHEMA_STATEMENTS = [
+    "CREATE CONSTRAINT user_username_unique IF NOT EXISTS FOR (u:User) REQUIRE u.username IS UNIQUE",
+    "CREATE CONSTRAINT role_name_unique IF NOT EXISTS FOR (r:Role) REQUIRE r.name IS UNIQUE",
+    *[f"CREATE CONSTRAINT {label.lower()}_id_unique IF NOT EXISTS FOR (n:{label}) REQUIRE n.id IS UNIQUE" for label in EVENT_NODE_LABELS],
+    "CREATE CONSTRAINT blob_sha256_unique IF NOT EXISTS FOR (b:Blob) REQUIRE b.sha256 IS UNIQUE",
+    # Back the read API: keyset pagination orders by timestamp, filters by user
+    *[f"CREATE INDEX {label.lower()}_timestamp IF NOT EXISTS FOR (n:{label}) ON (n.timestamp)" for label in EVENT_NODE_LABELS],
+    *[f"CREATE INDEX {label.lower()}_username IF NOT EXISTS FOR (n:{label}) ON (n.username)" for label in EVENT_NODE_LABELS]
+]
+# An earlier schema made the id alone unique; that constraint is dropped in favour of the plain id index.
+LEGACY_LINEAGE_ID_CONSTRAINT_DROP = "DROP CONSTRAINT lineage_node_id_unique IF EXISTS"
+LINEAGE_NODE_ID_INDEX = f"CREATE INDEX lineage_node_id IF NOT EXISTS FOR (n:{LINEAGE_NODE_LABEL}) ON (n.id)"
+LINEAGE_NODE_CONSTRAINT = f"CREATE CONSTRAINT lineage_node_key_unique IF NOT EXISTS FOR (n:{LINEAGE_NODE_LABEL}) REQUIRE n.key IS UNIQUE"
+# If legacy duplicates block the constraint, a plain index keeps key lookups indexed (Neo4j won't create both)
+LINEAGE_NODE_KEY_INDEX = f"CREATE INDEX lineage_node_key IF NOT EXISTS FOR (n:{LINEAGE_NODE_LABEL}) ON (n.key)"
+# Lineage nodes written before the LineageNode label/key existed are migrated in batches on startup:
+# linked nodes get the label, then every LineageNode without a key gets one from its type label
+LINEAGE_LABEL_MIGRATION = f"""
+MATCH ()-[:{"|".join(LINEAGE_LINK_REL_TYPES)}]->(n)
+WHERE NOT n:{LINEAGE_NODE_LABEL}
+CALL {{ WITH n SET n:{LINEAGE_NODE_LABEL} }} IN TRANSACTIONS OF 10000 ROWS
+"""
+LINEAGE_KEY_MIGRATION = f"""
+MATCH (n:{LINEAGE_NODE_LABEL})
+WHERE n.key IS NULL AND n.id IS NOT NULL
+CALL {{
+    WITH n
+    SET n.key = coalesce(head([label IN labels(n) WHERE label <> '{LINEAGE_NODE_LABEL}']), 'GenericNode') + ':' + toString(n.id)
+}} IN TRANSACTIONS OF 10000 ROWS
+"""
+LINEAGE_KEY_CLASHES_QUERY = f"""
+MATCH (n:{LINEAGE_NODE_LABEL})
+WHERE n.key IS NOT NULL
+WITH n.key AS key, count(*) AS nodes
+WHERE nodes > 1
+RETURN count(*) AS clashes
+"""
+
+# Lineage writes are sent as UNWIND parameter lists; very large lineages are split into batches of this many rows
+LINEAGE_UNWIND_BATCH_SIZE = int(os.getenv("NEO4J_LINEAGE_BATCH_SIZE", "1000"))
+
+# --- Read API ---
+DEFAULT_EVENT_PAGE_SIZE = 50
+MAX_EVENT_PAGE_SIZE = 1000
+MAX_LINEAGE_DEPTH = 6
+DEFAULT_LINEAGE_RESULT_LIMIT = 1000
+# Small properties returned when browsing events; full payloads (code, answers) only on request
+EVENT_SUMMARY_PROPERTIES = ("id", "type", "timestamp", "username", "language", "description", "query", "document_name", "diagram_type")
+
+def _to_iso(value):
+    """Neo4j temporal values -> ISO strings (anything else is returned unchanged)."""
+    return value.iso_format() if hasattr(value, "iso_format") else value
+
+def _cypher_name(name: str) -> str:
+    """Backtick-quotes a dynamic label or relationship type for interpolation into Cypher."""
+    return "`" + str(name).replace("`", "``") + "`"
+
+def _lineage_node_type(labels: list) -> str:
+    """The node's type label (everything except the shared LineageNode label)."""
+    return next((label for label in labels if label != LINEAGE_NODE_LABEL), "GenericNode")
+
+def lineage_node_key(node_type: str, node_id) -> str:
+    """Identity of a lineage node: its type and id together (see LINEAGE_NODE_CONSTRAINT)."""
+    return f"{node_type}:{node_id}"
+
+def _batches(rows: list, size: int = None):
+    size = max(1, size or LINEAGE_UNWIND_BATCH_SIZE)
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+def build_lineage_statements(event_label: str, event_id: str, link_rel_type: str, flow_data: dict) -> list:
+    """Returns the (query, params) statements that write one event's lineage (see build_bulk_lineage_statements)."""
+    return build_bulk_lineage_statements([(event_label, event_id, link_rel_type, flow_data)])
+
+def build_bulk_lineage_statements(events: list) -> list:
+    """
+    Returns the (query, params) statements that write lineage nodes/edges for many events and link
+    each event node to its lineage. events is a list of (event_label, event_id, link_rel_type, flow_data).
+    Nodes are grouped by type label, edges by rel type and links by (event label, link rel type)
+    into UNWIND batches, so a lineage costs a handful of round trips instead of one per node and
+    per edge. All lookups go through the LineageNode key constraint. Edge endpoints refer to the
+    node with that id in the same flow_data; endpoints that were never declared become 'GenericNode' nodes.
+    """
+    node_rows_by_label = {}
+    seen_node_keys = set()
+    edge_rows_by_type = {}
+    link_rows_by_key = {}
+    def add_node(node_type, node_id, label):
+        key = lineage_node_key(node_type, node_id)
+        if key not in seen_node_keys:
+            seen_node_keys.add(key)
+            node_rows_by_label.setdefault(node_type, []).append({"key": key, "id": node_id, "label": label})
+        return key
+    for event_label, event_id, link_rel_type, flow_data in events:
+        node_keys = {} # id -> key within this flow_data
+        keys_involved = set()
+        for node_data in flow_data.get("nodes", []):
+            node_id = node_data.get("id")
+            if not node_id:
+                continue
+            node_type = node_data.get("type", "GenericNode") # Default node type
+            node_keys[node_id] = add_node(node_type, node_id, node_data.get("label", node_id))
+            keys_involved.add(node_keys[node_id])
+        for edge_data in flow_data.get("edges", []):
+            source_id = edge_data.get("source")
+            target_id = edge_data.get("target")
+            if not (source_id and target_id):
+                continue
+            for endpoint in (source_id, target_id):
+                if endpoint not in node_keys:
+                    node_keys[endpoint] = add_node("GenericNode", endpoint, endpoint)
+                    keys_involved.add(node_keys[endpoint])
+            rel_type = edge_data.get("rel_type", "FLOWS_TO") # Default rel type
+            edge_rows_by_type.setdefault(rel_type, []).append({"source": node_keys[source_id], "target": node_keys[target_id], "label": edge_data.get("label", "")})
+        link_rows_by_key.setdefault((event_label, link_rel_type), []).extend({"event_id": event_id, "node_key": key} for key in keys_involved)
+
+    statements = []
+    # Create nodes
+    for node_type, rows in node_rows_by_label.items():
+        query = f"""
+        UNWIND $rows AS row
+        MERGE (n:{LINEAGE_NODE_LABEL} {{key: row.key}})
+        ON CREATE SET n.id = row.id, n.label = row.label
+        SET n:{_cypher_name(node_type)}
+        """
+        statements.extend((query, {"rows": batch}) for batch in _batches(rows))
+    # Create relationships
+    for rel_type, rows in edge_rows_by_type.items():
+        query = f"""
+        UNWIND $rows AS row
+        MATCH (source_node:{LINEAGE_NODE_LABEL} {{key: row.source}})
+        MATCH (target_node:{LINEAGE_NODE_LABEL} {{key: row.target}})
+        MERGE (source_node)-[r:{_cypher_name(rel_type)}]->(target_node)
+        ON CREATE SET r.label = row.label
+        """
+        statements.extend((query, {"rows": batch}) for batch in _batches(rows))
+    # Link each event to all nodes involved in its lineage
+    for (event_label, link_rel_type), rows in link_rows_by_key.items():
+        query = f"""
+        UNWIND $rows AS row
+        MATCH (e:{_cypher_name(event_label)} {{id: row.event_id}})
+        MATCH (n:{LINEAGE_NODE_LABEL} {{key: row.node_key}})
+        MERGE (e)-[:{_cypher_name(link_rel_type)}]->(n)
+        """
+        statements.extend((query, {"rows": batch}) for batch in _batches(rows))
+    return statements
+
+def has_lineage(flow_data: dict) -> bool:
+    return bool(flow_data and (flow_data.get("nodes") or flow_data.get("edges")))
+
+# --- Cypher shared by Neo4jHandler and AsyncNeo4jHandler (core.async_neo4j_handler) ---
+GET_USER_QUERY = "MATCH (u:User {username: $username}) RETURN u.username AS username, u.hashed_password AS hashed_password, u.approved AS approved"
+# User record plus role names in one round trip (used by the auth cache in utils.auth)
+GET_USER_WITH_ROLES_QUERY = """
+MATCH (u:User {username: $username})
+OPTIONAL MATCH (u)-[:HAS_ROLE]->(r:Role)
+RETURN u.username AS username, u.hashed_password AS hashed_password, u.approved AS approved, collect(r.name) AS roles
+"""
+CHECK_USER_ROLE_QUERY = "MATCH (u:User {username: $username})-[:HAS_ROLE]->(r:Role {name: $role_name}) RETURN u"
+# Events are MERGEd on id, so a retried write (after a failed or interrupted transaction) is idempotent
+STORE_CODE_GENERATION_QUERY = """
+MERGE (g:CodeGeneration {id: $generation_id})
+SET g += {
+    original_code_snippet_sha256: $original_code_snippet_sha256,
+    generated_code_snippet_sha256: $generated_code_snippet_sha256,
+    timestamp: datetime($timestamp),
+    username: $username,
+    language: $language,
+    type: "CodeGeneration",
+    confidence: $confidence,
+    effort_hours: $effort_hours,
+    original_time_hours: $original_time_hours,
+    time_saved_hours: $time_saved_hours
+}
+RETURN g.id
+"""
+STORE_CHART_EVENT_QUERY = """
+MERGE (c:ChartGeneration {id: $event_id})
+SET c += {
+    query: $user_query, // Parameter renamed to avoid a clash with the query argument
+    generated_code_sha256: $generated_code_sha256,
+    data_preview_sha256: $data_preview_sha256,
+    timestamp: datetime($timestamp),
+    username: $username,
+    language: $language,
+    type: "ChartGeneration"
+}
+RETURN c.id
+"""
+STORE_DOCUMENT_QUERY_EVENT_QUERY = """
+MERGE (d:DocumentQuery {id: $event_id})
+SET d += {
+    query: $query,
+    answer: $answer,
+    document_name: $document_name,
+    extracted_text_preview: $extracted_text_preview,
+    timestamp: datetime($timestamp),
+    username: $username,
+    language: $language,
+    type: "DocumentQuery"
+}
+RETURN d.id
+"""
+STORE_PROJECT_FLOW_EVENT_QUERY = """
+MERGE (p:ProjectFlowDiagram {id: $event_id})
+SET p += {
+    description: $description,
+    generated_diagram_code: $generated_code,
+    diagram_type: $diagram_type,
+    timestamp: datetime($timestamp),
+    username: $username,
+    language: $language,
+    type: "ProjectFlowDiagram"
+}
+RETURN p.id
+"""
+STORE_WIREFRAME_EVENT_QUERY = """
+MERGE (w:WireframeGeneration {id: $event_id})
+SET w += {
+    description: $description,
+    generated_mukuro_code_sha256: $generated_mukuro_code_sha256,
+    timestamp: datetime($timestamp),
+    username: $username,
+    language: $language,
+    type: "WireframeGeneration"
+}
+RETURN w.id
+"""
+
+def code_generation_params(generation_id: str, original_code_snippet: str, generated_code_snippet: str, timestamp: str, metrics: dict = None, username: str = None, language: str = None) -> dict:
+    """Parameters for STORE_CODE_GENERATION_QUERY."""
+    metrics = metrics or {}
+    return {
+        "generation_id": generation_id,
+        "original_code_snippet": original_code_snippet,
+        "generated_code_snippet": generated_code_snippet,
+        "timestamp": timestamp,
+        "username": username,
+        "language": language,
+        "confidence": metrics.get("confidence"),
+        "effort_hours": metrics.get("effort"),
+        "original_time_hours": metrics.get("original_time"),
+        "time_saved_hours": metrics.get("time_saved")
+    }
+
+# --- Content blobs ---
+# Large text payloads are stored once as content-addressed :Blob {sha256} nodes (see core.blob_store)
+# and referenced from events via HAS_CONTENT {field} plus a <field>_sha256 property.
+BLOB_LABEL = "Blob"
+EVENT_BLOB_PROPERTIES = {
+    "CodeGeneration": ("original_code_snippet", "generated_code_snippet"),
+    "ChartGeneration": ("generated_code", "data_preview"),
+    "WireframeGeneration": ("generated_mukuro_code",)
+}
+
+def extract_event_blobs(event_label: str, event_id: str, values: dict) -> list:
+    """
+    Replaces each blob property in values (query params or node properties) with its
+    '<property>_sha256' reference and returns the Blob rows to write for the event.
+    """
+    blobs = []
+    for prop in EVENT_BLOB_PROPERTIES.get(event_label, ()):
+        text = values.pop(prop, None)
+        if text is None:
+            values[f"{prop}_sha256"] = None
+            continue
+        blob = prepare_blob(str(text))
+        values[f"{prop}_sha256"] = blob["sha256"]
+        blobs.append({"event_id": event_id, "field": prop, **blob})
+    return blobs
+
+def build_blob_statements(event_label: str, blob_rows: list) -> list:
+    """(query, params) statements that MERGE Blob nodes and link them to their events with HAS_CONTENT."""
+    query = f"""
+    UNWIND $rows AS row
+    MERGE (b:{BLOB_LABEL} {{sha256: row.sha256}})
+    ON CREATE SET b.size = row.size, b.encoding = row.encoding, b.payload = row.payload, b.external = row.external
+    WITH b, row
+    MATCH (e:{_cypher_name(event_label)} {{id: row.event_id}})
+    MERGE (e)-[:HAS_CONTENT {{field: row.field}}]->(b)
+    """
+    return [(query, {"rows": batch}) for batch in _batches(blob_rows)]
+
+def _store_event_tx(tx, event_label: str, query: str, params: dict, blobs: list, lineage_statements: list = ()):
+    """Writes an event node, its content blobs and its lineage in one transaction; returns the event id."""
+    event_id = tx.run(query, **params).single()[0]
+    for statement_query, statement_params in [*build_blob_statements(event_label, blobs), *lineage_statements]:
+        tx.run(statement_query, **statement_params).consume()
+    return event_id
+
+class Neo4jHandler:
+    def __init__(self):
+        # Connection details and pooling live in get_neo4j_driver(); every handler shares that driver
+        driver = get_neo4j_driver()
+        if driver is not None:
+            self._ensure_bootstrap(driver)
+
+    @property
+    def driver(self):
+        """The shared driver, or None while Neo4j is unreachable (reconnects lazily)."""
+        driver = get_neo4j_driver()
+        if driver is not None:
+            self._ensure_bootstrap(driver)
+        return driver
+
+    def _ensure_bootstrap(self, driver):
+        """Runs the one-time schema migration and admin bootstrap for this process once a connection is available."""
+        global _admin_bootstrap_done, _schema_bootstrap_done
+        if _admin_bootstrap_done and _schema_bootstrap_done:
+            return
+        with _bootstrap_lock:
+            if not _schema_bootstrap_done:
+                _schema_bootstrap_done = self._initialize_schema(driver)
+            if not _admin_bootstrap_done:
+                _admin_bootstrap_done = self._initialize_admin_user(driver)
+
+    def _initialize_schema(self, driver):
+        """
+        Creates the uniqueness constraints and indexes the handler's queries rely on (idempotent),
+        then migrates pre-existing lineage nodes and adds the lineage key constraint. A failing
+        statement (e.g. a constraint blocked by duplicate legacy data) is reported and skipped.
+        """
+        if not driver:
+            print("Schema initialization skipped: Neo4j driver not initialized.")
+            return False
+        with driver.session() as session:
+            try:
+                for statement in SCHEMA_STATEMENTS:
+                    try:
+                        session.run(statement).consume()
+                    except Exception as e:
+                        print(f"Error applying Neo4j schema statement '{statement}': {e}")
+                self._initialize_lineage_constraint(session)
+                print("Neo4j schema constraints and indexes are in place.")
+                return True
+            except Exception as e:
+                print(f"Error initializing Neo4j schema: {e}")
+                return False
+
+    def _initialize_lineage_constraint(self, session):
+        """
+        Migrates legacy lineage nodes (LineageNode label, type:id key), then adds the key uniqueness
+        constraint unless existing nodes share a key; in that case a plain key index is used instead.
+        """
+        global _lineage_constraint_ready
+        session.run(LEGACY_LINEAGE_ID_CONSTRAINT_DROP).consume()
+        session.run(LINEAGE_NODE_ID_INDEX).consume()
+        labels_added = session.run(LINEAGE_LABEL_MIGRATION).consume().counters.labels_added
+        if labels_added:
+            print(f"Labelled {labels_added} existing lineage nodes as {LINEAGE_NODE_LABEL}.")
+        session.run(LINEAGE_KEY_MIGRATION).consume()
+        clashes = session.run(LINEAGE_KEY_CLASHES_QUERY).single()["clashes"]
+        if clashes:
+            print(f"{clashes} lineage node keys are shared by several nodes; the LineageNode key constraint was not created.")
+        else:
+            try:
+                session.run(LINEAGE_NODE_CONSTRAINT).consume()
+                _lineage_constraint_ready = True
+                return
+            except Exception as e:
+                print(f"Error creating the LineageNode key constraint: {e}")
+        try:
+            session.run(LINEAGE_NODE_KEY_INDEX).consume()
+        except Exception as index_error:
+            print(f"Error creating the LineageNode key index: {index_error}")
 
-    def _initialize_admin_user(self):
+    def _initialize_admin_user(self, driver):
         """Ensures an 'admin' user exists with the 'admin' role."""
-        if not self.driver:
+        if not driver:
             print("Admin user initialization skipped: Neo4j driver not initialized.")
             return False
         admin_username = "admin"
         admin_password = "adminpass" # Default password for the admin user
-        with self.driver.session() as session:
+        with driver.session() as session:
             try:
                 # Check if admin user already exists
                 result = session.run("MATCH (u:User {username: $username}) RETURN u", username=admin_username)
@@ -50,7 +530,7 @@ class Neo4jHandler:
                     print(f"Admin user '{admin_username}' already exists in DB.")
                 else:
                     # Create admin user
-                    hashed_password = pbkdf2_sha256.hash(admin_password)
+                    hashed_password = hash_password(admin_password)
                     session.run(
                         "CREATE (u:User {username: $username, hashed_password: $hashed_password, approved: true}) RETURN u",
                         username=admin_username, hashed_password=hashed_password
@@ -75,27 +555,8 @@ class Neo4jHandler:
                 return False
             
     def close(self):
-        if self.driver:
-            self.driver.close()
-            print("Neo4j connection closed.")
-
-    def _create_node_if_not_exists(self, tx, node_id, label, node_type):
-        query = f"""
-        MERGE (n:{node_type} {{id: $node_id}})
-        ON CREATE SET n.label = $label
-        RETURN n
-        """
-        tx.run(query, node_id=node_id, label=label)
-
-    def _create_relationship_if_not_exists(self, tx, source_id, target_id, rel_type, rel_label=""):
-        query = f"""
-        MATCH (source_node), (target_node)
-        WHERE source_node.id = $source_id AND target_node.id = $target_id
-        MERGE (source_node)-[r:{rel_type}]->(target_node)
-        ON CREATE SET r.label = $rel_label
-        RETURN r
-        """
-        tx.run(query, source_id=source_id, target_id=target_id, rel_type=rel_type, rel_label=rel_label)
+        """The driver is shared process-wide; use close_neo4j_driver() to actually close the pool."""
+        pass
 
     # --- User Management Methods ---
     def create_user(self, username: str, hashed_password: str) -> tuple[bool, str]:
@@ -125,13 +586,18 @@ class Neo4jHandler:
         if not self.driver:
             return None
         with self.driver.session() as session:
-            result = session.run(
-                "MATCH (u:User {username: $username}) RETURN u.username AS username, u.hashed_password AS hashed_password, u.approved AS approved",
-                username=username
-            )
+            result = session.run(GET_USER_QUERY, username=username)
             record = result.single()
             return record.data() if record else None
 
+    def get_user_with_roles(self, username: str) -> dict | None:
+        """Retrieves user data (username, hashed_password, approved) and the user's role names in one query."""
+        if not self.driver:
+            return None
+        with self.driver.session() as session:
+            record = session.run(GET_USER_WITH_ROLES_QUERY, username=username).single()
+            return record.data() if record else None
+
     def update_user_approval(self, username: str, approved: bool) -> bool:
         """Updates the approval status of a user."""
         if not self.driver:
@@ -148,6 +614,21 @@ class Neo4jHandler:
                 print(f"Error updating user approval status for '{username}': {e}")
                 return False
     
+    def update_user_password_hash(self, username: str, hashed_password: str) -> bool:
+        """Replaces a user's stored password hash (used to migrate hashes to the current hashing policy)."""
+        if not self.driver:
+            return False
+        with self.driver.session() as session:
+            try:
+                session.run(
+                    "MATCH (u:User {username: $username}) SET u.hashed_password = $hashed_password, u.password_rehashed_at = datetime()",
+                    username=username, hashed_password=hashed_password
+                ).consume()
+                return True
+            except Exception as e:
+                print(f"Error updating password hash for '{username}': {e}")
+                return False
+
     def get_unapproved_users(self) -> list[dict]:
         """Returns a list of users whose accounts are not yet approved."""
         if not self.driver:
@@ -161,250 +642,259 @@ class Neo4jHandler:
         if not self.driver:
             return False
         with self.driver.session() as session:
-            result = session.run(
-                "MATCH (u:User {username: $username})-[:HAS_ROLE]->(r:Role {name: $role_name}) RETURN u",
-                username=username, role_name=role_name
-            )
+            result = session.run(CHECK_USER_ROLE_QUERY, username=username, role_name=role_name)
             return bool(result.single())
 
-    # --- Existing methods (kept for completeness) ---
-    def store_code_generation_with_lineage(self, generation_id: str, original_code_snippet: str, generated_code_snippet: str, timestamp: str, flow_data: dict = None, metrics: dict = None) -> bool:
+    def _store_event(self, event_label: str, query: str, params: dict, link_rel_type: str = None, flow_data: dict = None):
         """
-        Stores code generation event and its associated data lineage (nodes and edges) in Neo4j.
-        Optionally stores metrics.
+        Writes an event node, its deduplicated content Blobs and (optionally) its lineage in a single
+        transaction. Connection errors reset the shared driver and are re-raised, so callers such as the
+        write queue can tell an outage from a failing write; other errors are reported and return False.
         """
-        if not self.driver:
+        driver = self.driver
+        if not driver:
             print("Neo4j driver not initialized. Cannot store data.")
             return False
-        with self.driver.session() as session:
-            try:
-                # Create CodeGeneration node
-                query_create_gen_node = """
-                CREATE (g:CodeGeneration {
-                    id: $generation_id,
-                    original_code_snippet: $original_code,
-                    generated_code_snippet: $generated_code,
-                    timestamp: datetime($timestamp),
-                    type: "CodeGeneration",
-                    confidence: $confidence,
-                    effort_hours: $effort_hours,
-                    original_time_hours: $original_time_hours,
-                    time_saved_hours: $time_saved_hours
-                })
-                RETURN g.id
-                """
-                session.write_transaction(lambda tx: tx.run(query_create_gen_node,
-                                                        generation_id=generation_id,
-                                                        original_code=original_code_snippet,
-                                                        generated_code=generated_code_snippet,
-                                                        timestamp=timestamp,
-                                                        confidence=metrics.get("confidence") if metrics else None,
-                                                        effort_hours=metrics.get("effort") if metrics else None,
-                                                        original_time_hours=metrics.get("original_time") if metrics else None,
-                                                        time_saved_hours=metrics.get("time_saved") if metrics else None
-                                                        ).single()[0])
-                # Store data lineage details and link to CodeGeneration event
-                if flow_data and (flow_data.get("nodes") or flow_data.get("edges")):
-                    def _process_lineage_tx(tx):
-                        node_ids_involved = set()
-                        # Create nodes
-                        for node_data in flow_data.get("nodes", []):
-                            node_id = node_data.get("id")
-                            label = node_data.get("label", node_id)
-                            node_type = node_data.get("type", "GenericNode") # Default node type
-                            if node_id:
-                                self._create_node_if_not_exists(tx, node_id, label, node_type)
-                                node_ids_involved.add(node_id)
-                        # Create relationships
-                        for edge_data in flow_data.get("edges", []):
-                            source_id = edge_data.get("source")
-                            target_id = edge_data.get("target")
-                            rel_type = edge_data.get("rel_type", "FLOWS_TO") # Default rel type
-                            rel_label = edge_data.get("label", "")
-                            if source_id and target_id:
-                                self._create_relationship_if_not_exists(tx, source_id, target_id, rel_type, rel_label)
-                                node_ids_involved.add(source_id)
-                                node_ids_involved.add(target_id)
-                        # Link the CodeGeneration event to all nodes involved in this lineage
-                        query_link_gen_to_nodes = """
-                        MATCH (g:CodeGeneration {id: $generation_id})
-                        WITH g
-                        UNWIND $node_ids AS node_id
-                        MATCH (n) WHERE n.id = node_id
-                        MERGE (g)-[:INVOLVED_IN_LINEAGE]->(n)
-                        RETURN g
-                        """
-                        if node_ids_involved:
-                            tx.run(query_link_gen_to_nodes, generation_id=generation_id, node_ids=list(node_ids_involved))
-                    session.write_transaction(_process_lineage_tx)
-                print(f"Code generation event {generation_id} and lineage stored successfully in Neo4j.")
-                return True
-            except Exception as e:
-                print(f"Error storing code generation data in Neo4j: {e}")
-                return False
+        event_id = params.get("event_id") or params.get("generation_id")
+        try:
+            blobs = extract_event_blobs(event_label, event_id, params)
+            lineage_statements = build_lineage_statements(event_label, event_id, link_rel_type, flow_data) if link_rel_type and has_lineage(flow_data) else []
+            with driver.session() as session:
+                session.execute_write(_store_event_tx, event_label, query, params, blobs, lineage_statements)
+            return True
+        except Exception as e:
+            if is_neo4j_connection_error(e):
+                reset_neo4j_driver(driver)
+                raise
+            print(f"Error storing {event_label} event {event_id} in Neo4j: {e}")
+            return False
 
-    def store_chart_event(self, event_id: str, query: str, generated_code: str, data_preview: str, timestamp: str) -> bool:
+    # --- Read API ---
+    def get_events_page(self, event_types: list = None, start: str = None, end: str = None, username: str = None,
+                        language: str = None, cursor: dict = None, page_size: int = DEFAULT_EVENT_PAGE_SIZE,
+                        include_payload: bool = False) -> tuple[list[dict], dict | None]:
         """
-        Stores a chart generation event in Neo4j.
+        Returns one page of stored events, newest first, and the cursor for the next page (None at the end).
+        Filters: event_types (labels from EVENT_NODE_LABELS, default all), start/end (ISO timestamps),
+        username and language. Pagination is keyset-based on (timestamp, id): each label is queried
+        through its timestamp index with LIMIT page_size, and the per-label results are merged, so
+        deep pages cost the same as the first one.
         """
         if not self.driver:
-            print("Neo4j driver not initialized. Cannot store data.")
-            return False
+            return [], None
+        page_size = max(1, min(int(page_size), MAX_EVENT_PAGE_SIZE))
+        labels = [label for label in (event_types or EVENT_NODE_LABELS) if label in EVENT_NODE_LABELS]
+        conditions = ["e.timestamp IS NOT NULL"]
+        params = {"limit": page_size}
+        if start:
+            conditions.append("e.timestamp >= datetime($start)")
+            params["start"] = start
+        if end:
+            conditions.append("e.timestamp < datetime($end)")
+            params["end"] = end
+        if username:
+            conditions.append("e.username = $username")
+            params["username"] = username
+        if language:
+            conditions.append("e.language = $language")
+            params["language"] = language
+        if cursor:
+            # The plain range bound keeps the seek on the timestamp index; the OR breaks timestamp ties by id
+            conditions.append("e.timestamp <= datetime($cursor_timestamp)")
+            conditions.append("(e.timestamp < datetime($cursor_timestamp) OR e.id < $cursor_id)")
+            params["cursor_timestamp"] = cursor["timestamp"]
+            params["cursor_id"] = cursor["id"]
+        projection = "properties(e)" if include_payload else "e {" + ", ".join(f".{prop}" for prop in EVENT_SUMMARY_PROPERTIES) + "}"
+        events = []
         with self.driver.session() as session:
-            try:
-                query_create_chart_node = """
-                CREATE (c:ChartGeneration {
-                    id: $event_id,
-                    query: $user_query, # Changed parameter name to avoid conflict
-                    generated_code: $generated_code,
-                    data_preview: $data_preview,
-                    timestamp: datetime($timestamp),
-                    type: "ChartGeneration"
-                })
-                RETURN c.id
+            for label in labels:
+                query = f"""
+                MATCH (e:{_cypher_name(label)})
+                WHERE {" AND ".join(conditions)}
+                RETURN {projection} AS event
+                ORDER BY e.timestamp DESC, e.id DESC
+                LIMIT $limit
                 """
-                # FIX: Correctly pass the query string as the first argument, and then the parameters as keyword arguments.
-                session.write_transaction(lambda tx: tx.run(query_create_chart_node,
-                                                        event_id=event_id,
-                                                        user_query=query, # Pass value to new parameter name
-                                                        generated_code=generated_code,
-                                                        data_preview=data_preview,
-                                                        timestamp=timestamp).single()[0])
-                print(f"Chart generation event {event_id} stored successfully in Neo4j.")
-                return True
-            except Exception as e:
-                print(f"Error storing chart generation data in Neo4j: {e}")
-                return False
+                for record in session.run(query, **params):
+                    event = dict(record["event"])
+                    event["event_type"] = label
+                    events.append(event)
+        events.sort(key=lambda event: (event["timestamp"], event["id"]), reverse=True)
+        events = events[:page_size]
+        for event in events:
+            for key, value in event.items():
+                event[key] = _to_iso(value)
+        if include_payload:
+            self._attach_blob_payloads(events)
+        next_cursor = {"timestamp": events[-1]["timestamp"], "id": events[-1]["id"]} if len(events) == page_size else None
+        return events, next_cursor
 
-    def store_document_query_event(self, event_id: str, query: str, answer: str, document_name: str, extracted_text_preview: str, timestamp: str) -> bool:
+    def get_blob_texts(self, sha256s: list) -> dict:
+        """Returns {sha256: text} for the given content blobs (one round trip)."""
+        sha256s = [sha for sha in set(sha256s) if sha]
+        if not self.driver or not sha256s:
+            return {}
+        texts = {}
+        with self.driver.session() as session:
+            result = session.run(
+                f"MATCH (b:{BLOB_LABEL}) WHERE b.sha256 IN $sha256s "
+                "RETURN b.sha256 AS sha256, b.payload AS payload, b.encoding AS encoding, b.location AS location", # location: Blobs written before paths were derived
+                sha256s=sha256s
+            )
+            for record in result:
+                texts[record["sha256"]] = decode_blob(record["sha256"], record["payload"], record["encoding"], record["location"])
+        return texts
+
+    def _attach_blob_payloads(self, events: list):
+        """Fills each event's blob-backed fields (e.g. generated_code) from its '<field>_sha256' references."""
+        references = [(event, key[:-len("_sha256")], value) for event in events for key, value in event.items() if key.endswith("_sha256") and value]
+        texts = self.get_blob_texts([sha for _, _, sha in references])
+        for event, field, sha in references:
+            event[field] = texts.get(sha)
+
+    def iter_events(self, event_types: list = None, start: str = None, end: str = None, username: str = None,
+                    language: str = None, page_size: int = DEFAULT_EVENT_PAGE_SIZE, include_payload: bool = False, limit: int = None):
+        """Generator over stored events (newest first), fetched page by page via get_events_page()."""
+        cursor = None
+        yielded = 0
+        while True:
+            events, cursor = self.get_events_page(event_types, start, end, username, language, cursor, page_size, include_payload)
+            for event in events:
+                yield event
+                yielded += 1
+                if limit is not None and yielded >= limit:
+                    return
+            if cursor is None:
+                return
+
+    def get_event_lineage(self, event_id: str, event_type: str = "CodeGeneration") -> dict:
+        """Returns the lineage linked to an event as flow_data ({"nodes": [...], "edges": [...]})."""
+        if not self.driver or event_type not in EVENT_NODE_LABELS:
+            return {"nodes": [], "edges": []}
+        query = f"""
+        MATCH (e:{_cypher_name(event_type)} {{id: $event_id}})-[:{"|".join(LINEAGE_LINK_REL_TYPES)}]->(n:{LINEAGE_NODE_LABEL})
+        WITH collect(n) AS lineage_nodes
+        UNWIND lineage_nodes AS n
+        OPTIONAL MATCH (n)-[r]->(m:{LINEAGE_NODE_LABEL})
+        WHERE m IN lineage_nodes
+        RETURN n.id AS id, n.label AS label, labels(n) AS labels,
+               collect(CASE WHEN m IS NULL THEN NULL ELSE {{target: m.id, rel_type: type(r), label: r.label}} END) AS edges
         """
-        Stores a document query event in Neo4j.
+        flow_data = {"nodes": [], "edges": []}
+        with self.driver.session() as session:
+            for record in session.run(query, event_id=event_id):
+                flow_data["nodes"].append({"id": record["id"], "label": record["label"], "type": _lineage_node_type(record["labels"])})
+                for edge in record["edges"]:
+                    flow_data["edges"].append({"source": record["id"], "target": edge["target"], "rel_type": edge["rel_type"], "label": edge["label"] or ""})
+        return flow_data
+
+    def iter_lineage(self, node_id: str, max_depth: int = 2, direction: str = "downstream", limit: int = DEFAULT_LINEAGE_RESULT_LIMIT):
+        """
+        Generator over lineage edges reachable from a lineage node within max_depth hops
+        ('downstream', 'upstream' or 'both'). Yields {"source", "target", "rel_type", "label",
+        "source_label", "target_label", "source_type", "target_type"} once per edge, at most `limit` edges.
         """
         if not self.driver:
-            print("Neo4j driver not initialized. Cannot store data.")
-            return False
+            return
+        max_depth = max(1, min(int(max_depth), MAX_LINEAGE_DEPTH))
+        pattern = {"downstream": f"-[*1..{max_depth}]->", "upstream": f"<-[*1..{max_depth}]-"}.get(direction, f"-[*1..{max_depth}]-")
+        query = f"""
+        MATCH path = (start:{LINEAGE_NODE_LABEL} {{id: $node_id}}){pattern}(:{LINEAGE_NODE_LABEL})
+        WHERE all(x IN nodes(path) WHERE x:{LINEAGE_NODE_LABEL})
+        UNWIND relationships(path) AS r
+        WITH DISTINCT r
+        LIMIT $limit
+        WITH r, startNode(r) AS s, endNode(r) AS t
+        RETURN s.id AS source, t.id AS target, type(r) AS rel_type, r.label AS label,
+               s.label AS source_label, t.label AS target_label, labels(s) AS source_labels, labels(t) AS target_labels
+        """
         with self.driver.session() as session:
-            try:
-                query_create_doc_node = """
-                CREATE (d:DocumentQuery {
-                    id: $event_id,
-                    query: $query,
-                    answer: $answer,
-                    document_name: $document_name,
-                    extracted_text_preview: $extracted_text_preview,
-                    timestamp: datetime($timestamp),
-                    type: "DocumentQuery"
-                })
-                RETURN d.id
-                """
-                session.write_transaction(lambda tx: tx.run(query_create_doc_node,
-                                                        event_id=event_id,
-                                                        query=query,
-                                                        answer=answer,
-                                                        document_name=document_name,
-                                                        extracted_text_preview=extracted_text_preview,
-                                                        timestamp=timestamp).single()[0])
-                print(f"Document query event {event_id} stored successfully in Neo4j.")
-                return True
-            except Exception as e:
-                print(f"Error storing document query data in Neo4j: {e}")
-                return False
+            for record in session.run(query, node_id=node_id, limit=int(limit)):
+                yield {
+                    "source": record["source"], "target": record["target"], "rel_type": record["rel_type"], "label": record["label"] or "",
+                    "source_label": record["source_label"], "target_label": record["target_label"],
+                    "source_type": _lineage_node_type(record["source_labels"]), "target_type": _lineage_node_type(record["target_labels"])
+                }
+
+    # --- Existing methods (kept for completeness) ---
+    def store_code_generation_with_lineage(self, generation_id: str, original_code_snippet: str, generated_code_snippet: str, timestamp: str, flow_data: dict = None, metrics: dict = None, username: str = None, language: str = None) -> bool:
+        """
+        Stores code generation event and its associated data lineage (nodes and edges) in Neo4j.
+        Optionally stores metrics.
+        """
+        stored = self._store_event("CodeGeneration", STORE_CODE_GENERATION_QUERY,
+                                   code_generation_params(generation_id, original_code_snippet, generated_code_snippet, timestamp, metrics, username, language),
+                                   "INVOLVED_IN_LINEAGE", flow_data)
+        if stored:
+            print(f"Code generation event {generation_id} and lineage stored successfully in Neo4j.")
+        return stored
+
+    def store_chart_event(self, event_id: str, query: str, generated_code: str, data_preview: str, timestamp: str, username: str = None, language: str = None) -> bool:
+        """
+        Stores a chart generation event in Neo4j.
+        """
+        stored = self._store_event("ChartGeneration", STORE_CHART_EVENT_QUERY, {
+            "event_id": event_id,
+            "user_query": query,
+            "generated_code": generated_code,
+            "data_preview": data_preview,
+            "timestamp": timestamp,
+            "username": username,
+            "language": language
+        })
+        if stored:
+            print(f"Chart generation event {event_id} stored successfully in Neo4j.")
+        return stored
 
-    def store_project_flow_event(self, event_id: str, description: str, generated_code: str, flow_data: dict, timestamp: str, diagram_type: str = "Mermaid (Flowchart)") -> bool:
+    def store_document_query_event(self, event_id: str, query: str, answer: str, document_name: str, extracted_text_preview: str, timestamp: str, username: str = None, language: str = None) -> bool:
+        """
+        Stores a document query event in Neo4j.
+        """
+        stored = self._store_event("DocumentQuery", STORE_DOCUMENT_QUERY_EVENT_QUERY, {
+            "event_id": event_id,
+            "query": query,
+            "answer": answer,
+            "document_name": document_name,
+            "extracted_text_preview": extracted_text_preview,
+            "timestamp": timestamp,
+            "username": username,
+            "language": language
+        })
+        if stored:
+            print(f"Document query event {event_id} stored successfully in Neo4j.")
+        return stored
+
+    def store_project_flow_event(self, event_id: str, description: str, generated_code: str, flow_data: dict, timestamp: str, diagram_type: str = "Mermaid (Flowchart)", username: str = None, language: str = None) -> bool:
         """
         Stores project flow diagram generation event and its associated conceptual flow (nodes and edges) in Neo4j.
         Now accepts generated_code and diagram_type for more flexibility.
         """
-        if not self.driver:
-            print("Neo4j driver not initialized. Cannot store data.")
-            return False
-        with self.driver.session() as session:
-            try:
-                # Create ProjectFlowDiagram node
-                query_create_flow_node = """
-                CREATE (p:ProjectFlowDiagram {
-                    id: $event_id,
-                    description: $description,
-                    generated_diagram_code: $generated_code,
-                    diagram_type: $diagram_type,
-                    timestamp: datetime($timestamp),
-                    type: "ProjectFlowDiagram"
-                })
-                RETURN p.id
-                """
-                session.write_transaction(lambda tx: tx.run(query_create_flow_node,
-                                                        event_id=event_id,
-                                                        description=description,
-                                                        generated_code=generated_code,
-                                                        diagram_type=diagram_type,
-                                                        timestamp=timestamp).single()[0])
-                # Store data lineage details and link to ProjectFlowDiagram event
-                # Only link nodes/edges if flow_data is meaningful (e.g., from Mermaid Flowchart analysis)
-                if flow_data and (flow_data.get("nodes") or flow_data.get("edges")):
-                    def _process_lineage_tx(tx):
-                        node_ids_involved = set()
-                        # Create nodes
-                        for node_data in flow_data.get("nodes", []):
-                            node_id = node_data.get("id")
-                            label = node_data.get("label", node_id)
-                            node_type = node_data.get("type", "GenericNode") # Default node type
-                            if node_id:
-                                self._create_node_if_not_exists(tx, node_id, label, node_type)
-                                node_ids_involved.add(node_id)
-                        # Create relationships
-                        for edge_data in flow_data.get("edges", []):
-                            source_id = edge_data.get("source")
-                            target_id = edge_data.get("target")
-                            rel_type = edge_data.get("rel_type", "FLOWS_TO") # Default rel type
-                            rel_label = edge_data.get("label", "")
-                            if source_id and target_id:
-                                self._create_relationship_if_not_exists(tx, source_id, target_id, rel_type, rel_label)
-                                node_ids_involved.add(source_id)
-                                node_ids_involved.add(target_id)
-                        # Link the ProjectFlowDiagram event to all nodes involved in this lineage
-                        query_link_flow_to_nodes = """
-                        MATCH (p:ProjectFlowDiagram {id: $event_id})
-                        WITH p
-                        UNWIND $node_ids AS node_id
-                        MATCH (n) WHERE n.id = node_id
-                        MERGE (p)-[:INVOLVED_IN_FLOW]->(n)
-                        RETURN p
-                        """
-                        if node_ids_involved:
-                            tx.run(query_link_flow_to_nodes, event_id=event_id, node_ids=list(node_ids_involved))
-                    session.write_transaction(_process_lineage_tx)
-                print(f"Project flow diagram event {event_id} and lineage stored successfully in Neo4j.")
-                return True
-            except Exception as e:
-                print(f"Error storing project flow diagram data in Neo4j: {e}")
-                return False
+        # Only link nodes/edges if flow_data is meaningful (e.g., from Mermaid Flowchart analysis)
+        stored = self._store_event("ProjectFlowDiagram", STORE_PROJECT_FLOW_EVENT_QUERY, {
+            "event_id": event_id,
+            "description": description,
+            "generated_code": generated_code,
+            "diagram_type": diagram_type,
+            "timestamp": timestamp,
+            "username": username,
+            "language": language
+        }, "INVOLVED_IN_FLOW", flow_data)
+        if stored:
+            print(f"Project flow diagram event {event_id} and lineage stored successfully in Neo4j.")
+        return stored
 
-    def store_wireframe_event(self, event_id: str, description: str, generated_mukuro_code: str, timestamp: str) -> bool:
+    def store_wireframe_event(self, event_id: str, description: str, generated_mukuro_code: str, timestamp: str, username: str = None, language: str = None) -> bool:
         """
         Stores a wireframe generation event in Neo4j.
         """
-        if not self.driver:
-            print("Neo4j driver not initialized. Cannot store data.")
-            return False
-        with self.driver.session() as session:
-            try:
-                query = """
-                CREATE (w:WireframeGeneration {
-                    id: $event_id,
-                    description: $description,
-                    generated_mukuro_code: $generated_mukuro_code,
-                    timestamp: datetime($timestamp),
-                    type: "WireframeGeneration"
-                })
-                RETURN w.id
-                """
-                session.write_transaction(lambda tx: tx.run(query,
-                                                        event_id=event_id,
-                                                        description=description,
-                                                        generated_mukuro_code=generated_mukuro_code,
-                                                        timestamp=timestamp).single()[0])
-                print(f"Wireframe generation event {event_id} stored successfully in Neo4j.")
-                return True
-            except Exception as e:
-                print(f"Error storing wireframe generation data in Neo4j: {e}")
-                return False
\ No newline at end of file
+        stored = self._store_event("WireframeGeneration", STORE_WIREFRAME_EVENT_QUERY, {
+            "event_id": event_id,
+            "description": description,
+            "generated_mukuro_code": generated_mukuro_code,
+            "timestamp": timestamp,
+            "username": username,
+            "language": language
+        })
+        if stored:
+            print(f"Wireframe generation event {event_id} stored successfully in Neo4j.")
+        return stored
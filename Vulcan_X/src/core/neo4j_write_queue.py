@@ -0,0 +1,228 @@
+# src/core/neo4j_write_queue.py
+import atexit
+import inspect
+import json
+import os
+import queue
+import threading
+import time
+from core.neo4j_handler import Neo4jHandler, get_neo4j_driver, get_neo4j_handler, is_neo4j_connection_error, reset_neo4j_driver
+from core.bulk_import import prepare_event, write_events_tx
+
+# Write-behind persistence for Neo4j events. Pages submit store_* calls and return immediately;
+# a background thread drains the queue in batches (up to NEO4J_WRITE_BATCH_SIZE events, or
+# whatever arrived within NEO4J_WRITE_FLUSH_INTERVAL_SECONDS). A batch is written as one transaction
+# through the bulk-import path (events MERGEd on id, so retries are idempotent); if it fails for a
+# reason other than the connection, its events are retried one transaction each to isolate the bad one.
+# Events that can't be written because Neo4j is down are appended to a local spill log (one JSON event
+# per line) and replayed once the database is reachable again. Outages never count as a failed attempt;
+# only events whose own write fails are dropped, after NEO4J_WRITE_MAX_ATTEMPTS tries.
+# The spill log path is resolved to an absolute path at import, so it doesn't follow the working directory.
+NEO4J_WRITE_BATCH_SIZE = int(os.getenv("NEO4J_WRITE_BATCH_SIZE", "50"))
+NEO4J_WRITE_FLUSH_INTERVAL_SECONDS = float(os.getenv("NEO4J_WRITE_FLUSH_INTERVAL_SECONDS", "1.0"))
+NEO4J_WRITE_MAX_ATTEMPTS = int(os.getenv("NEO4J_WRITE_MAX_ATTEMPTS", "5"))
+NEO4J_SPILL_REPLAY_INTERVAL_SECONDS = float(os.getenv("NEO4J_SPILL_REPLAY_INTERVAL_SECONDS", "30"))
+DEFAULT_NEO4J_SPILL_PATH = os.path.abspath(os.path.expanduser(os.getenv("NEO4J_SPILL_PATH", "~/.vulcanus/neo4j_spill.jsonl")))
+QUEUEABLE_METHODS = { # Neo4jHandler store method -> event label (see core.bulk_import.EVENT_SPECS)
+    "store_code_generation_with_lineage": "CodeGeneration",
+    "store_chart_event": "ChartGeneration",
+    "store_document_query_event": "DocumentQuery",
+    "store_project_flow_event": "ProjectFlowDiagram",
+    "store_wireframe_event": "WireframeGeneration"
+}
+
+_write_queue = None
+_write_queue_lock = threading.Lock()
+
+class Neo4jWriteQueue:
+    """Background writer that persists Neo4jHandler store_* calls off the Streamlit script thread."""
+    def __init__(self, spill_path: str = DEFAULT_NEO4J_SPILL_PATH, batch_size: int = NEO4J_WRITE_BATCH_SIZE,
+                 flush_interval: float = NEO4J_WRITE_FLUSH_INTERVAL_SECONDS, max_attempts: int = NEO4J_WRITE_MAX_ATTEMPTS):
+        self.spill_path = spill_path
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = max(0.05, flush_interval)
+        self.max_attempts = max(1, max_attempts)
+        self._queue = queue.Queue()
+        self._spill_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._last_replay = 0.0 # time.monotonic() of the last spill replay
+        self._thread = threading.Thread(target=self._run, name="neo4j-write-behind", daemon=True)
+        self._thread.start()
+
+    def submit(self, method_name: str, *args, **kwargs) -> bool:
+        """
+        Queues a Neo4jHandler store_* call (e.g. submit("store_chart_event", event_id, ...)).
+        Returns True once the event is accepted; it is written asynchronously.
+        """
+        if method_name not in QUEUEABLE_METHODS:
+            print(f"Neo4j write queue: '{method_name}' is not a queueable store method.")
+            return False
+        if self._stop_event.is_set():
+            # Shutting down: don't lose the event, put it straight into the spill log
+            self._spill([{"method": method_name, "args": list(args), "kwargs": kwargs, "attempts": 0}])
+            return True
+        self._queue.put({"method": method_name, "args": list(args), "kwargs": kwargs, "attempts": 0})
+        return True
+
+    @property
+    def pending_count(self) -> int:
+        """Approximate number of events waiting in memory (excludes the spill log)."""
+        return self._queue.qsize()
+
+    def _next_batch(self) -> list:
+        """Blocks up to flush_interval for the first event, then drains up to batch_size events."""
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            batch = self._next_batch()
+            if batch:
+                self._write_batch(batch)
+            self._replay_spill()
+
+    def _record_failure(self, event: dict, error, failed: list):
+        """Counts a failed write of the event itself; keeps it for a retry until max_attempts."""
+        event["attempts"] = event.get("attempts", 0) + 1
+        if event["attempts"] < self.max_attempts:
+            failed.append(event)
+        else:
+            print(f"Neo4j write queue: dropping {event['method']} after {event['attempts']} failed attempts ({error}).")
+
+    @staticmethod
+    def _prepare(event: dict):
+        """Turns a queued store_* call into a prepared bulk-import event (None if it can't be imported)."""
+        arguments = inspect.signature(getattr(Neo4jHandler, event["method"])).bind(None, *event["args"], **event["kwargs"])
+        arguments.apply_defaults()
+        record = {name: value for name, value in arguments.arguments.items() if name != "self"}
+        record["event_type"] = QUEUEABLE_METHODS[event["method"]]
+        return prepare_event(record)
+
+    def _write_batch(self, batch: list):
+        """Writes a batch in one transaction; on outage everything is spilled, on other errors events are retried singly."""
+        driver = get_neo4j_driver()
+        if driver is None:
+            self._spill(batch)
+            return
+        get_neo4j_handler() # Schema/admin bootstrap before the first write
+        failed = []
+        prepared = []
+        for event in batch:
+            try:
+                prepared_event = self._prepare(event)
+            except Exception as e:
+                self._record_failure(event, e, failed)
+                continue
+            if prepared_event is None:
+                print(f"Neo4j write queue: dropping {event['method']} with unusable arguments.")
+                continue
+            prepared.append((event, prepared_event))
+        try:
+            with driver.session() as session:
+                if prepared:
+                    session.execute_write(write_events_tx, [prepared_event for _, prepared_event in prepared])
+                prepared = []
+        except Exception as e:
+            if is_neo4j_connection_error(e):
+                # Neo4j is down: keep everything for replay without counting an attempt
+                reset_neo4j_driver(driver)
+                self._spill(failed + [event for event, _ in prepared])
+                return
+            print(f"Neo4j write queue: batch write failed ({e}); retrying events one by one.")
+        for index, (event, prepared_event) in enumerate(prepared):
+            try:
+                with driver.session() as session:
+                    session.execute_write(write_events_tx, [prepared_event])
+            except Exception as e:
+                if is_neo4j_connection_error(e):
+                    reset_neo4j_driver(driver)
+                    failed.extend(remaining for remaining, _ in prepared[index:])
+                    break
+                print(f"Neo4j write queue: error writing {event['method']}: {e}")
+                self._record_failure(event, e, failed)
+        if failed:
+            self._spill(failed)
+
+    def _spill(self, events: list):
+        """Appends events to the spill log (append-only, one JSON event per line, fsynced)."""
+        with self._spill_lock:
+            try:
+                os.makedirs(os.path.dirname(self.spill_path) or ".", exist_ok=True)
+                with open(self.spill_path, "a", encoding="utf-8") as f:
+                    for event in events:
+                        f.write(json.dumps(event, default=str) + "\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+                print(f"Neo4j write queue: spilled {len(events)} event(s) to {self.spill_path}.")
+            except OSError as e:
+                print(f"Neo4j write queue: could not write spill log {self.spill_path}: {e}")
+
+    def _replay_spill(self):
+        """Replays spilled events once Neo4j is reachable; events that fail again are re-spilled."""
+        if time.monotonic() - self._last_replay < NEO4J_SPILL_REPLAY_INTERVAL_SECONDS:
+            return
+        replay_path = f"{self.spill_path}.replaying"
+        if not (os.path.exists(self.spill_path) or os.path.exists(replay_path)) or get_neo4j_driver() is None:
+            return
+        self._last_replay = time.monotonic()
+        with self._spill_lock:
+            # A previous replay may have been interrupted; finish that one first
+            if not os.path.exists(replay_path):
+                try:
+                    os.replace(self.spill_path, replay_path)
+                except OSError as e:
+                    print(f"Neo4j write queue: could not rotate spill log {self.spill_path}: {e}")
+                    return
+        events = []
+        with open(replay_path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    events.append(json.loads(line))
+                except json.JSONDecodeError:
+                    print("Neo4j write queue: skipping corrupt spill log entry.")
+        print(f"Neo4j write queue: replaying {len(events)} spilled event(s).")
+        for start in range(0, len(events), self.batch_size):
+            self._write_batch(events[start:start + self.batch_size])
+        os.remove(replay_path)
+
+    def stop(self, timeout: float = 10.0):
+        """
+        Stops the background thread; queued events are written or spilled, never dropped. If the
+        thread is still busy writing after `timeout`, the rest is spilled rather than written
+        concurrently with it (the spill log is replayed on the next start).
+        """
+        self._stop_event.set()
+        self._thread.join(timeout=timeout)
+        remaining = []
+        while True:
+            try:
+                remaining.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if not remaining:
+            return
+        if self._thread.is_alive():
+            self._spill(remaining)
+        else:
+            self._write_batch(remaining)
+
+def get_neo4j_write_queue() -> Neo4jWriteQueue:
+    """Returns the process-wide write-behind queue, starting its background thread on first use."""
+    global _write_queue
+    if _write_queue is None:
+        with _write_queue_lock:
+            if _write_queue is None:
+                _write_queue = Neo4jWriteQueue()
+                atexit.register(_write_queue.stop)
+    return _write_queue
@@ -0,0 +1,191 @@
+# src/core/schema_inference.py
+import math
+import os
+import re
+import polars as pl
+from core.data_profiler import get_dataset_profile
+from core.frame_cache import LRUCache
+
+# Local primary/foreign key inference across the uploaded datasets, rendered as a Mermaid erDiagram.
+# Primary keys: integer/string columns without nulls whose values are all distinct (screened with the
+# cached profile's HyperLogLog estimate, then confirmed exactly). Foreign keys: key-like columns whose
+# distinct values are (almost) all contained in another dataset's primary key. Containment is measured
+# on sets of 64-bit value hashes; when columns have more than ER_KEY_SAMPLE_SIZE distinct values,
+# both sides keep only hashes divisible by the same modulus, a consistent sample of the value space.
+# The result is deterministic and needs no LLM; the LLM is only used optionally to polish names.
+ER_MIN_CONTAINMENT = float(os.getenv("ER_MIN_CONTAINMENT", "0.95"))
+ER_KEY_SAMPLE_SIZE = int(os.getenv("ER_KEY_SAMPLE_SIZE", "200000"))
+ER_CACHE_ENTRIES = 16
+KEY_NAME_PATTERN = re.compile(r"(^|[_\s-])(id|key|code|no|num|number|ref)$", re.IGNORECASE) # order_id, Customer ID, sku_code
+CAMEL_KEY_NAME_PATTERN = re.compile(r"[a-z](Id|ID|Key|Code)$") # customerId, ProductID
+GENERIC_KEY_NAMES = {"id", "key", "code", "no", "num", "number", "ref"} # Equal names like these say nothing about a relationship
+HASH_SEED = 0
+
+_inferred_diagrams = LRUCache(ER_CACHE_ENTRIES)
+
+def _key_kind(dtype) -> str | None:
+    """Key columns are compared as Int64 or as strings; other dtypes can't be keys."""
+    if dtype.is_integer():
+        return "int"
+    if dtype == pl.String or dtype == pl.Categorical:
+        return "string"
+    return None
+
+def _key_expr(name: str, kind: str) -> pl.Expr:
+    column = pl.col(name)
+    return column.cast(pl.Int64) if kind == "int" else column.cast(pl.String)
+
+def _mermaid_name(name: str) -> str:
+    return re.sub(r"\W+", "_", name).strip("_") or "col"
+
+def table_entity_name(dataset_name: str) -> str:
+    """'monthly-orders.csv' -> 'MONTHLY_ORDERS'."""
+    return _mermaid_name(os.path.splitext(dataset_name)[0]).upper()
+
+def _mermaid_type(dtype) -> str:
+    if dtype.is_integer():
+        return "int"
+    if dtype.is_float():
+        return "float"
+    if dtype == pl.Boolean:
+        return "bool"
+    if dtype == pl.Date:
+        return "date"
+    if dtype.is_temporal():
+        return "datetime"
+    if dtype == pl.String or dtype == pl.Categorical:
+        return "string"
+    return _mermaid_name(str(dtype)).lower()
+
+def _singular(word: str) -> str:
+    word = word.lower()
+    if word.endswith("ies"):
+        return word[:-3] + "y"
+    if word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+def _table_keys(version: str, frame) -> dict:
+    """Schema, row count, key-like columns and confirmed unique (primary key) columns of one dataset."""
+    profile = get_dataset_profile(version, frame)
+    rows = profile["rows"]
+    schema = frame.lazy().collect_schema()
+    key_columns = {}
+    pk_candidates = []
+    for column in profile["columns"]:
+        kind = _key_kind(schema[column["name"]])
+        if kind is None or not column["distinct"] or column["distinct"] < 2:
+            continue
+        key_columns[column["name"]] = {"kind": kind, "distinct": column["distinct"], "nulls": column["nulls"]}
+        if column["nulls"] == 0 and rows and column["distinct"] >= 0.95 * rows: # HLL estimate is within a few %
+            pk_candidates.append(column["name"])
+    unique_columns = set()
+    if pk_candidates and rows:
+        exact = frame.lazy().select([pl.col(name).n_unique().alias(name) for name in pk_candidates]).collect().row(0, named=True)
+        unique_columns = {name for name in pk_candidates if exact[name] == rows}
+    return {"schema": schema, "rows": rows, "key_columns": key_columns, "unique_columns": unique_columns}
+
+def _value_hashes(frame, name: str, kind: str, modulus: int) -> set:
+    """Hashes of a column's distinct values, keeping only those divisible by `modulus` (the shared sample)."""
+    # Hash once in a select and filter the resulting column: filtering an expression by a mask built
+    # from a second evaluation of unique() misaligns rows, since unique() doesn't preserve order
+    hashes = frame.lazy().select(_key_expr(name, kind).drop_nulls().unique().hash(seed=HASH_SEED).alias("h"))
+    if modulus > 1:
+        hashes = hashes.filter(pl.col("h") % modulus == 0)
+    return set(hashes.collect()["h"].to_list())
+
+def _is_key_like(name: str) -> bool:
+    return bool(KEY_NAME_PATTERN.search(name) or CAMEL_KEY_NAME_PATTERN.search(name))
+
+def _choose_primary_key(table: dict) -> str | None:
+    """Prefers an 'id'-like unique column, then any unique column, in column order."""
+    unique = [name for name in table["schema"].names() if name in table["unique_columns"]]
+    named = [name for name in unique if _is_key_like(name)]
+    return (named or unique or [None])[0]
+
+def infer_relationships(datasets: dict) -> dict:
+    """
+    datasets: {dataset name: (version, DataFrame/LazyFrame)}. Returns
+    {"tables": {name: {"schema", "rows", "primary_key", "unique_columns", ...}},
+     "relationships": [{"parent", "parent_column", "child", "child_column", "containment", "child_unique", "child_nullable"}]}.
+    """
+    tables = {name: _table_keys(version, frame) for name, (version, frame) in datasets.items()}
+    for table in tables.values():
+        table["primary_key"] = _choose_primary_key(table)
+    parents = [(name, table["primary_key"], table["key_columns"][table["primary_key"]]["kind"])
+               for name, table in tables.items() if table["primary_key"]]
+    parent_key_names = {pk.lower() for _, pk, _ in parents}
+
+    # Child columns worth testing: key-like names, or the name of some dataset's primary key
+    candidates = []
+    for name, table in tables.items():
+        for column, info in table["key_columns"].items():
+            if _is_key_like(column) or column.lower() in parent_key_names:
+                candidates.append((name, column, info))
+    max_distinct = max([info["distinct"] for _, _, info in candidates] + [1])
+    modulus = max(1, math.ceil(max_distinct / max(1, ER_KEY_SAMPLE_SIZE)))
+
+    hash_cache = {}
+    def hashes_of(name, column, kind):
+        if (name, column) not in hash_cache:
+            hash_cache[(name, column)] = _value_hashes(datasets[name][1], column, kind, modulus)
+        return hash_cache[(name, column)]
+
+    relationships = []
+    for child, column, info in candidates:
+        child_table = tables[child]
+        child_unique = column in child_table["unique_columns"]
+        best = None
+        for parent, parent_key, parent_kind in parents:
+            if parent == child or parent_kind != info["kind"]:
+                continue
+            same_name = column.lower() == parent_key.lower() and column.lower() not in GENERIC_KEY_NAMES
+            name_match = same_name or _singular(table_entity_name(parent)) in column.lower()
+            # Two unrelated tables both numbered 1..N would look "contained"; require a name hint for unique child columns
+            if child_unique and not name_match:
+                continue
+            child_hashes = hashes_of(child, column, info["kind"])
+            if not child_hashes:
+                continue
+            containment = len(child_hashes & hashes_of(parent, parent_key, parent_kind)) / len(child_hashes)
+            if containment < ER_MIN_CONTAINMENT:
+                continue
+            score = (name_match, containment)
+            if best is None or score > best[0]:
+                best = (score, parent, parent_key, containment)
+        if best is not None:
+            _, parent, parent_key, containment = best
+            if child_unique and column == child_table["primary_key"] and tables[parent]["rows"] < child_table["rows"]:
+                continue # The larger table's PK can't reference a smaller table one-to-one
+            relationships.append({
+                "parent": parent, "parent_column": parent_key, "child": child, "child_column": column,
+                "containment": round(containment, 4), "child_unique": child_unique, "child_nullable": info["nulls"] > 0
+            })
+    return {"tables": tables, "relationships": relationships}
+
+def relationships_to_mermaid(inferred: dict) -> str:
+    """Renders inferred tables/keys as a Mermaid erDiagram (PK/FK markers, one line per relationship)."""
+    tables = inferred["tables"]
+    foreign_keys = {(rel["child"], rel["child_column"]) for rel in inferred["relationships"]}
+    lines = ["erDiagram"]
+    for name, table in tables.items():
+        lines.append(f"    {table_entity_name(name)} {{")
+        for column, dtype in table["schema"].items():
+            markers = []
+            if column == table["primary_key"]:
+                markers.append("PK")
+            if (name, column) in foreign_keys:
+                markers.append("FK")
+            marker = (" " + ", ".join(markers)) if markers else ""
+            lines.append(f"        {_mermaid_type(dtype)} {_mermaid_name(column)}{marker}")
+        lines.append("    }")
+    for rel in inferred["relationships"]:
+        parent_side = "|o" if rel["child_nullable"] else "||"
+        child_side = "o|" if rel["child_unique"] else "o{"
+        lines.append(f'    {table_entity_name(rel["parent"])} {parent_side}--{child_side} {table_entity_name(rel["child"])} : "{rel["child_column"]}"')
+    return "\n".join(lines)
+
+def infer_er_diagram(datasets: dict) -> str:
+    """Mermaid erDiagram for {dataset name: (version, frame)}, cached per set of dataset versions."""
+    key = tuple(sorted((name, version) for name, (version, _) in datasets.items()))
+    return _inferred_diagrams.get_or_create(key, lambda: relationships_to_mermaid(infer_relationships(datasets)))
@@ -7,7 +7,8 @@ import json
 from streamlit_code_diff import st_code_diff # Import streamlit-code-diff
 from core.agents import RagbitsCodeGenerationAgent
 from core.llm import get_ragbits_llm_client
-from core.neo4j_handler import Neo4jHandler
+from core.neo4j_handler import get_neo4j_handler
+from core.neo4j_write_queue import get_neo4j_write_queue # NEW: Write-behind persistence for save buttons
 from components.ui_styles import apply_custom_styles
 from core.ragbits_integration import get_confidence_score, get_effort_estimation, get_original_time_estimate, get_time_saved_estimate, _get_code_ast_lang_from_display_lang # Using _get_code_ast_lang_from_display_lang for metrics logic
 from datetime import datetime
@@ -109,9 +110,9 @@ st.markdown("---")
 # Initialize LLM client (once per session)
 if "ragbits_llm" not in st.session_state:
     st.session_state.ragbits_llm = get_ragbits_llm_client()
-# Initialize Neo4j Handler (once per session)
+# Neo4j Handler (process-wide, shares one driver/connection pool across all sessions)
 if "neo4j_handler" not in st.session_state:
-    st.session_state.neo4j_handler = Neo4jHandler()
+    st.session_state.neo4j_handler = get_neo4j_handler()
 
 # Initialize session state for code and agent
 if "original_code" not in st.session_state:
@@ -347,7 +348,8 @@ if st.button("Generate/Convert Code", key="generate_code_button"):
                     "generated_code": st.session_state.generated_code,
                     "timestamp": timestamp,
                     "flow_data": flow_data_for_neo4j,
-                    "metrics": st.session_state.code_gen_metrics # Store metrics with generation details
+                    "metrics": st.session_state.code_gen_metrics, # Store metrics with generation details
+                    "language": metrics_and_diff_lang # Language of the generated code (history filter)
                 }
                 st.info("Code generated. Click 'Save Code Generation to Neo4j' to persist this event.")
 
@@ -522,20 +524,22 @@ if st.session_state.code_gen_metrics["confidence"] > 0 or st.session_state.gener
 
 if st.session_state.last_code_generation_details:
     if st.button("Save Code Generation to Neo4j", key="save_code_gen_neo4j_button"):
-        with st.spinner("Saving code generation event to Neo4j..."):
-            details = st.session_state.last_code_generation_details
-            if st.session_state.neo4j_handler.store_code_generation_with_lineage(
-                details["generation_id"],
-                details["original_code"],
-                details["generated_code"],
-                details["timestamp"],
-                details["flow_data"],
-                details["metrics"] # Pass metrics to Neo4j handler
-            ):
-                st.success("Code generation event saved to Neo4j!")
-            else:
-                st.error("Failed to save code generation event to Neo4j.")
-            st.session_state.last_code_generation_details = None # Clear after saving or attempting
+        details = st.session_state.last_code_generation_details
+        if get_neo4j_write_queue().submit(
+            "store_code_generation_with_lineage",
+            details["generation_id"],
+            details["original_code"],
+            details["generated_code"],
+            details["timestamp"],
+            details["flow_data"],
+            details["metrics"], # Pass metrics to Neo4j handler
+            username=st.session_state.get("username"),
+            language=details.get("language")
+        ):
+            st.success("Code generation event queued for saving to Neo4j!")
+        else:
+            st.error("Failed to queue code generation event for Neo4j.")
+        st.session_state.last_code_generation_details = None # Clear after saving or attempting
 
 # NEW: Code Difference Analysis Section (using streamlit-code-diff)
 st.markdown("---")
@@ -1,6 +1,5 @@
 # pages/2_Data_Analysis.py
 import streamlit as st
-import pandas as pd
 from streamlit_echarts5 import st_echarts # CHANGED: Import st_echarts
 import uuid
 import json
@@ -9,10 +8,18 @@ import re # Import re for regex operations in generated code
 import numpy as np # Import numpy
 import warnings # Import warnings module
 import polars as pl # NEW: Import polars
-from core.data_handler import load_data_from_upload, extract_text_from_document
-from core.llm import generate_chart_code_with_ragbits, get_ragbits_llm_client, generate_er_diagram_code, generate_er_diagram_for_multiple_dfs, suggest_data_transformations_prompt, generate_transformation_code_prompt
+from core.data_handler import (
+    load_cached_data_from_upload, load_cached_data_from_uploads, extract_text_from_document,
+    columns_referenced_in_code, code_references_name, dataset_variable_name
+)
+from core.frame_cache import get_pandas_head, get_cached_chart_options, materialize_head # Pandas previews/chart results cached per dataset version
+from core.data_profiler import get_dataset_profile, format_profile_for_prompt # Cached column statistics for prompts
+from core.schema_inference import infer_er_diagram # Local primary/foreign key inference for multi-file ER diagrams
+from core.code_sandbox import SandboxFrameResult, execute_chart_code, execute_transformation_code, execute_lazy_transformation_code # Generated code runs in limited worker processes
+from core.llm import generate_chart_code_with_ragbits, get_ragbits_llm_client, generate_er_diagram_code, generate_er_diagram_for_multiple_dfs, suggest_data_transformations_prompt, generate_transformation_code_prompt, generate_lazy_transformation_code_prompt
 from core.ragbits_integration import get_confidence_score, get_effort_estimation # Metrics are mock/heuristic here, not directly tied to AST
-from core.neo4j_handler import Neo4jHandler
+from core.neo4j_handler import get_neo4j_handler
+from core.neo4j_write_queue import get_neo4j_write_queue # NEW: Write-behind persistence for save buttons
 from datetime import datetime
 from components.streamlit_diagram import StreamlitDiagramRenderer
 import asyncio
@@ -38,9 +45,9 @@ if not st.session_state.authenticated:
 st.header("Data Analysis & Charting")
 st.markdown("---")
 
-# Initialize Neo4j Handler (once per session)
+# Neo4j Handler (process-wide, shares one driver/connection pool across all sessions)
 if "neo4j_handler_da" not in st.session_state:
-    st.session_state.neo4j_handler_da = Neo4jHandler()
+    st.session_state.neo4j_handler_da = get_neo4j_handler()
 # Initialize LLM client (once per session)
 if "ragbits_llm_da" not in st.session_state:
     st.session_state.ragbits_llm_da = get_ragbits_llm_client()
@@ -51,11 +58,13 @@ if "diagram_renderer_da" not in st.session_state:
 # Initialize session state variables
 if "uploaded_files_info" not in st.session_state: # Stores (filename, size) tuples
     st.session_state.uploaded_files_info = []
-if "uploaded_dfs" not in st.session_state: # Stores {'filename': df} -- now stores Polars DFs
+if "uploaded_dfs" not in st.session_state: # Stores {'filename': DatasetHandle} -- handles into the shared dataset cache, not the data
     st.session_state.uploaded_dfs = {}
+if "upload_errors" not in st.session_state: # {'filename': error message} for uploads that failed to load
+    st.session_state.upload_errors = {}
 if "selected_df_name" not in st.session_state:
     st.session_state.selected_df_name = None
-if "df" not in st.session_state: # Current selected/active DataFrame -- now stores Polars DF
+if "df" not in st.session_state: # Current selected/active DataFrame -- Polars LazyFrame over the memory-mapped cache file
     st.session_state.df = None
 if "generated_chart_code" not in st.session_state:
     st.session_state.generated_chart_code = ""
@@ -78,16 +87,23 @@ if "suggested_transformations" not in st.session_state:
 if "transformation_code" not in st.session_state:
     st.session_state.transformation_code = ""
 if "transformation_applied_df" not in st.session_state:
-    st.session_state.transformation_applied_df = None
+    st.session_state.transformation_applied_df = None # SandboxFrameResult: the transformed frame stays in the sandbox's IPC file
 if "transformation_original_df_preview" not in st.session_state:
     st.session_state.transformation_original_df_preview = None # Store preview of DF BEFORE transformation
 if "transformation_details" not in st.session_state:
     st.session_state.transformation_details = None
 
-st.subheader("1. Upload Your Data (CSV or XLSX)")
+def replace_transformation_result(result: SandboxFrameResult = None):
+    """Swaps the session's transformed frame, deleting the previous one's result file."""
+    previous = st.session_state.transformation_applied_df
+    st.session_state.transformation_applied_df = result
+    if previous is not None and previous is not result:
+        previous.release()
+
+st.subheader("1. Upload Your Data (CSV, XLSX or Parquet)")
 uploaded_files = st.file_uploader(
-    "Choose CSV or XLSX files (multiple files can be uploaded)",
-    type=["csv", "xlsx"],
+    "Choose CSV, XLSX or Parquet files (multiple files can be uploaded)",
+    type=["csv", "xlsx", "parquet"],
     accept_multiple_files=True,
     key="data_uploader_multiple"
 )
@@ -98,6 +114,7 @@ if uploaded_files:
     if current_files_info != st.session_state.uploaded_files_info:
         st.session_state.uploaded_files_info = current_files_info
         st.session_state.uploaded_dfs = {}
+        st.session_state.upload_errors = {}
         st.session_state.selected_df_name = None
         st.session_state.df = None # Reset current DF selection
         st.session_state.generated_chart_code = ""
@@ -108,26 +125,31 @@ if uploaded_files:
         st.session_state.multi_df_er_mermaid_code = ""
         st.session_state.suggested_transformations = ""
         st.session_state.transformation_code = ""
-        st.session_state.transformation_applied_df = None
+        replace_transformation_result()
         st.session_state.transformation_original_df_preview = None
         st.session_state.transformation_details = None
         
         with st.spinner("Loading uploaded dataframes..."):
-            for uploaded_file in uploaded_files:
-                df_loaded = load_data_from_upload(uploaded_file) # This now returns Polars DF
-                if df_loaded is not None:
-                    st.session_state.uploaded_dfs[uploaded_file.name] = df_loaded
+            # Files are ingested concurrently into DatasetHandles (parsed once, shared across sessions)
+            load_progress = st.progress(0.0, text=f"Loading {len(uploaded_files)} files...")
+            def report_load_progress(name, done, total, error):
+                status = "failed" if error else "loaded"
+                load_progress.progress(done / total, text=f"{done}/{total} files processed ('{name}' {status})")
+            loaded_handles, st.session_state.upload_errors = load_cached_data_from_uploads(uploaded_files, on_progress=report_load_progress)
+            for uploaded_file in uploaded_files: # Keep the upload order
+                if uploaded_file.name in loaded_handles:
+                    st.session_state.uploaded_dfs[uploaded_file.name] = loaded_handles[uploaded_file.name]
             if st.session_state.uploaded_dfs:
                 st.success(f"Successfully loaded {len(st.session_state.uploaded_dfs)} files.")
                 # Set the first uploaded file as the default selected DF
                 st.session_state.selected_df_name = list(st.session_state.uploaded_dfs.keys())[0]
-                st.session_state.df = st.session_state.uploaded_dfs[st.session_state.selected_df_name]
                 st.rerun() # Rerun to update selectbox and display
 else:
     # If file uploader is empty, clear all related session states
-    if st.session_state.uploaded_dfs:
+    if st.session_state.uploaded_dfs or st.session_state.upload_errors:
         st.session_state.uploaded_files_info = []
         st.session_state.uploaded_dfs = {}
+        st.session_state.upload_errors = {}
         st.session_state.selected_df_name = None
         st.session_state.df = None
         st.session_state.generated_chart_code = ""
@@ -138,12 +160,30 @@ else:
         st.session_state.multi_df_er_mermaid_code = ""
         st.session_state.suggested_transformations = ""
         st.session_state.transformation_code = ""
-        st.session_state.transformation_applied_df = None
+        replace_transformation_result()
         st.session_state.transformation_original_df_preview = None
         st.session_state.transformation_details = None
         st.info("Upload CSV or XLSX files to begin data analysis.")
         st.rerun() # Rerun to clear displayed data
 
+# Failed uploads are kept in session state so the messages survive the rerun after loading
+for failed_name, load_error in st.session_state.upload_errors.items():
+    st.error(f"Error loading '{failed_name}': {load_error}")
+
+def scan_uploaded_dataset(name: str):
+    """LazyFrame over a cached upload; re-caches it from the uploader if the shared cache evicted it meanwhile."""
+    handle = st.session_state.uploaded_dfs.get(name)
+    if handle is None:
+        return None
+    frame = handle.scan()
+    if frame is None:
+        upload = next((f for f in (uploaded_files or []) if f.name == name), None)
+        refreshed = load_cached_data_from_upload(upload)
+        if refreshed is not None:
+            st.session_state.uploaded_dfs[name] = refreshed
+            frame = refreshed.scan()
+    return frame
+
 # Display list of uploaded files and allow selection
 if st.session_state.uploaded_dfs:
     st.subheader("Loaded DataFrames")
@@ -151,18 +191,25 @@ if st.session_state.uploaded_dfs:
     selected_df_name = st.selectbox("Select DataFrame to work with:", df_names, key="df_selector")
     if selected_df_name != st.session_state.selected_df_name:
         st.session_state.selected_df_name = selected_df_name
-        st.session_state.df = st.session_state.uploaded_dfs[selected_df_name]
         st.session_state.generated_chart_code = "" # Clear chart on DF switch
         st.session_state.last_chart_query = ""
         st.session_state.transformation_code = "" # Clear transformation on DF switch
-        st.session_state.transformation_applied_df = None
+        replace_transformation_result()
         st.session_state.transformation_original_df_preview = None
         st.session_state.transformation_details = None
         st.rerun()
+    # Re-opened every rerun: scanning the cached IPC file only maps it, and it keeps the cache entry recently used
+    st.session_state.df = scan_uploaded_dataset(st.session_state.selected_df_name)
+    if st.session_state.df is None:
+        st.error(f"'{st.session_state.selected_df_name}' is no longer available. Please upload it again.")
+        st.stop()
     st.write(f"Currently viewing: **{st.session_state.selected_df_name}**")
-    st.write(f"Columns: {', '.join(st.session_state.df.columns)}")
-    # Display Polars DataFrame by converting to Pandas for st.dataframe
-    st.dataframe(st.session_state.df.head().to_pandas()) 
+    df_handle = st.session_state.uploaded_dfs[st.session_state.selected_df_name]
+    df_columns = df_handle.columns # Schema kept on the handle, no rows are read
+    st.write(f"Columns: {', '.join(df_columns)}")
+    # Only the preview rows are collected from the lazy scan; the Pandas preview is converted once per dataset version
+    df_head_pandas = get_pandas_head(df_handle.version, st.session_state.df)
+    st.dataframe(df_head_pandas)
     
     st.markdown("---") # Visual separator
 
@@ -170,7 +217,7 @@ if st.session_state.uploaded_dfs:
     st.subheader("2. Entity-Relationship (ER) Diagrams for single file")
     st.info("Describe your data entities and their relationships. AI will generate a Mermaid ERD syntax, which is rendered visually by `diagram-renderer` and includes a PNG download option.")
     # Convert Polars columns to list for prompt
-    er_diagram_description_sample = f"Analyze the schema of the DataFrame '{st.session_state.selected_df_name}' with columns {st.session_state.df.columns} and infer an ER Diagram. Assume primary keys for ID columns if present, e.g., 'id', 'user_id', 'product_id'."
+    er_diagram_description_sample = f"Analyze the schema of the DataFrame '{st.session_state.selected_df_name}' with columns {df_columns} and infer an ER Diagram. Assume primary keys for ID columns if present, e.g., 'id', 'user_id', 'product_id'."
     er_diagram_description = st.text_area(
         "Describe your ER Diagram for AI (e.g., 'Product has productId (PK), name, price. Order has orderId (PK), productId (FK).'):",
         value=st.session_state.er_diagram_description if st.session_state.er_diagram_description else er_diagram_description_sample,
@@ -222,20 +269,21 @@ if st.session_state.uploaded_dfs:
             st.info("Make sure 'diagram-renderer' is installed correctly and your Mermaid code is valid.")
         def save_er_diagram_to_neo4j():
             if st.session_state.last_er_diagram_details:
-                with st.spinner("Saving ER diagram details to Neo4j..."):
-                    details = st.session_state.last_er_diagram_details
-                    if st.session_state.neo4j_handler_da.store_project_flow_event(
-                        details["event_id"],
-                        details["description"],
-                        details["mermaid_code"],
-                        {"nodes": [], "edges": []},
-                        details["timestamp"],
-                        "Mermaid (ER Diagram)"
-                    ):
-                        st.success("AI ER Diagram details saved to Neo4j!")
-                    else:
-                        st.error("Failed to save AI ER Diagram details to Neo4j.")
-                    st.session_state.last_er_diagram_details = None
+                details = st.session_state.last_er_diagram_details
+                if get_neo4j_write_queue().submit(
+                    "store_project_flow_event",
+                    details["event_id"],
+                    details["description"],
+                    details["mermaid_code"],
+                    {"nodes": [], "edges": []},
+                    details["timestamp"],
+                    "Mermaid (ER Diagram)",
+                    username=st.session_state.get("username")
+                ):
+                    st.success("AI ER Diagram details queued for saving to Neo4j!")
+                else:
+                    st.error("Failed to queue AI ER Diagram details for Neo4j.")
+                st.session_state.last_er_diagram_details = None
             st.rerun()
         if st.session_state.last_er_diagram_details:
             st.button("Save AI ER Diagram to Neo4j", key="save_ai_er_neo4j_button", on_click=save_er_diagram_to_neo4j)
@@ -250,13 +298,24 @@ if st.session_state.uploaded_dfs:
         key="chart_query_input"
     )
 
-    def get_dataframe_preview(df: pl.DataFrame) -> str: # Change type hint to pl.DataFrame
-        if df is None or df.is_empty(): # Use .is_empty() for Polars
+    def get_column_profile_text() -> str:
+        """Column statistics of the selected dataset for prompts; one pass over the data per dataset version."""
+        try:
+            return format_profile_for_prompt(get_dataset_profile(df_handle.version, st.session_state.df))
+        except Exception as e: # Prompts still work from the preview alone
+            print(f"Error profiling {st.session_state.selected_df_name}: {e}")
+            return ""
+
+    def get_dataframe_preview(df: pl.LazyFrame) -> str:
+        if df is None:
+            return "DataFrame is empty or not loaded."
+        head_df = materialize_head(df, 5) # Only the first rows are collected
+        if head_df.is_empty(): # Use .is_empty() for Polars
             return "DataFrame is empty or not loaded."
         preview = f"DataFrame Name: {st.session_state.selected_df_name}\n"
-        preview += f"DataFrame Columns: {df.columns}\n" # Polars columns property is already a list of strings
+        preview += f"DataFrame Columns: {head_df.columns}\n" # Polars columns property is already a list of strings
         preview += "First 5 rows (CSV format):\n"
-        preview += df.head(5).write_csv(file=None) # Polars equivalent of to_csv(index=False)
+        preview += head_df.write_csv(file=None) # Polars equivalent of to_csv(index=False)
         return preview
 
     if st.button("Generate Chart", key="generate_chart_button", disabled=st.session_state.df is None):
@@ -267,7 +326,7 @@ if st.session_state.uploaded_dfs:
                 # Pass Pandas DataFrame preview to chart generation, as LLM is trained on Pandas structures
                 data_preview_str = get_dataframe_preview(st.session_state.df)
                 # The LLM will generate Python code defining 'options_dict' for ECharts
-                chart_code_raw = generate_chart_code_with_ragbits(st.session_state.df.head().to_pandas().to_csv(index=False), user_query_chart)
+                chart_code_raw = generate_chart_code_with_ragbits(df_head_pandas.to_csv(index=False), user_query_chart, get_column_profile_text())
                 
                 # Extract code if wrapped in markdown
                 if "```python" in chart_code_raw:
@@ -308,17 +367,22 @@ if st.session_state.uploaded_dfs:
             st.session_state.last_chart_query = ""
         else:
             try:
-                exec_globals = {
-                    '__builtins__': __builtins__,
-                    'pd': pd,
-                    'df': st.session_state.df.to_pandas(), # Pass Pandas DataFrame for LLM's exec context
-                }
-                exec_locals = {}
-                
-                # The AI-generated code will now define 'options_dict'
-                exec(st.session_state.generated_chart_code, exec_globals, exec_locals)
-                
-                echarts_options = exec_locals.get('options_dict') # Get the ECharts options
+                def run_chart_code(columns):
+                    # The AI-generated code defines 'options_dict'; it runs in a sandbox worker against the cached dataset file
+                    return execute_chart_code(st.session_state.generated_chart_code, df_handle.path, columns)
+
+                def build_chart_options():
+                    # Only collect the columns the chart code names; fall back to the full frame if that guess was too narrow
+                    chart_columns = columns_referenced_in_code(st.session_state.generated_chart_code, df_columns)
+                    try:
+                        return run_chart_code(chart_columns)
+                    except (KeyError, AttributeError):
+                        if chart_columns is None:
+                            raise
+                        return run_chart_code(None)
+
+                # Widget reruns reuse the options built for this (code, dataset version) instead of re-executing the code
+                echarts_options = get_cached_chart_options(st.session_state.generated_chart_code, df_handle.version, build_chart_options)
                 
                 if echarts_options:
                     st_echarts(
@@ -339,19 +403,20 @@ if st.session_state.uploaded_dfs:
 
     def save_chart_details_to_neo4j():
         if st.session_state.last_chart_generation_details:
-            with st.spinner("Saving chart generation event to Neo4j..."):
-                details = st.session_state.last_chart_generation_details
-                if st.session_state.neo4j_handler_da.store_chart_event(
-                    details["event_id"],
-                    details["query"],
-                    details["generated_code"],
-                    details["data_preview"],
-                    details["timestamp"]
-                ):
-                    st.success("Chart generation event saved to Neo4j!")
-                else:
-                    st.error("Failed to save chart generation event to Neo4j.")
-                st.session_state.last_chart_generation_details = None
+            details = st.session_state.last_chart_generation_details
+            if get_neo4j_write_queue().submit(
+                "store_chart_event",
+                details["event_id"],
+                details["query"],
+                details["generated_code"],
+                details["data_preview"],
+                details["timestamp"],
+                username=st.session_state.get("username")
+            ):
+                st.success("Chart generation event queued for saving to Neo4j!")
+            else:
+                st.error("Failed to queue chart generation event for Neo4j.")
+            st.session_state.last_chart_generation_details = None
             st.rerun()
     if st.session_state.last_chart_generation_details:
         st.button("Save Chart Details to Neo4j", key="save_chart_neo4j_button", on_click=save_chart_details_to_neo4j)
@@ -361,10 +426,28 @@ if st.session_state.uploaded_dfs:
     # --- Multi-File ER Diagram ---
     if len(st.session_state.uploaded_dfs) > 1:
         st.subheader("4. Entity-Relationship (ER) Diagram for Multiple Files") # Subheader number changed
-        st.info("Describe the relationships between your uploaded DataFrames. AI will infer schemas and generate a Mermaid ERD.")
+        st.info("Keys and relationships are inferred locally from the data (unique, non-null columns and value containment between files). Optionally, AI can refine entity/relationship names on top of the inferred diagram.")
+        if st.button("Infer ER Diagram from Data", key="infer_multi_df_er_diagram_button"):
+            with st.spinner("Inferring keys and relationships across files..."):
+                try:
+                    datasets = {}
+                    for name, handle in st.session_state.uploaded_dfs.items():
+                        frame = scan_uploaded_dataset(name)
+                        if frame is None:
+                            raise ValueError(f"'{name}' is no longer available. Please re-upload it.")
+                        datasets[name] = (handle.version, frame)
+                    st.session_state.multi_df_er_mermaid_code = infer_er_diagram(datasets)
+                    st.session_state.multi_df_er_description = "" # Offer the inferred diagram as the AI refinement prompt
+                    st.success("ER Diagram inferred from the uploaded files!")
+                except Exception as e:
+                    st.error(f"Error inferring ER diagram from the uploaded files: {e}")
+                    st.session_state.multi_df_er_mermaid_code = ""
         # Pass Polars columns to list for prompt
-        all_df_schemas = {name: df.columns for name, df in st.session_state.uploaded_dfs.items()}
+        all_df_schemas = {name: handle.columns for name, handle in st.session_state.uploaded_dfs.items()}
         multi_df_er_description_sample = f"Generate an ER Diagram for the following DataFrames and infer relationships: {json.dumps(all_df_schemas, indent=2)}. Focus on common ID columns to link them."
+        inferred_er_code = st.session_state.multi_df_er_mermaid_code
+        if inferred_er_code:
+            multi_df_er_description_sample = f"Improve the entity and relationship names of this ER Diagram, which was inferred from the data. Keep every entity, attribute, PK/FK marker and relationship as is:\n{inferred_er_code}"
         multi_df_er_description = st.text_area(
             "Describe your ER Diagram for AI (e.g., 'Link products.csv and orders.csv on product_id'):",
             value=st.session_state.multi_df_er_description if st.session_state.multi_df_er_description else multi_df_er_description_sample,
@@ -372,7 +455,7 @@ if st.session_state.uploaded_dfs:
             key="multi_df_er_description_input"
         )
         st.session_state.multi_df_er_description = multi_df_er_description
-        if st.button("Generate AI ER Diagram (Multiple Files)", key="generate_multi_df_er_diagram_button", disabled=not multi_df_er_description.strip()):
+        if st.button("Refine ER Diagram with AI (Optional)", key="generate_multi_df_er_diagram_button", disabled=not multi_df_er_description.strip()):
             with st.spinner("Generating AI ER diagram for multiple files..."):
                 try:
                     df_schemas_str = json.dumps(all_df_schemas)
@@ -418,13 +501,87 @@ if st.session_state.uploaded_dfs:
         but `annotate-transform` is not used for runtime validation of pandas DataFrames.
         """
     )
+    def parse_transformation_response(transform_details_raw: str, transform_description: str, report=st.error):
+        """
+        Extracts (code, conceptual annotation, description) from the AI's JSON answer.
+        Problems are passed to `report`; the code is "" if nothing usable was returned.
+        """
+        # Expected format: JSON with "code": [...], "annotation": "", "description": ""
+        try:
+            # Extraction logic for JSON from markdown block (more robust)
+            json_str_to_parse = transform_details_raw.strip()
+            start_idx = -1
+            if "```json" in json_str_to_parse:
+                start_idx = json_str_to_parse.find("```json") + len("```json")
+            elif "```" in json_str_to_parse:
+                start_idx = json_str_to_parse.find("```") + len("```")
+            
+            end_idx = json_str_to_parse.rfind("```")
+            
+            if start_idx != -1 and end_idx != -1 and start_idx < end_idx:
+                json_content = json_str_to_parse[start_idx:end_idx].strip()
+                # Some LLMs might add extra stuff like `json` or `python`
+                # in the content itself after the initial ```. Remove if present.
+                if json_content.startswith("json"):
+                    json_content = json_content[len("json"):].strip()
+                elif json_content.startswith("python"):
+                     json_content = json_content[len("python"):].strip()
+                
+                transform_output = json.loads(json_content)
+            else:
+                report(f"AI response did not contain a valid JSON markdown block (```json...``` or ```...```). Raw output: {transform_details_raw}")
+                # Raise an error to fall through to the general exception handling
+                raise json.JSONDecodeError("Invalid JSON block structure from AI", transform_details_raw, 0)
+            
+            # Handle `code` as a list of strings OR fall back to single string
+            generated_code_list = transform_output.get("code", [])
+            if isinstance(generated_code_list, list):
+                generated_code = "\n".join(generated_code_list)
+            else: # Fallback if AI doesn't return a list, try to use it directly as a string
+                generated_code = str(generated_code_list).strip()
+                report("AI did not return 'code' as a list of strings. Attempting to parse as single string.")
+            
+            return generated_code, transform_output.get("annotation", "N/A -> N/A"), transform_output.get("description", transform_description)
+        except json.JSONDecodeError as e:
+            report(f"AI returned invalid JSON for transformation. Error: {e}. Raw output: {transform_details_raw}. Ensure AI returns valid JSON.")
+        except Exception as e: # Catch any other unexpected errors during parsing/extraction
+            report(f"An unexpected error occurred during AI response parsing: {e}. Raw output: {transform_details_raw}")
+        return "", "N/A -> N/A", transform_description
+
+    def transformation_frame_paths(generated_code: str) -> dict:
+        """
+        Datasets to expose to transformation code, as {variable name: cached IPC path}: `df` (the selected one; transformations
+        may touch any column) plus other uploaded DFs, but only those the generated code actually refers to.
+        """
+        frame_paths = {'df': df_handle.path}
+        for name in st.session_state.uploaded_dfs:
+            var_name = dataset_variable_name(name)
+            if var_name not in frame_paths and var_name not in ('pd', 'np', 'pl', 're', 'warnings') and code_references_name(generated_code, var_name):
+                if scan_uploaded_dataset(name) is not None: # Re-caches the file if it was evicted
+                    frame_paths[var_name] = st.session_state.uploaded_dfs[name].path
+        return frame_paths
+
+    def store_transformation_result(transformed_result: SandboxFrameResult, generated_code: str, transform_long_description: str, conceptual_annotation: str, engine: str):
+        replace_transformation_result(transformed_result)
+        st.session_state.transformation_code = generated_code
+        st.session_state.transformation_details = {
+            "original_df_name": st.session_state.selected_df_name,
+            "transform_description": transform_long_description,
+            "conceptual_annotation": conceptual_annotation,
+            "generated_code": generated_code,
+            "engine": engine,
+            "timestamp": datetime.now().isoformat()
+        }
+        st.success(f"Transformation applied successfully! (engine: {engine})")
+        st.info("Transformation details stored. Click 'Save Transformation to Neo4j' to persist this event.")
+
     col_suggest, col_apply = st.columns(2)
     with col_suggest:
         if st.button("Suggest Transformations", key="suggest_transforms_button", disabled=st.session_state.df is None):
             st.session_state.suggested_transformations = "" # Reset
             with st.spinner("Asking AI for transformation suggestions..."):
                 current_df_preview = get_dataframe_preview(st.session_state.df) # Now returns Polars CSV preview
-                suggestions_raw = asyncio.run(suggest_data_transformations_prompt(current_df_preview))
+                suggestions_raw = asyncio.run(suggest_data_transformations_prompt(current_df_preview, get_column_profile_text()))
                 if "```" in suggestions_raw: # Extract if markdown
                     suggestions = suggestions_raw.split("```")[1].strip()
                 else:
@@ -445,131 +602,76 @@ if st.session_state.uploaded_dfs:
         )
         if st.button("Apply Transformation", key="apply_transform_button", disabled=not transform_description.strip()):
             st.session_state.transformation_code = "" # Reset
-            st.session_state.transformation_applied_df = None
+            replace_transformation_result()
             st.session_state.transformation_original_df_preview = None
             st.session_state.transformation_details = None
             with st.spinner("Generating and applying transformation code..."):
                 current_df_preview = get_dataframe_preview(st.session_state.df) # Now returns Polars CSV preview
                 # Pass a Pandas DataFrame preview to the LLM, as it's trained on Pandas conventions
                 # The LLM will convert it to Polars internally in its generated code.
-                current_pandas_df_preview_for_llm = st.session_state.df.head().to_pandas().to_csv(index=False)
-                all_df_schemas = {name: df.columns for name, df in st.session_state.uploaded_dfs.items()} # Polars columns property
-                
-                transform_details_raw = asyncio.run(generate_transformation_code_prompt(
-                    current_pandas_df_preview_for_llm, # Pass Pandas preview for LLM's understanding
+                current_pandas_df_preview_for_llm = df_head_pandas.to_csv(index=False)
+                # Schema only, keyed by the variable name each dataset gets in the generated code (see transformation_frame_paths)
+                all_df_schemas = {dataset_variable_name(name): handle.columns for name, handle in st.session_state.uploaded_dfs.items()}
+                st.session_state.transformation_original_df_preview = df_head_pandas # Pandas preview of the frame before transformation
+                column_profile_text = get_column_profile_text()
+
+                # First choice: the transformation as Polars LazyFrame code, collected with the query optimizer and streaming engine.
+                # The pandas-based prompt below is only the fallback when no lazy version can be generated or run.
+                lazy_transform_raw = asyncio.run(generate_lazy_transformation_code_prompt(
+                    current_df_preview,
                     transform_description,
-                    json.dumps(all_df_schemas) # Pass all available schemas (Polars columns)
+                    json.dumps(all_df_schemas),
+                    column_profile_text
                 ))
-                # Expected format: JSON with "code": [...], "annotation": "", "description": ""
-                try:
-                    # Extraction logic for JSON from markdown block (more robust)
-                    json_str_to_parse = transform_details_raw.strip()
-                    start_idx = -1
-                    if "```json" in json_str_to_parse:
-                        start_idx = json_str_to_parse.find("```json") + len("```json")
-                    elif "```" in json_str_to_parse:
-                        start_idx = json_str_to_parse.find("```") + len("```")
-                    
-                    end_idx = json_str_to_parse.rfind("```")
-                    
-                    if start_idx != -1 and end_idx != -1 and start_idx < end_idx:
-                        json_content = json_str_to_parse[start_idx:end_idx].strip()
-                        # Some LLMs might add extra stuff like `json` or `python`
-                        # in the content itself after the initial ```. Remove if present.
-                        if json_content.startswith("json"):
-                            json_content = json_content[len("json"):].strip()
-                        elif json_content.startswith("python"):
-                             json_content = json_content[len("python"):].strip()
-                        
-                        transform_output = json.loads(json_content)
-                    else:
-                        st.error(f"AI response did not contain a valid JSON markdown block (```json...``` or ```...```). Raw output: {transform_details_raw}")
-                        generated_code = ""
-                        conceptual_annotation = "N/A -> N/A"
-                        transform_long_description = transform_description
-                        # Raise an error to fall through to the general exception handling
-                        raise json.JSONDecodeError("Invalid JSON block structure from AI", transform_details_raw, 0)
-                    
-                    # Handle `code` as a list of strings OR fall back to single string
-                    generated_code_list = transform_output.get("code", [])
-                    if isinstance(generated_code_list, list):
-                        generated_code = "\n".join(generated_code_list)
-                    else: # Fallback if AI doesn't return a list, try to use it directly as a string
-                        generated_code = str(generated_code_list).strip()
-                        st.warning("AI did not return 'code' as a list of strings. Attempting to parse as single string.")
-                    
-                    conceptual_annotation = transform_output.get("annotation", "N/A -> N/A")
-                    transform_long_description = transform_output.get("description", transform_description)
-                except json.JSONDecodeError as e:
-                    st.error(f"AI returned invalid JSON for transformation. Error: {e}. Raw output: {transform_details_raw}. Ensure AI returns valid JSON.")
-                    generated_code = ""
-                    conceptual_annotation = "N/A -> N/A"
-                    transform_long_description = transform_description
-                except Exception as e: # Catch any other unexpected errors during parsing/extraction
-                    st.error(f"An unexpected error occurred during AI response parsing: {e}. Raw output: {transform_details_raw}")
-                    generated_code = ""
-                    conceptual_annotation = "N/A -> N/A"
-                    transform_long_description = transform_description
-                
-                if generated_code:
-                    st.session_state.transformation_original_df_preview = st.session_state.df.head(5).to_pandas() # Store Polars preview as Pandas
+                lazy_code, lazy_annotation, lazy_description = parse_transformation_response(lazy_transform_raw, transform_description, report=lambda message: None) # Parse problems only trigger the fallback
+                lazy_applied = False
+                if lazy_code:
                     try:
-                        # Convert the currently selected Polars DF to Pandas for the exec context.
-                        # The AI's generated code will handle converting this df (Pandas) to Polars.
-                        df_for_exec = st.session_state.df.clone().to_pandas() 
-                        exec_transform_globals = {
-                            '__builtins__': __builtins__,
-                            'pd': pd,
-                            'df': df_for_exec, # Pass Pandas DataFrame here for exec
-                            're': re, 
-                            'np': np,
-                            'warnings': warnings,
-                            'pl': pl # Pass Polars module to the execution scope
-                        }
-                        # Add other uploaded DFs (which are Polars) to the scope after converting to Pandas
-                        for name, other_pl_df in st.session_state.uploaded_dfs.items():
-                            var_name = name.replace('.', '_').replace('-', '_').replace(' ', '_').lower()
-                            if var_name.endswith('_csv') or var_name.endswith('_xlsx'):
-                                var_name = var_name[:-4] 
-                            # Convert other Polars DFs to Pandas too, as the LLM is instructed to convert df (Pandas) to polars.
-                            # This ensures all input DFs for AI's code are consistently Pandas initially.
-                            if var_name not in exec_transform_globals:
-                                exec_transform_globals[var_name] = other_pl_df.to_pandas() 
-                        exec_transform_locals = exec_transform_globals 
-                        exec(generated_code, exec_transform_globals, exec_transform_locals)
-                        
-                        # The transformed DataFrame from the AI's code is expected to be `transformed_df`.
-                        # This `transformed_df` should be in Pandas format from the AI's code, so no further conversion needed here.
-                        transformed_df_result_from_exec = exec_transform_locals.get('transformed_df')
-                        
-                        if isinstance(transformed_df_result_from_exec, pd.DataFrame):
-                            st.session_state.transformation_applied_df = transformed_df_result_from_exec
-                            st.session_state.transformation_code = generated_code
-                            st.session_state.transformation_details = {
-                                "original_df_name": st.session_state.selected_df_name,
-                                "transform_description": transform_long_description,
-                                "conceptual_annotation": conceptual_annotation,
-                                "generated_code": generated_code,
-                                "timestamp": datetime.now().isoformat()
-                            }
-                            st.success("Transformation applied successfully!")
-                            st.info("Transformation details stored. Click 'Save Transformation to Neo4j' to persist this event.")
+                        lazy_result = execute_lazy_transformation_code(lazy_code, transformation_frame_paths(lazy_code))
+                        if isinstance(lazy_result, SandboxFrameResult):
+                            store_transformation_result(lazy_result, lazy_code, lazy_description, lazy_annotation, "Polars (lazy, streaming)")
+                            lazy_applied = True
                         else:
-                            st.error("AI-generated code did not produce a valid pandas DataFrame as `transformed_df`. Check the output variable name and its type.")
-                            st.info("Ensure the AI's output assigns the resulting DataFrame to a variable named `transformed_df` and converts it to Pandas format (e.g., `.to_pandas()`) at the end.")
-                            st.code(generated_code, language="python") # Show the code that failed
-                            st.info(f"Type of transformed_df from AI: {type(transformed_df_result_from_exec)}")
+                            st.warning(f"Polars lazy transformation did not assign a Polars LazyFrame or DataFrame to `transformed_lf` (got {lazy_result or 'nothing'}). Falling back to pandas-based code.")
                     except Exception as e:
-                        st.error(f"Error executing transformation code: {e}")
-                        st.code(generated_code, language="python")
-                        st.error("Please refine your transformation description or check the generated code for issues. Full traceback above.")
+                        st.warning(f"Polars lazy transformation failed ({e}). Falling back to pandas-based code.")
                 else:
-                    st.error("AI failed to generate transformation code. Please try a different description.")
+                    st.warning("AI did not return usable Polars lazy transformation code. Falling back to pandas-based code.")
+
+                if not lazy_applied:
+                    transform_details_raw = asyncio.run(generate_transformation_code_prompt(
+                        current_pandas_df_preview_for_llm, # Pass Pandas preview for LLM's understanding
+                        transform_description,
+                        json.dumps(all_df_schemas), # Pass all available schemas (Polars columns)
+                        column_profile_text
+                    ))
+                    generated_code, conceptual_annotation, transform_long_description = parse_transformation_response(transform_details_raw, transform_description)
+                    
+                    if generated_code:
+                        try:
+                            # The transformed DataFrame from the AI's code is expected to be `transformed_df`.
+                            # It comes back from the sandbox as a SandboxFrameResult (or the type name of whatever else was assigned).
+                            transformed_df_result_from_exec = execute_transformation_code(generated_code, transformation_frame_paths(generated_code))
+                            
+                            if isinstance(transformed_df_result_from_exec, SandboxFrameResult):
+                                store_transformation_result(transformed_df_result_from_exec, generated_code, transform_long_description, conceptual_annotation, "pandas")
+                            else:
+                                st.error("AI-generated code did not produce a valid pandas DataFrame as `transformed_df`. Check the output variable name and its type.")
+                                st.info("Ensure the AI's output assigns the resulting DataFrame to a variable named `transformed_df` and converts it to Pandas format (e.g., `.to_pandas()`) at the end.")
+                                st.code(generated_code, language="python") # Show the code that failed
+                                st.info(f"Type of transformed_df from AI: {transformed_df_result_from_exec}")
+                        except Exception as e:
+                            st.error(f"Error executing transformation code: {e}")
+                            st.code(generated_code, language="python")
+                            st.error("Please refine your transformation description or check the generated code for issues. Full traceback above.")
+                    else:
+                        st.error("AI failed to generate transformation code. Please try a different description.")
 
     if st.session_state.transformation_code:
         st.subheader("Generated Transformation Code")
         with st.expander("View Code & Annotation"):
             st.markdown(f"**Conceptual Annotation:** `{st.session_state.transformation_details['conceptual_annotation']}`")
+            st.markdown(f"**Executed with:** {st.session_state.transformation_details.get('engine', 'pandas')}")
             st.code(st.session_state.transformation_code, language="python")
         if st.session_state.transformation_applied_df is not None:
             st.subheader("Transformed Data Preview")
@@ -579,35 +681,37 @@ if st.session_state.uploaded_dfs:
                 # Original preview is already stored as Pandas
                 st.dataframe(st.session_state.transformation_original_df_preview)
             with col_trans:
-                st.markdown("**Transformed Data (First 5 Rows):**")
-                st.dataframe(st.session_state.transformation_applied_df.head()) # Ensure this is Pandas
+                transformed_result = st.session_state.transformation_applied_df
+                st.markdown(f"**Transformed Data (First 5 of {transformed_result.row_count:,} Rows, {len(transformed_result.columns)} Columns):**")
+                st.dataframe(transformed_result.head()) # Only the preview rows are read from the result file
         def save_transformation_to_neo4j():
             if st.session_state.transformation_details:
-                with st.spinner("Saving transformation event to Neo4j..."):
-                    details = st.session_state.transformation_details
-                    # Store transformation as a specialized project flow event
-                    if st.session_state.neo4j_handler_da.store_project_flow_event(
-                        str(uuid.uuid4()), # New event ID for transformation
-                        details["transform_description"],
-                        details["generated_code"],
-                        {
-                            "nodes": [
-                                {"id": f"df_{details['original_df_name']}", "label": details['original_df_name'], "type": "DataFrame"},
-                                {"id": f"transformation_op", "label": details['conceptual_annotation'], "type": "Transformation"},
-                                {"id": f"df_transformed", "label": "Transformed DataFrame", "type": "DataFrame"}
-                            ],
-                            "edges": [
-                                {"source": f"df_{details['original_df_name']}", "target": "transformation_op", "label": "input_to"},
-                                {"source": "transformation_op", "target": "df_transformed", "label": "produces"}
-                            ]
-                        },
-                        details["timestamp"],
-                        "Data Transformation"
-                    ):
-                        st.success("Transformation event saved to Neo4j!")
-                    else:
-                        st.error("Failed to save transformation event to Neo4j.")
-                    st.session_state.transformation_details = None
+                details = st.session_state.transformation_details
+                # Store transformation as a specialized project flow event
+                if get_neo4j_write_queue().submit(
+                    "store_project_flow_event",
+                    str(uuid.uuid4()), # New event ID for transformation
+                    details["transform_description"],
+                    details["generated_code"],
+                    {
+                        "nodes": [
+                            {"id": f"df_{details['original_df_name']}", "label": details['original_df_name'], "type": "DataFrame"},
+                            {"id": f"transformation_op", "label": details['conceptual_annotation'], "type": "Transformation"},
+                            {"id": f"df_transformed", "label": "Transformed DataFrame", "type": "DataFrame"}
+                        ],
+                        "edges": [
+                            {"source": f"df_{details['original_df_name']}", "target": "transformation_op", "label": "input_to"},
+                            {"source": "transformation_op", "target": "df_transformed", "label": "produces"}
+                        ]
+                    },
+                    details["timestamp"],
+                    "Data Transformation",
+                    username=st.session_state.get("username")
+                ):
+                    st.success("Transformation event queued for saving to Neo4j!")
+                else:
+                    st.error("Failed to queue transformation event for Neo4j.")
+                st.session_state.transformation_details = None
             st.rerun()
         if st.session_state.transformation_details:
             st.button("Save Transformation to Neo4j", key="save_transform_neo4j_button", on_click=save_transformation_to_neo4j)
\ No newline at end of file
@@ -9,7 +9,9 @@ from ragbits.core.llms import LiteLLM
 from core.data_handler import extract_text_from_document
 from ragbits.core.prompt import Prompt
 from pydantic import BaseModel
-from core.neo4j_handler import Neo4jHandler
+from core.neo4j_handler import get_neo4j_handler
+from core.neo4j_write_queue import get_neo4j_write_queue # NEW: Write-behind persistence for save buttons
+from core.async_neo4j_handler import get_async_neo4j_handler, close_async_neo4j_handler # Graph writes awaited alongside LLM calls
 import uuid
 from datetime import datetime
 import pandas as pd
@@ -163,6 +165,19 @@ def add_document_to_lancedb_sync(uploaded_file, document_name: str) -> bool:
         st.error(f"LanceDB: Error adding data to table '{LANCEDB_TABLE_NAME}': {e}")
         return False
     return True
+def document_query_prompt(table, user_query: str, query_vector) -> DocumentQueryPrompt | None:
+    """RAG prompt built from the 5 chunks closest to the query, or None if nothing relevant was found."""
+    search_results = table.search(query_vector).limit(5).to_list()
+    context_chunks = []
+    if search_results:
+        for item in search_results:
+            context_chunks.append(item.get("text", ""))
+    if not context_chunks:
+        return None
+    context_str = "\n".join(context_chunks)
+    # FIX: Correctly instantiate DocumentQueryPrompt with DocumentQueryPromptInput
+    # The prompt is now created using the specific input model defined in agents.py
+    return DocumentQueryPrompt(DocumentQueryPromptInput(query=user_query, context_str=context_str))
 # Changed to synchronous function
 def query_lancedb_document_sync(user_query: str) -> str:
     """Queries LanceDB and generates an answer using RAG directly. Synchronous operation."""
@@ -176,17 +191,9 @@ def query_lancedb_document_sync(user_query: str) -> str:
             api_base=OLLAMA_API_BASE
         )
         query_vector = response.data[0]['embedding']
-        search_results = table.search(query_vector).limit(5).to_list()
-        context_chunks = []
-        if search_results:
-            for item in search_results:
-                context_chunks.append(item.get("text", ""))
-        if not context_chunks:
+        rag_prompt_instance = document_query_prompt(table, user_query, query_vector)
+        if rag_prompt_instance is None:
             return "No relevant information found in the document for your query."
-        context_str = "\n".join(context_chunks)
-        # FIX: Correctly instantiate DocumentQueryPrompt with DocumentQueryPromptInput
-        # The prompt is now created using the specific input model defined in agents.py
-        rag_prompt_instance = DocumentQueryPrompt(DocumentQueryPromptInput(query=user_query, context_str=context_str))
         response = asyncio.run(st.session_state.llm_doc_processor.generate(prompt=rag_prompt_instance))
         return response
     except Exception as e:
@@ -194,9 +201,40 @@ def query_lancedb_document_sync(user_query: str) -> str:
         st.error(f"An unexpected error occurred during document querying: {e}")
         st.exception(e) # Display full traceback in Streamlit for user
         return f"Error: An unexpected error occurred during document querying: {e}"
-# Initialize Neo4j Handler (once per session)
+async def answer_and_store_document_queries(table, questions: list[str], document_name: str, text_preview: str, username: str = None) -> list[dict]:
+    """
+    Batch RAG: answers the questions one after another and stores each answer as a DocumentQuery event
+    while the next question is with the LLM. Events the async write can't store are handed to the
+    write-behind queue, so an outage doesn't lose them.
+    """
+    handler = get_async_neo4j_handler()
+    llm = st.session_state.llm_doc_processor
+    results = []
+    store_tasks = []
+    try:
+        for question in questions:
+            try:
+                response = await litellm.aembedding(model=f"ollama/{OLLAMA_EMBEDDING_MODEL}", input=[question], api_base=OLLAMA_API_BASE)
+                rag_prompt_instance = document_query_prompt(table, question, response.data[0]['embedding'])
+                answer = await llm.generate(prompt=rag_prompt_instance) if rag_prompt_instance else "No relevant information found in the document for your query."
+            except Exception as e:
+                results.append({"query": question, "answer": f"Error: {e}", "saved": "not saved"})
+                continue
+            event = [str(uuid.uuid4()), question, answer, document_name, text_preview, datetime.now().isoformat()]
+            result = {"query": question, "answer": answer, "saved": "saved"}
+            results.append(result)
+            # Runs concurrently with the next iteration's LLM call
+            store_tasks.append((event, result, asyncio.create_task(handler.store_document_query_event(*event, username=username))))
+        stored_flags = await asyncio.gather(*(task for _, _, task in store_tasks))
+    finally:
+        await close_async_neo4j_handler()
+    for (event, result, _), stored in zip(store_tasks, stored_flags):
+        if not stored:
+            result["saved"] = "queued" if get_neo4j_write_queue().submit("store_document_query_event", *event, username=username) else "not saved"
+    return results
+# Neo4j Handler (process-wide, shares one driver/connection pool across all sessions)
 if "neo4j_handler_dp" not in st.session_state:
-    st.session_state.neo4j_handler_dp = Neo4jHandler()
+    st.session_state.neo4j_handler_dp = get_neo4j_handler()
 st.subheader("Upload Document")
 uploaded_document = st.file_uploader("Upload a TXT or PDF document", type=["txt", "pdf"], key="doc_uploader")
 if "document_text" not in st.session_state:
@@ -208,12 +246,15 @@ if "doc_answer" not in st.session_state:
 # New session state for storing document query details for Neo4j
 if "last_doc_query_details" not in st.session_state:
     st.session_state.last_doc_query_details = None
+if "doc_batch_results" not in st.session_state:
+    st.session_state.doc_batch_results = []
 if uploaded_document:
     current_doc_info = (uploaded_document.name, uploaded_document.size)
     # Check if a new file is uploaded or if the existing one has changed
     if st.session_state.last_uploaded_doc_info != current_doc_info:
         st.session_state.document_text = "" # Clear old text immediately
         st.session_state.doc_answer = "" # Clear old answer
+        st.session_state.doc_batch_results = []
         st.session_state.last_doc_query_details = None # Clear old details
         # Clear LanceDB *before* processing the new document
         clear_lancedb_table()
@@ -236,6 +277,7 @@ else:
         st.session_state.last_uploaded_doc_info = None
         st.session_state.doc_answer = ""
         st.session_state.last_doc_query_details = None
+        st.session_state.doc_batch_results = []
         clear_lancedb_table() # Clear LanceDB when no document is uploaded
         st.rerun() # Rerun to update the UI
 if st.session_state.document_text:
@@ -282,20 +324,47 @@ if st.session_state.doc_answer:
     # New: Save Document Query Event to Neo4j button
     def save_doc_query_neo4j():
         if st.session_state.last_doc_query_details:
-            with st.spinner("Saving document query event to Neo4j..."):
-                details = st.session_state.last_doc_query_details
-                if st.session_state.neo4j_handler_dp.store_document_query_event(
-                    details["event_id"],
-                    details["query"],
-                    details["answer"],
-                    details["document_name"],
-                    details["extracted_text_preview"],
-                    details["timestamp"]
-                ):
-                    st.success("Document query event saved to Neo4j!")
-                else:
-                    st.error("Failed to save document query event to Neo4j.")
-                st.session_state.last_doc_query_details = None
+            details = st.session_state.last_doc_query_details
+            if get_neo4j_write_queue().submit(
+                "store_document_query_event",
+                details["event_id"],
+                details["query"],
+                details["answer"],
+                details["document_name"],
+                details["extracted_text_preview"],
+                details["timestamp"],
+                username=st.session_state.get("username")
+            ):
+                st.success("Document query event queued for saving to Neo4j!")
+            else:
+                st.error("Failed to queue document query event for Neo4j.")
+            st.session_state.last_doc_query_details = None
             st.rerun()
     if st.session_state.last_doc_query_details:
-        st.button("Save Document Query to Neo4j", key="save_doc_query_neo4j_button", on_click=save_doc_query_neo4j)
\ No newline at end of file
+        st.button("Save Document Query to Neo4j", key="save_doc_query_neo4j_button", on_click=save_doc_query_neo4j)
+st.markdown("---")
+st.subheader("Batch Questions")
+batch_questions_text = st.text_area(
+    "Ask several questions at once (one per line). Every answer is saved to Neo4j as soon as it is ready:",
+    placeholder="e.g.\nWhat is the main topic of this document?\nWhich dates are mentioned?",
+    key="doc_batch_questions_input",
+    disabled=not st.session_state.document_text
+)
+if st.button("Answer All and Save to Neo4j", key="doc_batch_answer_button", disabled=not (st.session_state.document_text and batch_questions_text.strip())):
+    batch_questions = [line.strip() for line in batch_questions_text.splitlines() if line.strip()]
+    batch_table = get_lancedb_table_instance()
+    if batch_table is None:
+        st.warning("No document data loaded into LanceDB yet. Please upload a document first.")
+    else:
+        with st.spinner(f"Answering {len(batch_questions)} questions..."):
+            st.session_state.doc_batch_results = asyncio.run(answer_and_store_document_queries(
+                batch_table,
+                batch_questions,
+                uploaded_document.name if uploaded_document else "N/A",
+                (st.session_state.document_text[:500] + "...") if len(st.session_state.document_text) > 500 else st.session_state.document_text,
+                username=st.session_state.get("username")
+            ))
+if st.session_state.doc_batch_results:
+    for batch_result in st.session_state.doc_batch_results:
+        with st.expander(f"{batch_result['query']} ({batch_result['saved']})"):
+            st.write(batch_result["answer"])
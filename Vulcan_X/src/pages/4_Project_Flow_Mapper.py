@@ -1,11 +1,17 @@
 # pages/4_Project_Flow_Mapper.py
 import streamlit as st
 import json
+import os
+import tempfile
 import uuid
 from datetime import datetime
 from core.agents import RagbitsDataLineageAgent
+from core.code_processor import analyze_python_code_for_lineage, analyze_python_code_for_flow, looks_like_python_code, analyze_python_project_for_flow, resolve_project_dir, PROJECT_FLOW_ALLOWED_ROOT
+from core.flow_export import FLOW_EXPORT_FORMATS, export_flow_graph
+from core.flow_summary import DEFAULT_DIAGRAM_NODE_BUDGET
 from core.llm import get_ragbits_llm_client, generate_flow_diagram_code
-from core.neo4j_handler import Neo4jHandler
+from core.neo4j_handler import get_neo4j_handler
+from core.neo4j_write_queue import get_neo4j_write_queue # NEW: Write-behind persistence for save buttons
 from components.streamlit_diagram import StreamlitDiagramRenderer
 import asyncio
 from components.ui_styles import apply_custom_styles
@@ -34,9 +40,9 @@ if "ragbits_llm_flow" not in st.session_state:
 # Initialize Data Lineage Agent (once per session)
 if "data_lineage_agent_flow" not in st.session_state:
     st.session_state.data_lineage_agent_flow = RagbitsDataLineageAgent(llm=st.session_state.ragbits_llm_flow) # Pass llm to the custom agent's init
-# Initialize Neo4j Handler (once per session)
+# Neo4j Handler (process-wide, shares one driver/connection pool across all sessions)
 if "neo4j_handler_flow" not in st.session_state:
-    st.session_state.neo4j_handler_flow = Neo4jHandler()
+    st.session_state.neo4j_handler_flow = get_neo4j_handler()
 # Initialize StreamlitDiagramRenderer (once per session)
 if "diagram_renderer_flow" not in st.session_state:
     st.session_state.diagram_renderer_flow = StreamlitDiagramRenderer()
@@ -51,6 +57,17 @@ if "last_project_flow_details" not in st.session_state:
 # New session state for diagram type selection
 if "selected_diagram_type" not in st.session_state:
     st.session_state.selected_diagram_type = "Mermaid (Flowchart)"
+# Compact call graph of a local Python project (CompactFlowGraph), see section 5
+if "project_flow_graph" not in st.session_state:
+    st.session_state.project_flow_graph = None
+if "project_flow_exports" not in st.session_state: # {export format: temp file path} for the current project graph
+    st.session_state.project_flow_exports = {}
+
+def clear_project_flow_exports():
+    for export_path in st.session_state.project_flow_exports.values():
+        if os.path.exists(export_path):
+            os.remove(export_path)
+    st.session_state.project_flow_exports = {}
 st.subheader("1. Describe Your Data/Process Flow")
 sample_flow_description = """
 User authenticates via OAuth.
@@ -93,7 +110,14 @@ if st.button("Generate Flow Diagram", key="generate_flow_diagram_button", disabl
             generated_diagram_code = asyncio.run(generate_flow_diagram_code(flow_description, diagram_syntax_type_for_llm))
             # For Mermaid Flowchart, we still analyze to extract nodes/edges for Neo4j
             if selected_diagram_type == "Mermaid (Flowchart)":
-                extracted_lineage = st.session_state.data_lineage_agent_flow.extract_lineage(flow_description) # Use description for lineage
+                if looks_like_python_code(flow_description):
+                    # Pasted Python code: compute lineage locally via def-use analysis (no LLM call).
+                    # Fall back to the call graph when the code has no recognizable data sources/sinks.
+                    extracted_lineage = analyze_python_code_for_lineage(flow_description)
+                    if not extracted_lineage["nodes"]:
+                        extracted_lineage = analyze_python_code_for_flow(flow_description)
+                else:
+                    extracted_lineage = st.session_state.data_lineage_agent_flow.extract_lineage(flow_description) # Use description for lineage
                 st.session_state.flow_diagram_data = extracted_lineage
             else:
                 st.session_state.flow_diagram_data = {"nodes": [], "edges": []} # No automatic JSON conversion for other types
@@ -162,22 +186,94 @@ if st.session_state.diagram_definition:
     # New: Save Project Flow Diagram Event to Neo4j button
     def save_flow_diagram_to_neo4j():
         if st.session_state.last_project_flow_details:
-            with st.spinner("Saving project flow diagram details to Neo4j..."):
-                details = st.session_state.last_project_flow_details
-                if st.session_state.neo4j_handler_flow.store_project_flow_event(
-                    details["event_id"],
-                    details["description"],
-                    details["generated_code"], # Store the raw generated code
-                    details["flow_data"],
-                    details["timestamp"],
-                    details["diagram_type"] # Pass the diagram type
-                ):
-                    st.success("Project flow diagram details saved to Neo4j!")
-                else:
-                    st.error("Failed to save project flow diagram details to Neo4j.")
-                st.session_state.last_project_flow_details = None
+            details = st.session_state.last_project_flow_details
+            if get_neo4j_write_queue().submit(
+                "store_project_flow_event",
+                details["event_id"],
+                details["description"],
+                details["generated_code"], # Store the raw generated code
+                details["flow_data"],
+                details["timestamp"],
+                details["diagram_type"], # Pass the diagram type
+                username=st.session_state.get("username")
+            ):
+                st.success("Project flow diagram details queued for saving to Neo4j!")
+            else:
+                st.error("Failed to queue project flow diagram details for Neo4j.")
+            st.session_state.last_project_flow_details = None
         st.rerun() # Rerun to clear the button state and messages
     if st.session_state.last_project_flow_details:
         st.button("Save Diagram Details to Neo4j", key="save_flow_diagram_neo4j_button", on_click=save_flow_diagram_to_neo4j)
 else:
-    st.info("Enter a description and click 'Generate Flow Diagram' to see the output.")
\ No newline at end of file
+    st.info("Enter a description and click 'Generate Flow Diagram' to see the output.")
+
+st.markdown("---")
+st.subheader("5. Analyze a Local Python Project")
+st.info(f"Builds a cross-module call graph for every Python file in a directory below {PROJECT_FLOW_ALLOWED_ROOT}. Results are cached per file, so re-runs only reparse changed files.")
+project_dir = st.text_input("Project directory (relative to the allowed root on the server):", key="project_flow_dir_input")
+if st.button("Analyze Project", key="analyze_project_flow_button", disabled=not project_dir.strip()):
+    try:
+        resolved_project_dir = resolve_project_dir(project_dir)
+    except ValueError as e:
+        st.error(str(e))
+    else:
+        with st.spinner("Analyzing project files..."):
+            clear_project_flow_exports()
+            try:
+                st.session_state.project_flow_graph = analyze_python_project_for_flow(resolved_project_dir, compact=True)
+            except Exception as e:
+                st.error(f"Error analyzing project: {e}")
+                st.session_state.project_flow_graph = None
+if st.session_state.project_flow_graph is not None:
+    project_graph = st.session_state.project_flow_graph
+    stats = project_graph.metadata.get("analysis_stats", {})
+    st.success(
+        f"Call graph: {project_graph.node_count} nodes, {project_graph.edge_count} edges "
+        f"({stats.get('files_total', 0)} files, {stats.get('files_reparsed', 0)} reparsed, {stats.get('files_failed', 0)} with syntax errors)."
+    )
+    # Large call graphs are summarized (modules collapsed into super-nodes, leaf library calls pruned)
+    # so the rendered diagram stays under the node budget
+    col_budget, col_focus, col_depth = st.columns(3)
+    with col_budget:
+        node_budget = st.number_input("Max diagram nodes:", min_value=10, max_value=1000, value=DEFAULT_DIAGRAM_NODE_BUDGET, step=10, key="project_flow_node_budget")
+    with col_focus:
+        focus_module = st.text_input("Drill down into module (optional):", placeholder="e.g. core.code_processor", key="project_flow_focus")
+    with col_depth:
+        drill_depth = st.number_input("Drill-down depth:", min_value=1, max_value=5, value=1, key="project_flow_drill_depth")
+    try:
+        success = st.session_state.diagram_renderer_flow.render_flow_graph(
+            project_graph,
+            node_budget=int(node_budget),
+            focus=focus_module.strip() or None,
+            drill_depth=int(drill_depth),
+            height=600
+        )
+        if not success:
+            st.warning("Project call graph could not be rendered.")
+    except Exception as e:
+        st.error(f"Error rendering project call graph: {e}")
+    export_format = st.selectbox("Export format:", list(FLOW_EXPORT_FORMATS.keys()), key="project_flow_export_format")
+    # Exports are streamed to a temp file only on request and kept per format until the next analysis
+    export_path = st.session_state.project_flow_exports.get(export_format)
+    if export_path is None or not os.path.exists(export_path):
+        if st.button(f"Prepare {export_format} export", key="prepare_project_flow_export_button"):
+            export_path = os.path.join(tempfile.gettempdir(), f"project_flow_{uuid.uuid4().hex}{FLOW_EXPORT_FORMATS[export_format]}")
+            with st.spinner("Exporting project flow graph..."):
+                try:
+                    export_flow_graph(project_graph, export_path, export_format)
+                    st.session_state.project_flow_exports[export_format] = export_path
+                except Exception as e:
+                    st.error(f"Error exporting project flow graph: {e}")
+                    if os.path.exists(export_path):
+                        os.remove(export_path)
+                    export_path = None
+        else:
+            export_path = None
+    if export_path:
+        with open(export_path, "rb") as export_file:
+            st.download_button(
+                f"Download {export_format} export",
+                data=export_file,
+                file_name=f"project_flow{FLOW_EXPORT_FORMATS[export_format]}",
+                key="download_project_flow_export"
+            )
@@ -8,7 +8,7 @@ from streamlit_echarts5 import st_echarts # NEW: Import st_echarts for metrics v
 from core.data_handler import save_uploaded_file_to_temp
 from core.llm import get_ragbits_llm_client
 from core.agents import RagbitsCloudCodeConverterAgent
-from core.neo4j_handler import Neo4jHandler
+from core.neo4j_handler import get_neo4j_handler
 from core.ragbits_integration import get_confidence_score, get_effort_estimation, get_original_time_estimate, get_time_saved_estimate, _get_code_ast_lang_from_display_lang
 from components.ui_styles import apply_custom_styles
 
@@ -106,9 +106,9 @@ if "ragbits_llm_cloud" not in st.session_state:
 # Initialize Cloud Code Converter Agent (once per session)
 if "cloud_converter_agent" not in st.session_state:
     st.session_state.cloud_converter_agent = RagbitsCloudCodeConverterAgent(llm=st.session_state.ragbits_llm_cloud)
-# Initialize Neo4j Handler (once per session)
+# Neo4j Handler (process-wide, shares one driver/connection pool across all sessions)
 if "neo4j_handler_cloud" not in st.session_state:
-    st.session_state.neo4j_handler_cloud = Neo4jHandler()
+    st.session_state.neo4j_handler_cloud = get_neo4j_handler()
 
 # Initialize session state for code and platforms
 if "original_cloud_code" not in st.session_state:
@@ -5,7 +5,8 @@ from datetime import datetime
 from core.llm import get_ragbits_llm_client, generate_mukuro_wireframe_code
 from core.agents import RagbitsWireframeAgent # Import the new agent
 from utils.mukuro_compiler import MukuroLCompiler, MukuroLError
-from core.neo4j_handler import Neo4jHandler
+from core.neo4j_handler import get_neo4j_handler
+from core.neo4j_write_queue import get_neo4j_write_queue # NEW: Write-behind persistence for save buttons
 from components.ui_styles import apply_custom_styles
 import streamlit.components.v1 as components # For rendering HTML
 import asyncio # NEW: Import asyncio
@@ -42,9 +43,9 @@ if "wireframe_agent" not in st.session_state:
 if "mukuro_compiler" not in st.session_state:
     st.session_state.mukuro_compiler = MukuroLCompiler()
 
-# Initialize Neo4j Handler (once per session)
+# Neo4j Handler (process-wide, shares one driver/connection pool across all sessions)
 if "neo4j_handler_wireframe" not in st.session_state:
-    st.session_state.neo4j_handler_wireframe = Neo4jHandler()
+    st.session_state.neo4j_handler_wireframe = get_neo4j_handler()
 
 # Session states for wireframe generation
 if "wireframe_description" not in st.session_state:
@@ -251,16 +252,17 @@ with col_render:
 # Save to Neo4j button
 if st.session_state.last_wireframe_details:
     if st.button("Save Wireframe to Neo4j", key="save_wireframe_neo4j_button"):
-        with st.spinner("Saving wireframe generation event to Neo4j..."):
-            details = st.session_state.last_wireframe_details
-            if st.session_state.neo4j_handler_wireframe.store_wireframe_event(
-                details["event_id"],
-                details["description"],
-                details["generated_mukuro_code"],
-                details["timestamp"]
-            ):
-                st.success("Wireframe generation event saved to Neo4j!")
-            else:
-                st.error("Failed to save wireframe generation event to Neo4j.")
-            st.session_state.last_wireframe_details = None # Clear after saving
+        details = st.session_state.last_wireframe_details
+        if get_neo4j_write_queue().submit(
+            "store_wireframe_event",
+            details["event_id"],
+            details["description"],
+            details["generated_mukuro_code"],
+            details["timestamp"],
+            username=st.session_state.get("username")
+        ):
+            st.success("Wireframe generation event queued for saving to Neo4j!")
+        else:
+            st.error("Failed to queue wireframe generation event for Neo4j.")
+        st.session_state.last_wireframe_details = None # Clear after saving
         st.rerun()
\ No newline at end of file
@@ -1,17 +1,48 @@
 # src/utils/auth.py
 import streamlit as st
+import os
 import re
-from passlib.hash import pbkdf2_sha256
-from core.neo4j_handler import Neo4jHandler
+import time
+from utils.password_hashing import hash_password, verify_password
+from core.neo4j_handler import get_neo4j_handler
+from core.frame_cache import LRUCache
 
-# Initialize Neo4j Handler for authentication operations
-# Using st.cache_resource to ensure a single instance across Streamlit reruns
-@st.cache_resource
+# Neo4j Handler for authentication operations
+# get_neo4j_handler() already returns a single process-wide instance (one driver, admin bootstrap run once)
 def get_auth_neo4j_handler():
-    return Neo4jHandler()
+    return get_neo4j_handler()
 
 neo4j_handler = get_auth_neo4j_handler()
 
+# --- User Record Cache ---
+# Login, approval and admin checks run on every rerun of main.py, so user records (with their role
+# names, fetched in the same query) are cached in-process for a short TTL. Entries are dropped
+# whenever this module creates or approves a user. The cache is an LRU of at most
+# AUTH_USER_CACHE_ENTRIES users (unknown usernames included), and expired entries are evicted when read.
+AUTH_CACHE_TTL_SECONDS = float(os.getenv("AUTH_CACHE_TTL_SECONDS", "30"))
+AUTH_USER_CACHE_ENTRIES = int(os.getenv("AUTH_USER_CACHE_ENTRIES", "1024"))
+_user_cache = LRUCache(AUTH_USER_CACHE_ENTRIES) # username -> (expires_at, user record with "roles", or None for unknown users)
+
+def _get_cached_user(username: str) -> dict | None:
+    """Returns the user record (including "roles") from the cache, loading it from Neo4j when stale."""
+    now = time.monotonic()
+    entry = _user_cache.get(username)
+    if entry:
+        if entry[0] > now:
+            return entry[1]
+        _user_cache.pop(username)
+    user_data = neo4j_handler.get_user_with_roles(username)
+    if user_data is not None or neo4j_handler.driver is not None: # Don't cache lookups that failed for lack of a connection
+        _user_cache.put(username, (now + AUTH_CACHE_TTL_SECONDS, user_data))
+    return user_data
+
+def invalidate_user_cache(username: str = None):
+    """Drops one user's cached record, or the whole cache when username is None."""
+    if username is None:
+        _user_cache.clear()
+    else:
+        _user_cache.pop(username)
+
 # --- Password Policy Validation ---
 def validate_password_policy(password: str) -> list[str]:
     """
@@ -37,27 +68,40 @@ def validate_password_policy(password: str) -> list[str]:
     return errors
 
 # --- User Management Functions (interacting with Neo4j) ---
+PASSWORD_POOL_BUSY_MESSAGE = "The server is busy right now. Please try again in a moment."
+
 def register_user(username, password) -> bool:
     """Registers a new user with hashed password in Neo4j (initially unapproved)."""
-    if neo4j_handler.get_user(username):
+    if _get_cached_user(username):
         return False, "Username already exists."
 
     password_errors = validate_password_policy(password)
     if password_errors:
         return False, "Password does not meet requirements: " + ", ".join(password_errors)
 
-    hashed_password = pbkdf2_sha256.hash(password)
-    return neo4j_handler.create_user(username, hashed_password)
+    try:
+        hashed_password = hash_password(password)
+    except TimeoutError: # Hashing pool saturated (login/registration burst)
+        return False, PASSWORD_POOL_BUSY_MESSAGE
+    result = neo4j_handler.create_user(username, hashed_password)
+    invalidate_user_cache(username)
+    return result
 
 def authenticate_user_neo4j(username, password) -> bool:
     """Authenticates user against Neo4j, checking hashed password and approval status."""
-    user_data = neo4j_handler.get_user(username)
+    user_data = _get_cached_user(username)
     if user_data:
         hashed_password_from_db = user_data.get("hashed_password")
         is_approved = user_data.get("approved", False)
         
-        # Verify password using passlib
-        if hashed_password_from_db and pbkdf2_sha256.verify(password, hashed_password_from_db):
+        # Verify password on the hashing pool; hashes made under an older cost policy come back re-hashed
+        try:
+            is_valid, new_hash = verify_password(password, hashed_password_from_db) if hashed_password_from_db else (False, None)
+        except TimeoutError: # Hashing pool saturated (login burst)
+            return False, PASSWORD_POOL_BUSY_MESSAGE
+        if is_valid:
+            if new_hash and neo4j_handler.update_user_password_hash(username, new_hash):
+                invalidate_user_cache(username)
             if is_approved:
                 return True, "Authenticated"
             else:
@@ -68,12 +112,13 @@ def authenticate_user_neo4j(username, password) -> bool:
 
 def is_user_approved(username: str) -> bool:
     """Checks if a user is approved to log in."""
-    user_data = neo4j_handler.get_user(username)
+    user_data = _get_cached_user(username)
     return user_data.get("approved", False) if user_data else False
 
 def is_admin_user(username: str) -> bool:
     """Checks if the given username has the 'admin' role."""
-    return neo4j_handler.check_user_role(username, "admin")
+    user_data = _get_cached_user(username)
+    return "admin" in user_data.get("roles", []) if user_data else False
 
 def get_pending_users() -> list[dict]:
     """Retrieves a list of users awaiting approval."""
@@ -81,7 +126,9 @@ def get_pending_users() -> list[dict]:
 
 def approve_user(username: str) -> bool:
     """Approves a user account, allowing them to log in."""
-    return neo4j_handler.update_user_approval(username, True)
+    approved = neo4j_handler.update_user_approval(username, True)
+    invalidate_user_cache(username)
+    return approved
 
 def logout_user():
     """Clears authentication state from session."""
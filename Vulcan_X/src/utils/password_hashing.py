@@ -0,0 +1,112 @@
+# src/utils/password_hashing.py
+import argparse
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from passlib.hash import pbkdf2_sha256
+
+# pbkdf2 hashing/verification off the Streamlit script thread.
+# passlib's pbkdf2_sha256 runs on hashlib.pbkdf2_hmac, which releases the GIL while it iterates,
+# so a small thread pool hashes in parallel across cores without process start-up or pickling
+# costs. The pool is bounded (PASSWORD_HASH_WORKERS threads, at most PASSWORD_HASH_MAX_PENDING
+# jobs queued) so a login burst queues here instead of starving other sessions.
+# PASSWORD_HASH_ROUNDS sets the cost of new hashes; stored hashes made with a different cost are
+# transparently re-hashed on the next successful login (see verify_password()).
+PASSWORD_HASH_ROUNDS = int(os.getenv("PASSWORD_HASH_ROUNDS", str(pbkdf2_sha256.default_rounds)))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", str(PASSWORD_HASH_WORKERS * 8)))
+PASSWORD_HASH_TIMEOUT_SECONDS = 30.0
+
+password_hasher = pbkdf2_sha256.using(rounds=PASSWORD_HASH_ROUNDS)
+
+_executor = None
+_executor_lock = threading.Lock()
+_pending_slots = threading.BoundedSemaphore(max(1, PASSWORD_HASH_MAX_PENDING))
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=max(1, PASSWORD_HASH_WORKERS), thread_name_prefix="password-hash")
+    return _executor
+
+def _run_in_pool(fn, *args):
+    """Runs fn on the hashing pool and waits for it; blocks while the pool's queue is full."""
+    if not _pending_slots.acquire(timeout=PASSWORD_HASH_TIMEOUT_SECONDS):
+        raise TimeoutError("Password hashing pool is saturated.")
+    try:
+        future = _get_executor().submit(fn, *args)
+    except Exception:
+        _pending_slots.release()
+        raise
+    future.add_done_callback(lambda _: _pending_slots.release())
+    return future.result(timeout=PASSWORD_HASH_TIMEOUT_SECONDS)
+
+def hash_password(password: str) -> str:
+    """Hashes a password with the configured pbkdf2 cost on the hashing pool."""
+    return _run_in_pool(password_hasher.hash, password)
+
+def _verify_and_maybe_rehash(password: str, hashed_password: str) -> tuple[bool, str | None]:
+    if not password_hasher.verify(password, hashed_password):
+        return False, None
+    # The plaintext is only available right now, so this is the moment to migrate to the current policy
+    return True, password_hasher.hash(password) if password_hasher.needs_update(hashed_password) else None
+
+def verify_password(password: str, hashed_password: str) -> tuple[bool, str | None]:
+    """
+    Verifies a password on the hashing pool. Returns (is_valid, new_hash), where new_hash is set when
+    the stored hash uses an outdated cost and should be replaced.
+    """
+    try:
+        return _run_in_pool(_verify_and_maybe_rehash, password, hashed_password)
+    except ValueError: # Malformed/unsupported stored hash
+        return False, None
+
+def benchmark_password_hashing(duration_seconds: float = 5.0, workers: int = None, rounds: int = PASSWORD_HASH_ROUNDS) -> dict:
+    """
+    Micro-benchmark: runs verify() for duration_seconds from `workers` threads and reports
+    logins/sec overall and per core.
+    """
+    workers = max(1, workers or os.cpu_count() or 1)
+    hasher = pbkdf2_sha256.using(rounds=rounds)
+    stored_hash = hasher.hash("Benchmark#Passw0rd")
+    counts = [0] * workers
+    deadline = time.perf_counter() + duration_seconds
+
+    def _worker(index):
+        while time.perf_counter() < deadline:
+            hasher.verify("Benchmark#Passw0rd", stored_hash)
+            counts[index] += 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=_worker, args=(index,)) for index in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    cores = min(workers, os.cpu_count() or 1)
+    logins_per_second = sum(counts) / elapsed
+    report = {
+        "rounds": rounds,
+        "workers": workers,
+        "cores": cores,
+        "logins": sum(counts),
+        "elapsed_seconds": round(elapsed, 3),
+        "logins_per_second": round(logins_per_second, 1),
+        "logins_per_second_per_core": round(logins_per_second / cores, 1),
+        "ms_per_login": round(1000 * elapsed * workers / max(1, sum(counts)), 2)
+    }
+    print(f"pbkdf2_sha256 rounds={rounds}, workers={workers}, cores={cores}: "
+          f"{report['logins_per_second']} logins/s ({report['logins_per_second_per_core']} per core, {report['ms_per_login']} ms each)")
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark password verification throughput.")
+    parser.add_argument("--seconds", type=float, default=5.0, help="Duration of each run")
+    parser.add_argument("--workers", type=int, default=None, help="Concurrent verifier threads (default: CPU count)")
+    parser.add_argument("--rounds", type=int, default=PASSWORD_HASH_ROUNDS, help="pbkdf2 rounds to benchmark")
+    args = parser.parse_args()
+    benchmark_password_hashing(args.seconds, args.workers, args.rounds)
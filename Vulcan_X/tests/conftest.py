@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The app imports its modules as top-level packages (core, utils) from src/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
@@ -0,0 +1,33 @@
+import pytest
+
+pl = pytest.importorskip("polars")
+
+from core import schema_inference
+
+
+def test_value_hashes_sample_keeps_only_divisible_hashes():
+    frame = pl.DataFrame({"sku_code": [f"SKU-{i % 5000}" for i in range(20000)]})
+    full = schema_inference._value_hashes(frame, "sku_code", "string", 1)
+    sample = schema_inference._value_hashes(frame, "sku_code", "string", 7)
+    assert len(full) == 5000
+    assert sample and all(h % 7 == 0 for h in sample)
+    assert sample == {h for h in full if h % 7 == 0}
+
+
+def test_foreign_key_found_when_key_values_are_sampled(monkeypatch):
+    monkeypatch.setattr(schema_inference, "ER_KEY_SAMPLE_SIZE", 500)
+    customers = pl.DataFrame({
+        "customer_id": list(range(1, 20001)),
+        "name": [f"customer {i}" for i in range(1, 20001)],
+    })
+    orders = pl.DataFrame({
+        "order_id": list(range(1, 60001)),
+        "customer_id": [1 + (i * 7919) % 20000 for i in range(60000)],
+    })
+    inferred = schema_inference.infer_relationships({
+        "customers.csv": ("test-customers", customers),
+        "orders.csv": ("test-orders", orders),
+    })
+    assert inferred["tables"]["customers.csv"]["primary_key"] == "customer_id"
+    relationships = [(rel["parent"], rel["parent_column"], rel["child"], rel["child_column"]) for rel in inferred["relationships"]]
+    assert ("customers.csv", "customer_id", "orders.csv", "customer_id") in relationships